@@ -0,0 +1,147 @@
+"""
+Benchmarks the stages of the generate-motif-data pipeline on synthetic libraries.
+
+Usage:
+    python -m benchmarks.bench_pipeline --sizes 1000,10000,100000
+"""
+
+import glob
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+
+import click
+
+from benchmarks.harness import format_results, measure, save_results, temp_data_dir
+from benchmarks.synthetic import make_construct_library, write_pdb_tables
+from dms_quant_framework.dataset import read_dataset
+from dms_quant_framework.logger import get_logger, setup_logging
+from dms_quant_framework.paths import DATA_PATH
+from dms_quant_framework.process_motifs import (
+    GenerateMotifDataFrame,
+    GenerateResidueDataFrame,
+    generate_pdb_residue_dataframe,
+    process_mutation_histograms_to_json,
+)
+
+log = get_logger("bench-pipeline")
+
+LIBRARY_NAME = "synthetic_library"
+
+
+def copy_mutation_histograms(source_data_path: str) -> None:
+    """
+    Copies the mutation histograms and the p5 sequences of a real data directory.
+
+    Mutation histograms are pickled rna_map objects, so they are not synthesized.
+
+    Args:
+        source_data_path (str): A data directory from the FigShare download.
+    """
+    for path in glob.glob(os.path.join(source_data_path, "mutation-histograms/*.p")):
+        shutil.copy(path, f"{DATA_PATH}/mutation-histograms")
+    shutil.copy(
+        os.path.join(source_data_path, "csvs/p5_sequences.csv"), f"{DATA_PATH}/csvs"
+    )
+
+
+def benchmark_pipeline(
+    n_constructs: int,
+    source_data_path: Optional[str] = None,
+    trace_memory: bool = True,
+    seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """
+    Runs each pipeline stage once on a synthetic library in a temporary data
+    directory.
+
+    Args:
+        n_constructs (int): The number of constructs in the library.
+        source_data_path (str, optional): A real data directory to benchmark
+            process_mutation_histograms_to_json on, the stage is skipped if not
+            given. Defaults to None.
+        trace_memory (bool): Record the peak memory of each stage. Defaults to True.
+        seed (int): The random seed of the library. Defaults to 0.
+
+    Returns:
+        List[Dict[str, Any]]: The time and peak memory of each stage.
+    """
+    results = []
+
+    def record(stage: str, stats: Dict[str, float], n_rows: int) -> None:
+        results.append(
+            {
+                "name": f"{stage}[{n_constructs}]",
+                "stage": stage,
+                "n_constructs": n_constructs,
+                "n_rows": n_rows,
+                **stats,
+            }
+        )
+        log.info(f"{results[-1]['name']}: {stats}")
+
+    with temp_data_dir():
+        write_pdb_tables(DATA_PATH, seed)
+        if source_data_path is not None:
+            copy_mutation_histograms(source_data_path)
+            _, stats = measure(
+                process_mutation_histograms_to_json, trace_memory=trace_memory
+            )
+            record("process_mutation_histograms_to_json", stats, 0)
+
+        df = make_construct_library(n_constructs, seed=seed)
+        df_motif, stats = measure(
+            GenerateMotifDataFrame().run, df, LIBRARY_NAME, trace_memory=trace_memory
+        )
+        record("GenerateMotifDataFrame.run", stats, len(df_motif))
+
+        _, stats = measure(
+            GenerateResidueDataFrame().run,
+            df_motif,
+            LIBRARY_NAME,
+            trace_memory=trace_memory,
+        )
+        residue_file = f"{DATA_PATH}/raw-jsons/residues/{LIBRARY_NAME}_residues.json"
+        df_residue = read_dataset(residue_file, filters=[("has_pdbs", "==", True)])
+        record("GenerateResidueDataFrame.run", stats, len(df_residue))
+
+        df_pdb, stats = measure(
+            generate_pdb_residue_dataframe, df_residue, trace_memory=trace_memory
+        )
+        record("generate_pdb_residue_dataframe", stats, len(df_pdb))
+    return results
+
+
+@click.command()
+@click.option(
+    "--sizes",
+    default="1000,10000",
+    help="Comma separated library sizes, e.g. 1000,10000,100000",
+)
+@click.option(
+    "--source-data",
+    default=None,
+    help="Real data directory to also benchmark process_mutation_histograms_to_json",
+)
+@click.option("--output", default=None, help="JSON file to save the results to")
+@click.option("--no-memory", is_flag=True, help="Do not trace memory, faster timings")
+@click.option("--seed", default=0, help="Seed of the synthetic libraries")
+def main(sizes, source_data, output, no_memory, seed):
+    """
+    Benchmarks the generate-motif-data pipeline stages.
+    """
+    setup_logging()
+    if source_data is not None:
+        source_data = os.path.abspath(source_data)
+    results = []
+    for size in [int(size) for size in sizes.split(",")]:
+        results.extend(
+            benchmark_pipeline(size, source_data, trace_memory=not no_memory, seed=seed)
+        )
+    print(format_results(results))
+    if output is not None:
+        save_results(results, output)
+
+
+if __name__ == "__main__":
+    main()
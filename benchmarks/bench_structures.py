@@ -0,0 +1,232 @@
+"""
+Benchmarks the structural feature extractors on the PDBs in test/resources and on
+corpora that replicate them.
+
+Usage:
+    python -m benchmarks.bench_structures --copies 1,50 --baseline structures.json
+"""
+
+import os
+from typing import Any, Callable, Dict, List
+
+import click
+import pandas as pd
+from biopandas.pdb import PandasPdb
+
+from benchmarks.harness import (
+    append_history,
+    check_regressions,
+    format_results,
+    load_results,
+    measure,
+    save_results,
+    temp_data_dir,
+)
+from benchmarks.synthetic import (
+    make_pdb_corpus,
+    make_pdb_residue_dataframe,
+    write_ideal_pdbs,
+    write_x3dna_output,
+)
+from dms_quant_framework.logger import get_logger, setup_logging
+from dms_quant_framework.paths import DATA_PATH
+from dms_quant_framework.pdb_features import (
+    calculate_atom_distances,
+    calculate_rmsd_bp,
+    extract_basepair_details_into_a_table,
+    get_distance_between_all_atom_pairs_dataframe,
+)
+from dms_quant_framework.sasa import compute_solvent_accessibility
+
+log = get_logger("bench-structures")
+
+
+def count_atoms(pdb_paths: List[str]) -> Dict[str, int]:
+    """Returns the number of atoms of each PDB."""
+    return {path: len(PandasPdb().read_pdb(path).df["ATOM"]) for path in pdb_paths}
+
+
+def run_per_structure(func: Callable, items: List[Any]) -> List[Any]:
+    """Calls a function on each item, each item is a tuple of arguments."""
+    return [func(*item) for item in items]
+
+
+def get_structure_result(
+    name: str, stats: Dict[str, float], n_structures: int, n_atoms: int
+) -> Dict[str, Any]:
+    """
+    Builds the result of a benchmark that processed a number of structures.
+
+    Args:
+        name (str): The function that was benchmarked.
+        stats (Dict[str, float]): The seconds and peak_mb from measure.
+        n_structures (int): The number of structures processed.
+        n_atoms (int): The number of atoms in the structures.
+
+    Returns:
+        Dict[str, Any]: The result with the latency per structure and atoms per
+        second.
+    """
+    return {
+        "name": f"{name}[{n_structures}]",
+        "function": name,
+        "n_structures": n_structures,
+        "n_atoms": n_atoms,
+        **stats,
+        "seconds_per_structure": stats["seconds"] / n_structures,
+        "atoms_per_sec": n_atoms / stats["seconds"] if stats["seconds"] > 0 else None,
+    }
+
+
+def benchmark_structures(
+    n_copies: int, trace_memory: bool = True, max_distance: float = 10
+) -> List[Dict[str, Any]]:
+    """
+    Runs each structural feature extractor over a corpus of replicated PDBs.
+
+    Args:
+        n_copies (int): The number of copies of each PDB in test/resources.
+        trace_memory (bool): Record the peak memory of each benchmark.
+            Defaults to True.
+        max_distance (float): The max distance of the atom pair distances.
+            Defaults to 10.
+
+    Returns:
+        List[Dict[str, Any]]: The results of each extractor.
+    """
+    results = []
+    with temp_data_dir(copy_pdbs=False):
+        pdb_paths = make_pdb_corpus(n_copies, f"{DATA_PATH}/pdbs")
+        n_atoms = count_atoms(pdb_paths)
+        total_atoms = sum(n_atoms.values())
+        n_structures = len(pdb_paths)
+
+        items = [(path, max_distance) for path in pdb_paths]
+        dfs, stats = measure(
+            run_per_structure,
+            get_distance_between_all_atom_pairs_dataframe,
+            items,
+            trace_memory=trace_memory,
+        )
+        df_dist = pd.concat(dfs, ignore_index=True)
+        results.append(
+            get_structure_result(
+                "get_distance_between_all_atom_pairs_dataframe",
+                stats,
+                n_structures,
+                total_atoms,
+            )
+        )
+
+        _, stats = measure(
+            run_per_structure,
+            compute_solvent_accessibility,
+            [(path,) for path in pdb_paths],
+            trace_memory=trace_memory,
+        )
+        results.append(
+            get_structure_result(
+                "compute_solvent_accessibility", stats, n_structures, total_atoms
+            )
+        )
+
+        os.makedirs(f"{DATA_PATH}/dssr-output", exist_ok=True)
+        out_paths = []
+        for i, path in enumerate(pdb_paths):
+            out_path = f"{DATA_PATH}/dssr-output/{i}_x3dna.out"
+            write_x3dna_output(path, out_path, seed=i)
+            out_paths.append(out_path)
+        _, stats = measure(
+            run_per_structure,
+            extract_basepair_details_into_a_table,
+            [(path,) for path in out_paths],
+            trace_memory=trace_memory,
+        )
+        results.append(
+            get_structure_result(
+                "extract_basepair_details_into_a_table",
+                stats,
+                n_structures,
+                total_atoms,
+            )
+        )
+
+        resource_pairs = write_ideal_pdbs(f"{DATA_PATH}/ideal_pdbs")
+        items = []
+        for path in pdb_paths:
+            motif_dir = os.path.basename(os.path.dirname(path))
+            for bp, resource_path, resi_nums in resource_pairs:
+                if os.path.basename(os.path.dirname(resource_path)) == motif_dir:
+                    items.append((bp, path, resi_nums))
+        _, stats = measure(
+            run_per_structure, calculate_rmsd_bp, items, trace_memory=trace_memory
+        )
+        results.append(
+            get_structure_result("calculate_rmsd_bp", stats, n_structures, total_atoms)
+        )
+
+        df_pdb = make_pdb_residue_dataframe(pdb_paths)
+        _, stats = measure(
+            calculate_atom_distances,
+            df_pdb,
+            df_dist,
+            "N1",
+            "N3",
+            trace_memory=trace_memory,
+        )
+        results.append(
+            get_structure_result(
+                "calculate_atom_distances", stats, n_structures, total_atoms
+            )
+        )
+    for result in results:
+        log.info(
+            f"{result['name']}: {result['seconds_per_structure'] * 1000:.2f} "
+            f"ms/structure, {result['atoms_per_sec'] or 0:.0f} atoms/sec"
+        )
+    return results
+
+
+@click.command()
+@click.option(
+    "--copies",
+    default="1,20",
+    help="Comma separated number of copies of each PDB in test/resources",
+)
+@click.option("--output", default=None, help="JSON file to save the results to")
+@click.option("--history", default=None, help="JSON lines file to append the run to")
+@click.option("--baseline", default=None, help="Results or history file to compare to")
+@click.option(
+    "--max-slowdown",
+    default=1.25,
+    help="Fail if the latency per structure is this many times the baseline",
+)
+@click.option("--no-memory", is_flag=True, help="Do not trace memory, faster timings")
+def main(copies, output, history, baseline, max_slowdown, no_memory):
+    """
+    Benchmarks the structural feature extractors.
+    """
+    setup_logging()
+    results = []
+    for n_copies in [int(n) for n in copies.split(",")]:
+        results.extend(benchmark_structures(n_copies, trace_memory=not no_memory))
+    print(format_results(results))
+    if output is not None:
+        save_results(results, output)
+    if history is not None:
+        append_history(results, history)
+    if baseline is not None:
+        regressions = check_regressions(
+            results,
+            load_results(baseline),
+            metric="seconds_per_structure",
+            max_ratio=max_slowdown,
+        )
+        for regression in regressions:
+            log.error(f"regression: {regression}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Each benchmark runs a stage of the pipeline and records its wall time and peak
+Python memory (tracemalloc) in a list of result dicts that is saved as JSON, so
+runs can be compared against a saved baseline.
+"""
+
+import contextlib
+import datetime
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from dms_quant_framework.logger import get_logger
+from dms_quant_framework.output_writer import flush_outputs
+from dms_quant_framework.paths import DATA_PATH_ENV, OUTPUT_PATH_ENV, set_paths
+
+log = get_logger("benchmarks")
+
+BENCHMARK_PATH = os.path.dirname(os.path.abspath(__file__))
+TEST_RESOURCES_PATH = os.path.join(os.path.dirname(BENCHMARK_PATH), "test", "resources")
+
+# directories the pipeline expects under the data path
+DATA_DIRS = [
+    "csvs",
+    "mutation-histograms",
+    "pdb-features",
+    "pdbs_w_2bp",
+    "raw-jsons/constructs",
+    "raw-jsons/motifs",
+    "raw-jsons/residues",
+]
+
+
+def measure(
+    func: Callable, *args, trace_memory: bool = True, **kwargs
+) -> Tuple[Any, Dict[str, float]]:
+    """
+    Runs a function once and measures its wall time and peak memory.
+
+    Args:
+        func (Callable): The function to run.
+        *args: Positional arguments of the function.
+        trace_memory (bool): Record the peak memory allocated by Python during the
+            call with tracemalloc, which slows down the call. Defaults to True.
+        **kwargs: Keyword arguments of the function.
+
+    Returns:
+        Tuple[Any, Dict[str, float]]: The return value of the function and the
+        seconds and peak_mb of the call, peak_mb is None if memory is not traced.
+    """
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+        # include the outputs written in the background
+        flush_outputs()
+        seconds = time.perf_counter() - start
+        peak_mb = None
+        if trace_memory:
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return result, {"seconds": round(seconds, 4), "peak_mb": peak_mb}
+
+
+@contextlib.contextmanager
+def temp_data_dir(copy_pdbs: bool = True) -> Iterator[str]:
+    """
+    Runs the body in a temporary directory with an empty data tree.
+
+    The working directory is changed to the temporary directory and the data and
+    output paths are set to its data directory for the duration of the block.
+
+    Args:
+        copy_pdbs (bool): Copy the PDBs in test/resources/pdbs to
+            data/pdbs_w_2bp. Defaults to True.
+
+    Yields:
+        str: The path of the temporary directory.
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="dms-benchmark-") as tmp_dir:
+        for data_dir in DATA_DIRS:
+            os.makedirs(os.path.join(tmp_dir, "data", data_dir), exist_ok=True)
+        if copy_pdbs:
+            shutil.copytree(
+                os.path.join(TEST_RESOURCES_PATH, "pdbs"),
+                os.path.join(tmp_dir, "data", "pdbs_w_2bp"),
+                dirs_exist_ok=True,
+            )
+        env = {name: os.environ.get(name) for name in [DATA_PATH_ENV, OUTPUT_PATH_ENV]}
+        os.chdir(tmp_dir)
+        set_paths("data", "data")
+        try:
+            yield tmp_dir
+        finally:
+            os.chdir(cwd)
+            for name, value in env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+def get_environment() -> Dict[str, str]:
+    """Returns a description of the machine the benchmarks ran on."""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def save_results(results: List[Dict[str, Any]], path: str) -> None:
+    """
+    Saves benchmark results and the environment they were recorded in.
+
+    Args:
+        results (List[Dict[str, Any]]): One dict per benchmark.
+        path (str): The JSON file to write.
+    """
+    with open(path, "w") as f:
+        json.dump({"environment": get_environment(), "results": results}, f, indent=4)
+    log.info(f"saved {len(results)} benchmark results to {path}")
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    """
+    Formats benchmark results as a text table.
+
+    Args:
+        results (List[Dict[str, Any]]): One dict per benchmark.
+
+    Returns:
+        str: The table.
+    """
+    lines = [f"{'benchmark':<50} {'seconds':>10} {'peak MB':>10}"]
+    for result in results:
+        peak_mb = result.get("peak_mb")
+        peak = f"{peak_mb:>10.1f}" if peak_mb is not None else f"{'-':>10}"
+        lines.append(f"{result['name']:<50} {result['seconds']:>10.3f} {peak}")
+    return "\n".join(lines)
+
+
+def get_git_commit() -> Optional[str]:
+    """Returns the commit of the working tree, None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BENCHMARK_PATH,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def append_history(results: List[Dict[str, Any]], path: str) -> None:
+    """
+    Appends a benchmark run to a JSON lines history file to track trends.
+
+    Args:
+        results (List[Dict[str, Any]]): One dict per benchmark.
+        path (str): The history file, one run per line.
+    """
+    run = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": get_git_commit(),
+        "environment": get_environment(),
+        "results": results,
+    }
+    with open(path, "a") as f:
+        f.write(json.dumps(run) + "\n")
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    """
+    Loads the results saved with save_results, or the last run of a history file.
+
+    Args:
+        path (str): The results JSON or history JSON lines file.
+
+    Returns:
+        List[Dict[str, Any]]: One dict per benchmark.
+    """
+    with open(path) as f:
+        lines = [line for line in f.read().splitlines() if line.strip()]
+    if path.endswith(".jsonl"):
+        return json.loads(lines[-1])["results"]
+    return json.loads("\n".join(lines))["results"]
+
+
+def check_regressions(
+    results: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    metric: str = "seconds",
+    max_ratio: float = 1.25,
+) -> List[str]:
+    """
+    Compares benchmark results against a baseline run.
+
+    Benchmarks are matched by name, benchmarks missing from either run are skipped.
+
+    Args:
+        results (List[Dict[str, Any]]): The results of this run.
+        baseline (List[Dict[str, Any]]): The results of the baseline run.
+        metric (str): The metric to compare, lower is better. Defaults to "seconds".
+        max_ratio (float): The largest allowed ratio of the result to the baseline.
+            Defaults to 1.25.
+
+    Returns:
+        List[str]: A message for each benchmark that regressed.
+    """
+    baseline_by_name = {result["name"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        base = baseline_by_name.get(result["name"])
+        if base is None or not base.get(metric) or result.get(metric) is None:
+            continue
+        ratio = result[metric] / base[metric]
+        if ratio > max_ratio:
+            regressions.append(
+                f"{result['name']}: {metric} {result[metric]:.4g} is {ratio:.2f}x "
+                f"the baseline {base[metric]:.4g}"
+            )
+    return regressions
@@ -0,0 +1,413 @@
+"""
+Synthetic inputs for the benchmarks.
+
+Constructs are built like the real libraries: a 5' flank, two-way junctions
+stacked on 3 bp helices, a hairpin and a 3' flank. The junctions with PDBs in
+test/resources are mixed with random junctions, and the PDB tables used by the
+later pipeline stages are generated for the PDBs in test/resources.
+"""
+
+import glob
+import os
+import random
+import shutil
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+from biopandas.pdb import PandasPdb
+
+from benchmarks.harness import TEST_RESOURCES_PATH
+
+PAIRS = ["GC", "CG", "AU", "UA"]
+FIVE_PRIME = "GGAA"
+THREE_PRIME = "AAAGAAAC"
+HAIRPIN_LOOP = "GAAA"
+
+
+def get_resource_motifs() -> List[str]:
+    """
+    Returns the junctions with a PDB in test/resources.
+
+    Returns:
+        List[str]: The motif sequences, strands separated by "&".
+    """
+    pdb_dirs = sorted(glob.glob(os.path.join(TEST_RESOURCES_PATH, "pdbs", "*")))
+    return [os.path.basename(path).replace("_", "&") for path in pdb_dirs]
+
+
+def get_motif_structure(motif_seq: str) -> str:
+    """
+    Returns the structure of a two-way junction with its flanking pairs.
+
+    Args:
+        motif_seq (str): The motif sequence, strands separated by "&".
+
+    Returns:
+        str: The structure of the motif.
+    """
+    strand_1, strand_2 = motif_seq.split("&")
+    return "(" + "." * (len(strand_1) - 2) + "(&)" + "." * (len(strand_2) - 2) + ")"
+
+
+def random_motif(rng: random.Random) -> str:
+    """
+    Returns a random two-way junction closed by Watson-Crick pairs.
+
+    Args:
+        rng (random.Random): The random number generator.
+
+    Returns:
+        str: The motif sequence.
+    """
+    outer, inner = rng.choice(PAIRS), rng.choice(PAIRS)
+    loop_1 = "".join(rng.choice("ACGU") for _ in range(rng.randint(0, 3)))
+    loop_2 = "".join(rng.choice("ACGU") for _ in range(rng.randint(0, 3)))
+    return f"{outer[0]}{loop_1}{inner[0]}&{inner[1]}{loop_2}{outer[1]}"
+
+
+def build_construct(motifs: List[str], rng: random.Random) -> Tuple[str, str]:
+    """
+    Builds a construct that holds the given motifs.
+
+    Args:
+        motifs (List[str]): The motif sequences, from the 5' end inwards.
+        rng (random.Random): The random number generator for the helices.
+
+    Returns:
+        Tuple[str, str]: The sequence and structure of the construct.
+    """
+    left, left_ss, right, right_ss = "", "", "", ""
+    for motif_seq in motifs + [None]:
+        helix = [rng.choice(PAIRS) for _ in range(3)]
+        left += "".join(pair[0] for pair in helix)
+        left_ss += "((("
+        right = "".join(pair[1] for pair in reversed(helix)) + right
+        right_ss = ")))" + right_ss
+        if motif_seq is None:
+            break
+        strand_1, strand_2 = motif_seq.split("&")
+        ss_1, ss_2 = get_motif_structure(motif_seq).split("&")
+        left += strand_1
+        left_ss += ss_1
+        right = strand_2 + right
+        right_ss = ss_2 + right_ss
+    seq = FIVE_PRIME + left + HAIRPIN_LOOP + right + THREE_PRIME
+    ss = (
+        "." * len(FIVE_PRIME)
+        + left_ss
+        + "." * len(HAIRPIN_LOOP)
+        + right_ss
+        + "." * len(THREE_PRIME)
+    )
+    return seq, ss
+
+
+def make_construct_library(
+    n_constructs: int,
+    motifs_per_construct: int = 3,
+    n_random_motifs: int = 200,
+    resource_fraction: float = 0.2,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Builds a synthetic construct library in the format of the construct JSON files
+    written by process_mutation_histograms_to_json.
+
+    Args:
+        n_constructs (int): The number of constructs.
+        motifs_per_construct (int): The number of junctions per construct.
+            Defaults to 3.
+        n_random_motifs (int): The number of random junctions to choose from.
+            Defaults to 200.
+        resource_fraction (float): The fraction of junctions that have a PDB in
+            test/resources. Defaults to 0.2.
+        seed (int): The random seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: The constructs with the name, sequence, structure, data, sn
+        and num_aligned columns.
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    resource_motifs = get_resource_motifs()
+    random_motifs = [random_motif(rng) for _ in range(n_random_motifs)]
+    rows = []
+    for i in range(n_constructs):
+        motifs = [
+            (
+                rng.choice(resource_motifs)
+                if rng.random() < resource_fraction
+                else rng.choice(random_motifs)
+            )
+            for _ in range(motifs_per_construct)
+        ]
+        seq, ss = build_construct(motifs, rng)
+        data = np.round(np_rng.gamma(0.5, 0.02, size=len(seq)), 5)
+        rows.append(
+            {
+                "name": f"construct_{i}",
+                "sequence": seq,
+                "structure": ss,
+                "data": data.tolist(),
+                # a few constructs fail the quality filters like in real data
+                "sn": 2.0 if rng.random() < 0.05 else 8.0,
+                "num_aligned": 5000,
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def get_pdb_r_pos(motif_seq: str) -> List[Tuple[int, str]]:
+    """
+    Returns the residue numbers of a motif in its PDB, as the pipeline numbers them.
+
+    Args:
+        motif_seq (str): The motif sequence, strands separated by "&".
+
+    Returns:
+        List[Tuple[int, str]]: The residue number and nucleotide of each residue.
+    """
+    break_pos = motif_seq.find("&")
+    residues = []
+    for i, e in enumerate(motif_seq):
+        if e == "&":
+            continue
+        pdb_r_pos = i + 3 + (3 if break_pos < i else 0)
+        residues.append((pdb_r_pos, e))
+    return residues
+
+
+def write_pdb_tables(data_path: str = "data", seed: int = 0) -> None:
+    """
+    Writes the PDB tables read by generate_pdb_residue_dataframe for the PDBs in
+    test/resources.
+
+    Args:
+        data_path (str): The data directory. Defaults to "data".
+        seed (int): The random seed. Defaults to 0.
+    """
+    rng = random.Random(seed)
+    pairs, bp_details, resolutions, b_factors = [], [], [], []
+    for pdb_path in sorted(glob.glob(os.path.join(TEST_RESOURCES_PATH, "pdbs/*/*"))):
+        m_sequence = os.path.basename(os.path.dirname(pdb_path))
+        pdb_name = os.path.basename(pdb_path)
+        pdb_base = os.path.splitext(pdb_name)[0]
+        residues = get_pdb_r_pos(m_sequence.replace("_", "&"))
+        resolutions.append(
+            {
+                "pdb_name": pdb_base,
+                "m_sequence": m_sequence,
+                "resolution": round(rng.uniform(1.5, 3.5), 2),
+            }
+        )
+        for k, (pdb_r_pos, nuc) in enumerate(residues):
+            partner = residues[-(k + 1)][0]
+            bp_type = "lone" if k % 4 == 3 else "cWW"
+            pairs.append(
+                {
+                    "pdb_name": pdb_name,
+                    "m_sequence": m_sequence,
+                    "pdb_r_pos": pdb_r_pos,
+                    "pdb_r_bp_type": bp_type,
+                }
+            )
+            if pdb_r_pos < partner:
+                bp_details.append(
+                    {
+                        "name": f"{pdb_base}_x3dna.out",
+                        "motif": m_sequence,
+                        "res_num1": pdb_r_pos,
+                        "res_num2": partner,
+                        "bp": nuc + residues[-(k + 1)][1],
+                    }
+                )
+            b_factor = rng.uniform(20, 80)
+            b_factors.append(
+                {
+                    "pdb_name": pdb_name,
+                    "pdb_r_pos": pdb_r_pos,
+                    "average_b_factor": b_factor,
+                    "normalized_b_factor": b_factor / 50,
+                }
+            )
+    csv_path = os.path.join(data_path, "csvs")
+    pd.DataFrame(pairs).to_csv(
+        os.path.join(csv_path, "basepair_data_for_motifs.csv"), index=False
+    )
+    pd.DataFrame(bp_details).to_csv(
+        os.path.join(csv_path, "all_bp_details.csv"), index=False
+    )
+    pd.DataFrame(resolutions).to_csv(os.path.join(csv_path, "pdb_res.csv"), index=False)
+    pd.DataFrame(b_factors).to_csv(
+        os.path.join(data_path, "pdb-features", "b_factor.csv"), index=False
+    )
+
+
+# structures #######################################################################
+
+
+def get_resource_pdbs() -> List[str]:
+    """Returns the paths of the PDBs in test/resources."""
+    return sorted(glob.glob(os.path.join(TEST_RESOURCES_PATH, "pdbs/*/*.pdb")))
+
+
+def get_motif_base_pairs(motif_seq: str) -> List[Tuple[int, str, int, str]]:
+    """
+    Returns the base pairs of a two-way junction in its PDB numbering.
+
+    The flanking pairs are always paired, the residues of symmetric loops are
+    paired across the loop.
+
+    Args:
+        motif_seq (str): The motif sequence, strands separated by "&".
+
+    Returns:
+        List[Tuple[int, str, int, str]]: The residue number and nucleotide of the
+        two residues of each pair.
+    """
+    residues = get_pdb_r_pos(motif_seq)
+    len_1 = motif_seq.find("&")
+    strand_1, strand_2 = residues[:len_1], residues[len_1:]
+    if len(strand_1) == len(strand_2):
+        return [strand_1[k] + strand_2[-(k + 1)] for k in range(len(strand_1))]
+    return [strand_1[0] + strand_2[-1], strand_1[-1] + strand_2[0]]
+
+
+def make_pdb_corpus(n_copies: int, path: str) -> List[str]:
+    """
+    Replicates the PDBs in test/resources into a corpus of motif directories.
+
+    Args:
+        n_copies (int): The number of copies of each PDB.
+        path (str): The directory of the corpus, e.g. data/pdbs.
+
+    Returns:
+        List[str]: The paths of the PDBs in the corpus.
+    """
+    pdb_paths = []
+    for pdb_path in get_resource_pdbs():
+        motif_dir = os.path.join(path, os.path.basename(os.path.dirname(pdb_path)))
+        os.makedirs(motif_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(pdb_path))[0]
+        for i in range(n_copies):
+            copy_path = os.path.join(motif_dir, f"{stem}.copy{i}.pdb")
+            shutil.copy(pdb_path, copy_path)
+            pdb_paths.append(copy_path)
+    return pdb_paths
+
+
+def write_x3dna_output(pdb_path: str, output_path: str, seed: int = 0) -> None:
+    """
+    Writes a 3DNA analyze output file with the base pairs of a motif PDB.
+
+    Only the sections parsed by extract_basepair_details_into_a_table are written.
+
+    Args:
+        pdb_path (str): The PDB path, its directory is the motif name.
+        output_path (str): The output file.
+        seed (int): The random seed of the base-pair parameters. Defaults to 0.
+    """
+    rng = random.Random(seed)
+    motif = os.path.basename(os.path.dirname(pdb_path))
+    pairs = get_motif_base_pairs(motif.replace("_", "&"))
+    lines = [
+        f"File name: data/pdbs/{motif}/{os.path.basename(pdb_path)}",
+        f"List of {len(pairs)} base pairs",
+    ]
+    for i, (res_1, nuc_1, res_2, nuc_2) in enumerate(pairs):
+        bond = "-----" if nuc_1 + nuc_2 in PAIRS else "-**+-"
+        lines.append(
+            f"{i + 1:>6} (0.010) ....>-:...{res_1}_:[..{nuc_1}]{nuc_1}{bond}{nuc_2}"
+            f"[..{nuc_2}]:..{res_2}_:-<.... (0.012)     |"
+        )
+    lines.append("")
+    lines.append(
+        "                    Shear    Stretch   Stagger    Buckle  Propeller  Opening"
+    )
+    for i, (_, nuc_1, _, nuc_2) in enumerate(pairs):
+        params = "".join(f"{rng.uniform(-10, 10):>10.2f}" for _ in range(6))
+        lines.append(f"{i + 1:>5} {nuc_1}-{nuc_2}{params}")
+    lines.append("")
+    with open(output_path, "w") as f:
+        f.write("\n".join(lines))
+
+
+def write_ideal_pdbs(path: str, seed: int = 0) -> List[Tuple[str, str, List[int]]]:
+    """
+    Writes an ideal base pair PDB for each base pair type in the resource PDBs.
+
+    The ideal pairs are the pairs of the resource PDBs with jittered coordinates,
+    renumbered to residues 1 and 2 like the real ideal PDBs.
+
+    Args:
+        path (str): The ideal_pdbs directory.
+        seed (int): The random seed of the jitter. Defaults to 0.
+
+    Returns:
+        List[Tuple[str, str, List[int]]]: The base pair, PDB path and residue
+        numbers of each pair in the resource PDBs.
+    """
+    np_rng = np.random.default_rng(seed)
+    os.makedirs(path, exist_ok=True)
+    all_pairs = []
+    for pdb_path in get_resource_pdbs():
+        motif = os.path.basename(os.path.dirname(pdb_path))
+        ppdb = PandasPdb().read_pdb(pdb_path)
+        df_atom = ppdb.df["ATOM"]
+        for res_1, nuc_1, res_2, nuc_2 in get_motif_base_pairs(motif.replace("_", "&")):
+            bp = nuc_1 + nuc_2
+            all_pairs.append((bp, pdb_path, [res_1, res_2]))
+            ideal_path = os.path.join(path, f"{bp}.pdb")
+            if os.path.isfile(ideal_path):
+                continue
+            df_pair = df_atom[df_atom["residue_number"].isin([res_1, res_2])].copy()
+            df_pair["residue_number"] = np.where(
+                df_pair["residue_number"] == res_1, 1, 2
+            )
+            for col in ["x_coord", "y_coord", "z_coord"]:
+                df_pair[col] = df_pair[col] + np_rng.normal(0, 0.3, len(df_pair))
+            ideal = PandasPdb()
+            ideal.df["ATOM"] = df_pair
+            ideal.to_pdb(ideal_path, records=["ATOM"])
+    return all_pairs
+
+
+def make_pdb_residue_dataframe(
+    pdb_paths: List[str], n_replicates: int = 5, seed: int = 0
+) -> pd.DataFrame:
+    """
+    Builds a pdb residue dataframe like generate_pdb_residue_dataframe returns for
+    the paired residues of the given PDBs.
+
+    Args:
+        pdb_paths (List[str]): The PDB paths.
+        n_replicates (int): The number of reactivity values per residue.
+            Defaults to 5.
+        seed (int): The random seed. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: One row per residue and reactivity value.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for pdb_path in pdb_paths:
+        motif = os.path.basename(os.path.dirname(pdb_path))
+        for res_1, nuc_1, res_2, nuc_2 in get_motif_base_pairs(motif.replace("_", "&")):
+            for pdb_r_pos, pair_pdb_r_pos in [(res_1, res_2), (res_2, res_1)]:
+                b_factor = rng.uniform(20, 80)
+                for _ in range(n_replicates):
+                    rows.append(
+                        {
+                            "pdb_name": os.path.basename(pdb_path),
+                            "pdb_path": pdb_path,
+                            "pdb_r_pos": pdb_r_pos,
+                            "pair_pdb_r_pos": pair_pdb_r_pos,
+                            "pdb_r_bp_type": "cWW",
+                            "average_b_factor": b_factor,
+                            "normalized_b_factor": b_factor / 50,
+                            "pdb_res": rng.uniform(1.5, 3.5),
+                            "ln_r_data": rng.uniform(-9, -2),
+                        }
+                    )
+    return pd.DataFrame(rows)
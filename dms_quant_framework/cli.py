@@ -1,21 +1,52 @@
 import click
+import json
 import warnings
-import pandas as pd
 import os
 
-from dms_quant_framework.sasa import generate_sasa_dataframe
+from dms_quant_framework.sasa import write_sasa_dataframe
+from dms_quant_framework.contacts import CONTACTS_DIR, write_contact_maps
+from dms_quant_framework.feature_store import FEATURE_STORE_DIR, write_features
 from dms_quant_framework.pdb_features import (
     process_basepair_details,
-    generate_distance_dataframe,
+    write_distance_dataframe,
+    write_wc_details_dataframe,
 )
 from dms_quant_framework.process_motifs import (
     process_mutation_histograms_to_json,
-    GenerateMotifDataFrame,
-    GenerateResidueDataFrame,
-    generate_pdb_residue_dataframe,
+    write_motif_dataframes,
+    write_residue_dataframes,
+    write_pdb_residue_dataframe,
+)
+from dms_quant_framework.library_build import LibraryDesigner, run_designs
+from dms_quant_framework.pipeline import Pipeline, Stage
+from dms_quant_framework.logger import (
+    setup_logging,
+    setup_instrumentation,
+    get_logger,
+    log_span_summary,
+    stage,
+)
+from dms_quant_framework.output_writer import (
+    SYNC_WRITES_ENV,
+    flush_outputs,
+    set_sync_writes,
+)
+from dms_quant_framework.paths import (
+    DATA_PATH_ENV,
+    OUTPUT_PATH_ENV,
+    get_data_path,
+    get_input_file,
+    get_output_file,
+    set_paths,
+)
+from dms_quant_framework.profiling import (
+    PROFILE_MODES,
+    format_top_functions,
+    get_profile_path,
+    list_profiles,
+    profile,
+    set_worker_profiling,
 )
-from dms_quant_framework.logger import setup_logging, get_logger
-from dms_quant_framework.paths import DATA_PATH
 
 warnings.filterwarnings(
     "ignore", message="FreeSASA: warning: Found no matches to resn 'A', typo?"
@@ -28,64 +59,377 @@ log = get_logger("cli")
 
 
 @click.group()
-def cli():
-    pass
+@click.option(
+    "--spans-file",
+    default=None,
+    help="JSON lines file to append the timing and memory of each stage to",
+)
+@click.option(
+    "--profile",
+    "profile_mode",
+    type=click.Choice(PROFILE_MODES),
+    default=None,
+    help="Profile the command with cProfile or a low overhead stack sampler, "
+    "pipeline stages run in worker processes are profiled to one file per stage",
+)
+@click.option("--profile-dir", default="profiles", help="Directory of the profiles")
+@click.option("--profile-interval", default=0.005, help="Seconds between stack samples")
+@click.option(
+    "--data-path",
+    envvar=DATA_PATH_ENV,
+    default=None,
+    help="Directory the inputs are read from, defaults to data",
+)
+@click.option(
+    "--output-path",
+    envvar=OUTPUT_PATH_ENV,
+    default=None,
+    help="Directory the outputs are written to, defaults to the data path",
+)
+@click.option(
+    "--sync-writes",
+    is_flag=True,
+    envvar=SYNC_WRITES_ENV,
+    help="Write outputs before continuing instead of in the background",
+)
+@click.pass_context
+def cli(
+    ctx,
+    spans_file,
+    profile_mode,
+    profile_dir,
+    profile_interval,
+    data_path,
+    output_path,
+    sync_writes,
+):
+    set_paths(data_path, output_path)
+    set_sync_writes(sync_writes)
+    # every command runs as a stage and ends with a summary of where time was spent
+    setup_instrumentation(spans_file)
+    if ctx.invoked_subcommand is not None:
+        ctx.call_on_close(log_span_summary)
+        ctx.with_resource(stage(ctx.invoked_subcommand))
+        if profile_mode is not None:
+            path = get_profile_path(profile_dir, ctx.invoked_subcommand, profile_mode)
+            ctx.with_resource(profile(path, profile_mode, profile_interval))
+            set_worker_profiling(profile_dir, profile_mode, profile_interval)
+        # runs first when the command ends, the writes are part of its stage
+        ctx.call_on_close(flush_outputs)
+
+
+def build_pipeline() -> Pipeline:
+    """
+    Build the pipeline that generates the motif data and the pdb features.
+
+    Returns:
+        Pipeline: The stages with the files they read and write.
+    """
+    constructs = "raw-jsons/constructs"
+    motifs = "raw-jsons/motifs"
+    residues = "raw-jsons/residues"
+    return Pipeline(
+        [
+            Stage(
+                "mutation-histograms",
+                process_mutation_histograms_to_json,
+                inputs=[
+                    "mutation-histograms/*.p",
+                    "csvs/p5_sequences.csv",
+                ],
+                outputs=[
+                    f"{constructs}/pdb_library_1.json",
+                    f"{constructs}/pdb_library_1_data/index.json",
+                ],
+            ),
+            Stage(
+                "motifs",
+                write_motif_dataframes,
+                inputs=[
+                    f"{constructs}/pdb_library_1.json",
+                    "pdbs_w_2bp/*/*.pdb",
+                ],
+                outputs=[
+                    f"{motifs}/pdb_library_1_motifs.json",
+                    f"{motifs}/pdb_library_1_helix.json",
+                    f"{motifs}/pdb_library_1_motifs_concat.json",
+                    f"{motifs}/pdb_library_1_motifs_standard.json",
+                    f"{motifs}/pdb_library_1_motifs_avg.json",
+                ],
+            ),
+            Stage(
+                "residues",
+                write_residue_dataframes,
+                inputs=[f"{motifs}/pdb_library_1_motifs_avg.json"],
+                outputs=[
+                    f"{residues}/pdb_library_1_residues.json",
+                    f"{residues}/pdb_library_1_residues_avg.json",
+                ],
+            ),
+            Stage(
+                "pdb-residues",
+                write_pdb_residue_dataframe,
+                inputs=[
+                    f"{residues}/pdb_library_1_residues.json",
+                    "csvs/basepair_data_for_motifs.csv",
+                    "csvs/pdb_res.csv",
+                    "pdb-features/b_factor.csv",
+                    "pdbs_w_2bp/*/*.pdb",
+                ],
+                # shipped with the data and rebuilt by get-pdb-features, the
+                # motif stages do not run 3DNA
+                external_inputs=["csvs/all_bp_details.csv"],
+                outputs=[
+                    f"{residues}/pdb_library_1_residues_pdb.json",
+                    "pdb-features/pairs.csv",
+                ],
+            ),
+            Stage(
+                "distances",
+                write_distance_dataframe,
+                inputs=["pdbs/*/*.pdb"],
+                outputs=["pdb-features/distances_all.csv"],
+                kwargs={"max_distance": 1000},
+            ),
+            Stage(
+                "contacts",
+                write_contact_maps,
+                inputs=["pdbs/*/*.pdb"],
+                outputs=[f"{CONTACTS_DIR}/index.json"],
+                kwargs={"cutoff": 10.0},
+            ),
+            Stage(
+                "sasa",
+                write_sasa_dataframe,
+                inputs=["pdbs_w_2bp/*/*.pdb"],
+                outputs=["pdb-features/sasa.csv"],
+            ),
+            Stage(
+                "basepair-details",
+                process_basepair_details,
+                inputs=["pdbs/*/*.pdb", "ideal_pdbs/*.pdb"],
+                outputs=["csvs/all_bp_details.csv", "csvs/wc_with_rmsd.csv"],
+            ),
+            # joins the reactivities to the 3DNA pairs, so the 3DNA analysis
+            # does not wait for the motif stages
+            Stage(
+                "wc-details",
+                write_wc_details_dataframe,
+                inputs=[f"{residues}/pdb_library_1_residues.json"],
+                outputs=["csvs/wc_details.csv"],
+                external_inputs=["csvs/wc_with_rmsd.csv"],
+            ),
+            Stage(
+                "features",
+                write_features,
+                inputs=[
+                    "pdb-features/sasa.csv",
+                    "pdb-features/b_factor.csv",
+                    "pdb-features/distances_all.csv",
+                    "csvs/all_bp_details.csv",
+                    "csvs/pdb_res.csv",
+                ],
+                outputs=[f"{FEATURE_STORE_DIR}/schema.json"],
+            ),
+        ]
+    )
+
+
+MOTIF_DATA_STAGES = ["pdb-residues", "wc-details"]
+PDB_FEATURE_STAGES = [
+    "distances",
+    "contacts",
+    "sasa",
+    "basepair-details",
+    "features",
+]
+
+
+def pipeline_options(n_workers: int = 1):
+    """Options shared by the commands that run the pipeline."""
+
+    def decorator(func):
+        func = click.option(
+            "--n-workers",
+            default=n_workers,
+            help="Stages run at the same time in processes, at most the CPU count",
+        )(func)
+        func = click.option(
+            "--force",
+            is_flag=True,
+            help="Rerun stages even if their inputs are unchanged",
+        )(func)
+        return func
+
+    return decorator
 
 
 @cli.command()
-def generate_motif_data():
+@pipeline_options()
+def generate_motif_data(n_workers, force):
     """
     Takes raw mutation histograms from RNA-MaP and generates a JSON file with motif data.
+
+    Runs the mutation-histograms, motifs, residues and pdb-residues stages, and
+    wc-details if the WC pairs of the 3DNA analysis exist. The 3DNA base pairs in
+    all_bp_details.csv and wc_with_rmsd.csv are read as they are, they are only
+    rebuilt by get-pdb-features.
     """
     setup_logging()
 
-    # Check paths exist
-    required_paths = [
-        f"{DATA_PATH}/raw-jsons/constructs",
-        f"{DATA_PATH}/raw-jsons/motifs",
-        f"{DATA_PATH}/raw-jsons/residues",
-    ]
-    for path in required_paths:
-        if not os.path.exists(path):
-            raise ValueError(f"Required directory {path} does not exist")
-
-    process_mutation_histograms_to_json()
-    construct_file = f"{DATA_PATH}/raw-jsons/constructs/pdb_library_1.json"
-    df = pd.read_json(construct_file)
-    gen = GenerateMotifDataFrame()
-    log.info("Generating motif dataframe")
-    gen.run(df, "pdb_library_1")
-    motif_file = f"{DATA_PATH}/raw-jsons/motifs/pdb_library_1_motifs_avg.json"
-    df = pd.read_json(motif_file)
-    log.info("Generating residue dataframe")
-    gen = GenerateResidueDataFrame()
-    gen.run(df, "pdb_library_1")
-    residue_file = f"{DATA_PATH}/raw-jsons/residues/pdb_library_1_residues.json"
-    df = pd.read_json(residue_file)
-    log.info("Generating pdb residue dataframe")
-    df = generate_pdb_residue_dataframe(df)
-    df.to_json(
-        f"{DATA_PATH}/raw-jsons/residues/pdb_library_1_residues_pdb.json",
-        orient="records",
-    )
+    # outputs directories are created as needed, only the inputs must exist
+    data_path = get_data_path()
+    if not os.path.isdir(data_path):
+        raise ValueError(f"Data directory {data_path} does not exist")
+
+    stages = MOTIF_DATA_STAGES
+    if not os.path.isfile(get_input_file("csvs/wc_with_rmsd.csv")):
+        log.warning(
+            "csvs/wc_with_rmsd.csv not found, run get-pdb-features for wc-details"
+        )
+        stages = [name for name in stages if name != "wc-details"]
+    build_pipeline().run(stages, n_workers=n_workers, force=force)
 
 
 @cli.command()
-def get_pdb_features():
+@pipeline_options(n_workers=len(PDB_FEATURE_STAGES))
+def get_pdb_features(n_workers, force):
     """
     Get pdb features for all PDB files in the pdbs directory.
+
+    The distances, contact maps, solvent accessibility and 3DNA analysis only read
+    the pdbs, so they start at the same time in separate processes. They are then
+    joined into the residue feature store.
+    """
+    setup_logging()
+    build_pipeline().run(PDB_FEATURE_STAGES, n_workers=n_workers, force=force)
+
+
+@cli.command()
+@click.option("--stage", "stages", multiple=True, help="Stages to build, default all")
+@click.option("--dry-run", is_flag=True, help="Only list the stages that would run")
+@pipeline_options()
+def run_pipeline(stages, dry_run, n_workers, force):
+    """
+    Runs the stages whose inputs changed since they last ran, and the stages after them.
     """
     setup_logging()
-    # get all distances for different max distances
-    log.info("Getting all distances")
-    df = generate_distance_dataframe(max_distance=1000)
-    df.to_csv(f"{DATA_PATH}/pdb-features/distances_all.csv", index=False)
-    # get all sasa values for different probe radii
-    log.info("Getting all sasa values")
-    df_sasa = generate_sasa_dataframe()
-    df_sasa.to_csv("data/pdb-features/sasa.csv", index=False)
-    log.info("Getting basepair details")
-    process_basepair_details()
+    status = build_pipeline().run(
+        list(stages) or None, n_workers=n_workers, force=force, dry_run=dry_run
+    )
+    for name, stage_status in status.items():
+        click.echo(f"{name}: {stage_status}")
+
+
+@cli.command()
+@click.option(
+    "--motif-file",
+    default=None,
+    help="CSV file with the motifs, defaults to csvs/motif_sequences.csv in the data path",
+)
+@click.option(
+    "--output-file",
+    default=None,
+    help="JSON file to save the library to, numbered if --n-designs > 1, defaults "
+    "to jsons/pdb_library.json in the output path",
+)
+@click.option("--desired-sequences", default=100, help="Number of sequences")
+@click.option("--hairpin", default="GCGAGUAGC", help="Central hairpin sequence")
+@click.option("--hairpin-ss", default="((.....))", help="Central hairpin structure")
+@click.option("--five-prime", default="GGGCUUCGGCCCA", help="5' flank sequence")
+@click.option("--five-prime-ss", default="((((....)))).", help="5' flank structure")
+@click.option("--three-prime", default="AAAGAAACAACAACAACAAC", help="3' flank")
+@click.option("--three-prime-ss", default="." * 20, help="3' flank structure")
+@click.option("--helices-length", default=46, help="Total length of the helices")
+@click.option("--n-designs", default=1, help="Number of independent designs to run")
+@click.option("--n-workers", default=1, help="Worker processes shared by all designs")
+@click.option("--seed", default=None, type=int, help="Seed of the first design")
+@click.option("--checkpoint/--no-checkpoint", default=False, help="Save checkpoints")
+@click.option("--resume", is_flag=True, help="Resume from the checkpoints")
+@click.option(
+    "--metrics-file", default=None, help="JSON file to save the throughput metrics to"
+)
+def design_library(
+    motif_file,
+    output_file,
+    desired_sequences,
+    hairpin,
+    hairpin_ss,
+    five_prime,
+    five_prime_ss,
+    three_prime,
+    three_prime_ss,
+    helices_length,
+    n_designs,
+    n_workers,
+    seed,
+    checkpoint,
+    resume,
+    metrics_file,
+):
+    """
+    Designs libraries of constructs from motifs and reports their throughput.
+    """
+    setup_logging()
+    if output_file is None:
+        output_file = get_output_file("jsons/pdb_library.json")
+    designers = []
+    for i in range(n_designs):
+        design_output = output_file
+        if n_designs > 1:
+            root, ext = os.path.splitext(output_file)
+            design_output = f"{root}_{i + 1}{ext}"
+        checkpoint_path = None
+        if checkpoint or resume:
+            checkpoint_path = f"{os.path.splitext(design_output)[0]}.checkpoint.json.gz"
+        designers.append(
+            LibraryDesigner(
+                motif_file=motif_file,
+                output_file=design_output,
+                desired_sequences=desired_sequences,
+                hairpin=hairpin,
+                hairpin_ss=hairpin_ss,
+                five_prime=five_prime,
+                five_prime_ss=five_prime_ss,
+                three_prime=three_prime,
+                three_prime_ss=three_prime_ss,
+                helices_length=helices_length,
+                checkpoint_path=checkpoint_path,
+                name=f"design_{i + 1}",
+            )
+        )
+    seeds = [None if seed is None else seed + i for i in range(n_designs)]
+    run_designs(designers, n_workers=n_workers, seeds=seeds, resume=resume)
+    metrics = {designer.name: designer.metrics for designer in designers}
+    for name, design_metrics in metrics.items():
+        log.info(
+            f"{name}: {design_metrics['candidates_per_sec']:.1f} candidates/sec, "
+            f"{design_metrics['folds_per_sec']:.1f} folds/sec, "
+            f"acceptance rate {design_metrics['acceptance_rate']:.4f}"
+        )
+    if metrics_file is not None:
+        with open(metrics_file, "w") as f:
+            json.dump(metrics, f, indent=4)
+
+
+@cli.command()
+@click.argument("path")
+@click.option("-n", "--n-functions", default=20, help="Number of functions to show")
+@click.option(
+    "--sort-by",
+    type=click.Choice(["self", "total"]),
+    default="self",
+    help="Sort by the time in the function itself or including its calls",
+)
+def profile_top(path, n_functions, sort_by):
+    """
+    Prints the hottest functions of a profile, or of each profile in a directory.
+    """
+    paths = list_profiles(path) if os.path.isdir(path) else [path]
+    for profile_path in paths:
+        click.echo(profile_path)
+        click.echo(format_top_functions(profile_path, n_functions, sort_by))
+        click.echo()
 
 
 if __name__ == "__main__":
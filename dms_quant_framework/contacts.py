@@ -0,0 +1,328 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from biopandas.pdb import PandasPdb
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+from dms_quant_framework.logger import get_logger, instrument
+from dms_quant_framework.paths import get_output_file, glob_input_files
+
+log = get_logger("contacts")
+
+CONTACTS_DIR = "pdb-features/contacts"
+
+# columns of the atoms of a contact map, in atom index order
+ATOM_COLUMNS = ["residue_number", "residue_name", "atom_name", "strand"]
+
+
+def get_strand_residue_numbers(
+    pdb_path: str, residue_numbers: List[int]
+) -> Tuple[List[int], List[int]]:
+    """
+    Split the residues of a two way junction into its two strands.
+
+    The motif is the name of the directory of the PDB, e.g. ACCC_GACU, and the
+    residues are in the order of the PDB.
+
+    Args:
+        pdb_path (str): Path of the PDB, in a directory named after the motif.
+        residue_numbers (List[int]): The residue numbers in PDB order.
+
+    Returns:
+        Tuple[List[int], List[int]]: The residue numbers of each strand.
+    """
+    motif = os.path.basename(os.path.dirname(pdb_path)).split("_")
+    if residue_numbers[0] != 3:
+        strand_len = len(motif[1])
+    else:
+        strand_len = len(motif[0])
+    return list(residue_numbers[:strand_len]), list(residue_numbers[strand_len:])
+
+
+class ContactMap:
+    """
+    The atom pairs of a structure within a cutoff distance, as a sparse matrix.
+
+    Atoms are indexed in PDB order. The matrix is a symmetric (n_atoms, n_atoms)
+    CSR matrix of float32 distances, so row i is the neighbor list of atom i.
+    Pairs further than the cutoff are not stored. By default only pairs between
+    the two strands of the motif are kept, like
+    get_distance_between_all_atom_pairs_dataframe.
+
+    Example:
+        >>> contacts = ContactMap.from_pdb("data/pdbs/ACCC_GACU/TWOWAY.pdb", 10.0)
+        >>> contacts.distance(4, "N1", 12, "N3")
+        >>> contacts.neighbors(4, "N1", radius=4.0)
+    """
+
+    def __init__(
+        self,
+        pdb_name: str,
+        atoms: pd.DataFrame,
+        matrix: sparse.csr_matrix,
+        cutoff: float,
+    ):
+        """
+        Args:
+            pdb_name (str): The file name of the PDB.
+            atoms (pd.DataFrame): The atoms with the ATOM_COLUMNS, in index order.
+            matrix (sparse.csr_matrix): The (n_atoms, n_atoms) distances.
+            cutoff (float): The largest distance stored.
+        """
+        self.pdb_name = pdb_name
+        self.atoms = atoms.reset_index(drop=True)
+        self.matrix = matrix
+        self.cutoff = cutoff
+        # first atom of each (residue number, atom name), alternate locations are
+        # not indexed
+        self._index = {}
+        for i, key in enumerate(
+            zip(self.atoms["residue_number"], self.atoms["atom_name"])
+        ):
+            self._index.setdefault((int(key[0]), key[1]), i)
+
+    def __repr__(self) -> str:
+        return (
+            f"ContactMap(pdb_name={self.pdb_name!r}, n_atoms={len(self.atoms)}, "
+            f"n_pairs={self.n_pairs}, cutoff={self.cutoff})"
+        )
+
+    @property
+    def n_pairs(self) -> int:
+        """The number of atom pairs stored."""
+        return self.matrix.nnz // 2
+
+    @classmethod
+    def from_pdb(
+        cls, pdb_path: str, cutoff: float = 10.0, inter_strand: bool = True
+    ) -> "ContactMap":
+        """
+        Build the contact map of a PDB with a k-d tree.
+
+        Args:
+            pdb_path (str): Path of the PDB, in a directory named after the motif.
+            cutoff (float): The largest distance stored, in angstroms.
+                Defaults to 10.0.
+            inter_strand (bool): Only keep pairs between the two strands of the
+                motif, otherwise keep all pairs of different residues.
+                Defaults to True.
+
+        Returns:
+            ContactMap: The contacts of the structure.
+        """
+        df_atom = PandasPdb().read_pdb(pdb_path).df["ATOM"]
+        coords = df_atom[["x_coord", "y_coord", "z_coord"]].to_numpy(np.float64)
+        residue_numbers = df_atom["residue_number"].to_numpy()
+        strand_1, _ = get_strand_residue_numbers(
+            pdb_path, list(pd.unique(residue_numbers))
+        )
+        strand = np.where(np.isin(residue_numbers, strand_1), 1, 2)
+        tree = cKDTree(coords)
+        pairs = tree.query_pairs(cutoff, output_type="ndarray")
+        i, j = pairs[:, 0], pairs[:, 1]
+        if inter_strand:
+            keep = strand[i] != strand[j]
+        else:
+            keep = residue_numbers[i] != residue_numbers[j]
+        i, j = i[keep], j[keep]
+        distances = np.linalg.norm(coords[i] - coords[j], axis=1).astype(np.float32)
+        n_atoms = len(df_atom)
+        matrix = sparse.coo_matrix(
+            (
+                np.concatenate([distances, distances]),
+                (np.concatenate([i, j]), np.concatenate([j, i])),
+            ),
+            shape=(n_atoms, n_atoms),
+        ).tocsr()
+        atoms = pd.DataFrame(
+            {
+                "residue_number": residue_numbers,
+                "residue_name": df_atom["residue_name"].to_numpy(),
+                "atom_name": df_atom["atom_name"].to_numpy(),
+                "strand": strand,
+            }
+        )
+        return cls(os.path.basename(pdb_path), atoms, matrix, cutoff)
+
+    def atom_index(self, residue_number: int, atom_name: str) -> int:
+        """
+        Get the index of an atom.
+
+        Args:
+            residue_number (int): The residue number in the PDB.
+            atom_name (str): The atom name, e.g. "N1".
+
+        Returns:
+            int: The row of the atom in the matrix.
+        """
+        key = (int(residue_number), atom_name)
+        if key not in self._index:
+            raise KeyError(f"atom {atom_name} of residue {residue_number} not found")
+        return self._index[key]
+
+    def distance(
+        self, residue_1: int, atom_1: str, residue_2: int, atom_2: str
+    ) -> Optional[float]:
+        """
+        Get the distance between atom_1 of residue_1 and atom_2 of residue_2.
+
+        Args:
+            residue_1 (int): The residue number of the first atom.
+            atom_1 (str): The name of the first atom.
+            residue_2 (int): The residue number of the second atom.
+            atom_2 (str): The name of the second atom.
+
+        Returns:
+            float: The distance, None if the pair is not stored because it is
+            further than the cutoff or not between the strands.
+        """
+        i = self.atom_index(residue_1, atom_1)
+        j = self.atom_index(residue_2, atom_2)
+        row = self.matrix.indices[self.matrix.indptr[i] : self.matrix.indptr[i + 1]]
+        k = np.flatnonzero(row == j)
+        if len(k) == 0:
+            return None
+        return float(self.matrix.data[self.matrix.indptr[i] + k[0]])
+
+    def neighbors(
+        self, residue_number: int, atom_name: str, radius: Optional[float] = None
+    ) -> pd.DataFrame:
+        """
+        Get the atoms within a radius of an atom.
+
+        Args:
+            residue_number (int): The residue number of the atom.
+            atom_name (str): The atom name.
+            radius (float, optional): The radius, at most the cutoff. Defaults to
+                the cutoff.
+
+        Returns:
+            pd.DataFrame: The neighbor atoms with the ATOM_COLUMNS and their
+            distance, sorted by distance.
+        """
+        i = self.atom_index(residue_number, atom_name)
+        start, end = self.matrix.indptr[i], self.matrix.indptr[i + 1]
+        indices = self.matrix.indices[start:end]
+        distances = self.matrix.data[start:end]
+        if radius is not None:
+            self._check_radius(radius)
+            keep = distances <= radius
+            indices, distances = indices[keep], distances[keep]
+        df = self.atoms.iloc[indices].copy()
+        df["distance"] = distances
+        return df.sort_values("distance", kind="stable").reset_index(drop=True)
+
+    def pairs_within(self, radius: Optional[float] = None) -> pd.DataFrame:
+        """
+        Get all atom pairs within a radius.
+
+        Args:
+            radius (float, optional): The radius, at most the cutoff. Defaults to
+                the cutoff.
+
+        Returns:
+            pd.DataFrame: One row per pair with the columns of
+            get_distance_between_all_atom_pairs_dataframe, the lower residue
+            number first.
+        """
+        upper = sparse.triu(self.matrix, k=1).tocoo()
+        i, j, distances = upper.row, upper.col, upper.data
+        if radius is not None:
+            self._check_radius(radius)
+            keep = distances <= radius
+            i, j, distances = i[keep], j[keep], distances[keep]
+        res_nums = self.atoms["residue_number"].to_numpy()
+        swap = res_nums[i] > res_nums[j]
+        first = np.where(swap, j, i)
+        second = np.where(swap, i, j)
+        res_names = self.atoms["residue_name"].to_numpy()
+        atom_names = self.atoms["atom_name"].to_numpy()
+        return pd.DataFrame(
+            {
+                "pdb_name": self.pdb_name,
+                "res_num1": res_nums[first],
+                "res_name1": res_names[first],
+                "atom_name1": atom_names[first],
+                "res_num2": res_nums[second],
+                "res_name2": res_names[second],
+                "atom_name2": atom_names[second],
+                "distance": np.round(distances.astype(np.float64), 2),
+            }
+        )
+
+    def _check_radius(self, radius: float) -> None:
+        if radius > self.cutoff:
+            raise ValueError(
+                f"radius {radius} is larger than the cutoff {self.cutoff} of the "
+                "contact map"
+            )
+
+    def save(self, path: str) -> None:
+        """
+        Save the contact map to a compressed npz file.
+
+        Args:
+            path (str): The output file.
+        """
+        atoms = {col: self.atoms[col].to_numpy() for col in ATOM_COLUMNS}
+        # fixed width strings are loaded without pickle
+        for col in ["residue_name", "atom_name"]:
+            atoms[col] = atoms[col].astype(str)
+        np.savez_compressed(
+            path,
+            data=self.matrix.data,
+            indices=self.matrix.indices,
+            indptr=self.matrix.indptr,
+            shape=np.array(self.matrix.shape),
+            cutoff=np.array(self.cutoff),
+            pdb_name=np.array(self.pdb_name),
+            **atoms,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ContactMap":
+        """
+        Load a contact map saved with save.
+
+        Args:
+            path (str): The npz file.
+
+        Returns:
+            ContactMap: The contact map.
+        """
+        with np.load(path, allow_pickle=False) as f:
+            matrix = sparse.csr_matrix(
+                (f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"])
+            )
+            atoms = pd.DataFrame({col: f[col] for col in ATOM_COLUMNS})
+            return cls(str(f["pdb_name"]), atoms, matrix, float(f["cutoff"]))
+
+
+@instrument()
+def write_contact_maps(cutoff: float = 10.0) -> Dict[str, str]:
+    """
+    Build the contact map of each PDB and save them to the contacts directory.
+
+    Args:
+        cutoff (float): The largest distance stored, in angstroms.
+            Defaults to 10.0.
+
+    Returns:
+        Dict[str, str]: The contact map file of each PDB, also saved as
+        index.json in the contacts directory.
+    """
+    index = {}
+    for pdb_path in glob_input_files("pdbs/*/*.pdb"):
+        contacts = ContactMap.from_pdb(pdb_path, cutoff)
+        motif = os.path.basename(os.path.dirname(pdb_path))
+        name = f"{motif}/{contacts.pdb_name[:-4]}.npz"
+        contacts.save(get_output_file(f"{CONTACTS_DIR}/{name}"))
+        index[contacts.pdb_name] = name
+    with open(get_output_file(f"{CONTACTS_DIR}/index.json"), "w") as f:
+        json.dump(index, f, indent=1)
+    log.info(f"wrote {len(index)} contact maps with a {cutoff} A cutoff")
+    return index
@@ -0,0 +1,263 @@
+import json
+import operator
+import os
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from dms_quant_framework.logger import get_logger
+
+log = get_logger("dataset")
+
+# a filter is a (column, op, value) tuple, e.g. ("r_type", "==", "NON-WC")
+Filter = Tuple[str, str, Any]
+
+_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda x, values: x in values,
+    "not in": lambda x, values: x not in values,
+}
+
+
+def _check_filters(filters: Sequence[Filter]) -> List[Filter]:
+    """Validate filter tuples and convert 'in' values to sets for fast lookups."""
+    checked = []
+    for col, op, value in filters:
+        if op not in _OPERATORS:
+            raise ValueError(
+                f"Unsupported filter operator '{op}', must be one of "
+                f"{list(_OPERATORS.keys())}"
+            )
+        if op in ["in", "not in"]:
+            value = set(value)
+        checked.append((col, op, value))
+    return checked
+
+
+def _record_matches(record: Dict[str, Any], filters: List[Filter]) -> bool:
+    """Check if a single record passes all filters."""
+    for col, op, value in filters:
+        if col not in record:
+            raise KeyError(f"Filter column '{col}' not found in record")
+        try:
+            if not _OPERATORS[op](record[col], value):
+                return False
+        except TypeError:
+            # comparing None/NaN with a number, these never match
+            return False
+    return True
+
+
+def _mask_for_filters(df: pd.DataFrame, filters: List[Filter]) -> pd.Series:
+    """Build a boolean mask for a DataFrame that applies all filters."""
+    mask = pd.Series(True, index=df.index)
+    for col, op, value in filters:
+        if op == "in":
+            mask &= df[col].isin(value)
+        elif op == "not in":
+            mask &= ~df[col].isin(value)
+        else:
+            mask &= _OPERATORS[op](df[col], value)
+    return mask
+
+
+def iter_json_records(path: str, block_size: int = 1 << 20) -> Iterator[Dict]:
+    """
+    Iterates over the records of a JSON file without loading the whole file.
+
+    Supports both files written with `df.to_json(orient="records")` (a single JSON
+    array of objects) and JSON lines files (one object per line).
+
+    Args:
+        path (str): The path to the JSON file.
+        block_size (int): The number of characters to read from disk at a time.
+
+    Yields:
+        Dict: One record at a time.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+        while True:
+            # skip separators between records
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,[]":
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    return
+                buffer = f.read(block_size)
+                pos = 0
+                eof = len(buffer) == 0
+                continue
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # record is split across blocks, read more
+                chunk = f.read(block_size)
+                eof = len(chunk) == 0
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield record
+            pos = end
+
+
+class LazyDataset:
+    """
+    A lazy view over a residue or motif table stored on disk.
+
+    Nothing is read until `to_pandas` or `iter_chunks` is called. Column selection
+    and filters are applied while records are streamed in, so only the rows and
+    columns that are needed are ever materialized as a DataFrame.
+
+    Example:
+        >>> ds = LazyDataset("data/raw-jsons/residues/pdb_library_1_residues.json")
+        >>> df = ds.select(["m_sequence", "r_data"]).filter("has_pdbs", "==", True)
+        >>> df = df.to_pandas()
+    """
+
+    def __init__(
+        self,
+        path: str,
+        columns: Optional[List[str]] = None,
+        filters: Optional[List[Filter]] = None,
+    ):
+        """
+        Args:
+            path (str): The path to a records JSON, JSON lines or CSV file.
+            columns (List[str], optional): The columns to load. Defaults to all.
+            filters (List[Filter], optional): (column, op, value) filters that rows
+                must pass to be loaded. Defaults to None.
+        """
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Dataset file not found: {path}")
+        self.path = path
+        self.columns = list(columns) if columns is not None else None
+        self.filters = _check_filters(filters or [])
+
+    def __repr__(self) -> str:
+        return (
+            f"LazyDataset(path={self.path!r}, columns={self.columns}, "
+            f"filters={self.filters})"
+        )
+
+    def select(self, columns: List[str]) -> "LazyDataset":
+        """
+        Returns a new dataset that only loads the given columns.
+
+        Args:
+            columns (List[str]): The columns to load.
+
+        Returns:
+            LazyDataset: The projected dataset.
+        """
+        return LazyDataset(self.path, columns, self.filters)
+
+    def filter(self, column: str, op: str, value: Any) -> "LazyDataset":
+        """
+        Returns a new dataset with an extra row filter.
+
+        Args:
+            column (str): The column to filter on.
+            op (str): One of ==, !=, <, <=, >, >=, in, not in.
+            value (Any): The value to compare against.
+
+        Returns:
+            LazyDataset: The filtered dataset.
+        """
+        return LazyDataset(
+            self.path, self.columns, self.filters + [(column, op, value)]
+        )
+
+    def iter_chunks(self, chunksize: int = 100000) -> Iterator[pd.DataFrame]:
+        """
+        Iterates over the dataset in DataFrame chunks.
+
+        Args:
+            chunksize (int): The maximum number of rows per chunk.
+
+        Yields:
+            pd.DataFrame: A chunk with the selected columns of the rows that passed
+            all filters.
+        """
+        if self.path.endswith(".csv"):
+            yield from self._iter_csv_chunks(chunksize)
+        else:
+            yield from self._iter_json_chunks(chunksize)
+
+    def to_pandas(self, chunksize: int = 100000) -> pd.DataFrame:
+        """
+        Loads the selected columns and filtered rows into a single DataFrame.
+
+        Args:
+            chunksize (int): The number of rows to parse at a time.
+
+        Returns:
+            pd.DataFrame: The loaded data.
+        """
+        chunks = list(self.iter_chunks(chunksize))
+        if len(chunks) == 0:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(chunks, ignore_index=True)
+
+    def _iter_json_chunks(self, chunksize: int) -> Iterator[pd.DataFrame]:
+        rows = []
+        for record in iter_json_records(self.path):
+            if self.filters and not _record_matches(record, self.filters):
+                continue
+            if self.columns is not None:
+                record = {col: record.get(col) for col in self.columns}
+            rows.append(record)
+            if len(rows) == chunksize:
+                yield pd.DataFrame(rows, columns=self.columns)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows, columns=self.columns)
+
+    def _iter_csv_chunks(self, chunksize: int) -> Iterator[pd.DataFrame]:
+        usecols = None
+        if self.columns is not None:
+            # filter columns must be read even if they are not returned
+            usecols = list(
+                dict.fromkeys(self.columns + [col for col, _, _ in self.filters])
+            )
+        for chunk in pd.read_csv(self.path, usecols=usecols, chunksize=chunksize):
+            if self.filters:
+                chunk = chunk[_mask_for_filters(chunk, self.filters)]
+            if self.columns is not None:
+                chunk = chunk[self.columns]
+            if len(chunk) > 0:
+                yield chunk.reset_index(drop=True)
+
+
+def read_dataset(
+    path: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[Filter]] = None,
+) -> pd.DataFrame:
+    """
+    Reads only the requested columns and rows of a residue or motif table.
+
+    A drop in replacement for `pd.read_json(path)` / `pd.read_csv(path)` followed
+    by a column selection and query.
+
+    Args:
+        path (str): The path to a records JSON, JSON lines or CSV file.
+        columns (List[str], optional): The columns to load. Defaults to all.
+        filters (List[Filter], optional): (column, op, value) filters that rows
+            must pass to be loaded. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The loaded data.
+    """
+    log.debug(f"reading {path} with columns={columns} and filters={filters}")
+    return LazyDataset(path, columns, filters).to_pandas()
@@ -0,0 +1,384 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dms_quant_framework.logger import get_logger, instrument
+from dms_quant_framework.paths import get_input_file, get_output_file
+
+log = get_logger("feature-store")
+
+FEATURE_STORE_DIR = "pdb-features/features"
+SCHEMA_FILE = "schema.json"
+
+KEY_COLUMNS = ["pdb_name", "pdb_r_pos"]
+SASA_COLUMNS = [
+    f"sasa_{str(r).replace('.', '_')}"
+    for r in [0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0]
+]
+B_FACTOR_COLUMNS = ["average_b_factor", "normalized_b_factor"]
+BP_PARAM_COLUMNS = ["shear", "stretch", "stagger", "buckle", "propeller", "opening"]
+
+
+def _column_file(name: str) -> str:
+    return f"{name}.npy"
+
+
+def _pdb_file_name(name: str) -> str:
+    # tables name pdbs with and without the extension
+    return name if name.endswith(".pdb") else f"{name}.pdb"
+
+
+# building the feature table ###################################################
+
+
+def _get_residue_base_pairs(df_bp: pd.DataFrame) -> pd.DataFrame:
+    """
+    Get the base pair of each residue from the 3DNA base pair details.
+
+    Each pair is listed once for each of its residues. The parameters are only
+    kept for residues in exactly one pair, like the pair_pdb_r_pos of the pdb
+    residue dataframe.
+    """
+    df_bp = df_bp.assign(pdb_name=df_bp["name"].str.replace("_x3dna.out", ".pdb"))
+    cols = ["pdb_name", "r_type", "bp", *BP_PARAM_COLUMNS]
+    sides = []
+    for pos_col, pair_col, nuc in [
+        ("res_num1", "res_num2", 0),
+        ("res_num2", "res_num1", 1),
+    ]:
+        df_side = df_bp[cols].copy()
+        df_side["pdb_r_pos"] = df_bp[pos_col].astype(int)
+        df_side["pair_pdb_r_pos"] = df_bp[pair_col].astype(int)
+        df_side["bp_nuc"] = df_bp["bp"].str[nuc]
+        sides.append(df_side)
+    df = pd.concat(sides, ignore_index=True)
+    df["n_bp"] = df.groupby(KEY_COLUMNS)["pdb_r_pos"].transform("size")
+    df = df.drop_duplicates(KEY_COLUMNS)
+    multiple = df["n_bp"] > 1
+    df.loc[multiple, ["r_type", "bp", *BP_PARAM_COLUMNS]] = np.nan
+    df.loc[multiple, "pair_pdb_r_pos"] = -1
+    return df.rename(columns={"r_type": "bp_r_type"})
+
+
+def _get_partner_min_distances(
+    df_dist: pd.DataFrame, df_pairs: pd.DataFrame
+) -> pd.Series:
+    """
+    Get the shortest atom distance between each residue and its pair partner.
+    """
+    df_min = (
+        df_dist.groupby(["pdb_name", "res_num1", "res_num2"])["distance"]
+        .min()
+        .rename("partner_min_distance")
+        .reset_index()
+    )
+    df_keys = pd.DataFrame(
+        {
+            "pdb_name": df_pairs["pdb_name"].to_numpy(),
+            "res_num1": np.minimum(df_pairs["pdb_r_pos"], df_pairs["pair_pdb_r_pos"]),
+            "res_num2": np.maximum(df_pairs["pdb_r_pos"], df_pairs["pair_pdb_r_pos"]),
+        }
+    )
+    df_keys = df_keys.merge(df_min, on=["pdb_name", "res_num1", "res_num2"], how="left")
+    return pd.Series(df_keys["partner_min_distance"].to_numpy(), index=df_pairs.index)
+
+
+@instrument()
+def build_feature_table(
+    df_sasa: pd.DataFrame,
+    df_bfact: pd.DataFrame,
+    df_bp: pd.DataFrame,
+    df_dist: pd.DataFrame,
+    df_res: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Join the structural features of each residue into one table.
+
+    Residues in any of the per residue tables are kept, features a table does not
+    have for a residue are missing.
+
+    Args:
+        df_sasa (pd.DataFrame): The solvent accessibility at each probe radius,
+            sasa.csv.
+        df_bfact (pd.DataFrame): The b-factors, b_factor.csv.
+        df_bp (pd.DataFrame): The 3DNA base pair details, all_bp_details.csv.
+        df_dist (pd.DataFrame): The atom pair distances, distances_all.csv.
+        df_res (pd.DataFrame): The resolution of each pdb, pdb_res.csv.
+
+    Returns:
+        pd.DataFrame: One row per (pdb_name, pdb_r_pos), sorted, with the r_nuc,
+        SASA_COLUMNS, B_FACTOR_COLUMNS, the base pair of the residue
+        (pair_pdb_r_pos, n_bp, bp_r_type, bp, BP_PARAM_COLUMNS), the shortest
+        atom distance to the pair partner and the pdb_res.csv columns.
+    """
+    df_sasa = df_sasa.assign(
+        pdb_name=df_sasa["pdb_path"].apply(os.path.basename),
+    )[[*KEY_COLUMNS, "r_nuc", *SASA_COLUMNS]]
+    df_bfact = df_bfact[[*KEY_COLUMNS, *B_FACTOR_COLUMNS]]
+    df_pairs = _get_residue_base_pairs(df_bp)
+    df_pairs["partner_min_distance"] = _get_partner_min_distances(df_dist, df_pairs)
+    df_pairs.loc[df_pairs["pair_pdb_r_pos"] == -1, "partner_min_distance"] = np.nan
+
+    df = df_sasa.merge(df_bfact, on=KEY_COLUMNS, how="outer")
+    df = df.merge(df_pairs, on=KEY_COLUMNS, how="outer")
+    # residues without sasa get their nucleotide from the base pair
+    df["r_nuc"] = df["r_nuc"].fillna(df.pop("bp_nuc"))
+    df["pair_pdb_r_pos"] = df["pair_pdb_r_pos"].fillna(-1).astype(int)
+    df["n_bp"] = df["n_bp"].fillna(0).astype(int)
+
+    df_res = df_res.drop(columns=["m_sequence"], errors="ignore")
+    df_res = df_res.assign(pdb_name=df_res["pdb_name"].apply(_pdb_file_name))
+    df = df.merge(df_res, on="pdb_name", how="left")
+    df = df.sort_values(KEY_COLUMNS, kind="stable").reset_index(drop=True)
+    if df.duplicated(KEY_COLUMNS).any():
+        raise ValueError("features must have one row per (pdb_name, pdb_r_pos)")
+    return df
+
+
+# storing ######################################################################
+
+
+def _get_column_schema(series: pd.Series) -> Dict:
+    if pd.api.types.is_integer_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return {"name": series.name, "dtype": "int32"}
+    if pd.api.types.is_numeric_dtype(series):
+        # float64 so values read back are the values of the source tables
+        return {"name": series.name, "dtype": "float64"}
+    return {
+        "name": series.name,
+        "dtype": "category",
+        "categories": sorted(series.dropna().astype(str).unique().tolist()),
+    }
+
+
+def write_feature_store(df: pd.DataFrame, path: str) -> "FeatureStore":
+    """
+    Write a feature table to a store with one `.npy` file per column.
+
+    Rows are sorted by (pdb_name, pdb_r_pos). Integer columns are stored as int32
+    and other numbers as float64 with NaN for missing values. Strings are stored
+    as int32 codes into sorted categories, -1 if missing. The dtypes and
+    categories are kept in a schema file next to the columns.
+
+    Args:
+        df (pd.DataFrame): The features, with a pdb_name and a pdb_r_pos column.
+        path (str): The directory of the store, created if it does not exist.
+
+    Returns:
+        FeatureStore: The store opened read only.
+    """
+    if df.duplicated(KEY_COLUMNS).any():
+        raise ValueError("features must have one row per (pdb_name, pdb_r_pos)")
+    os.makedirs(path, exist_ok=True)
+    df = df.sort_values(KEY_COLUMNS, kind="stable")
+    columns = []
+    for name in df.columns:
+        schema = _get_column_schema(df[name])
+        if schema["dtype"] == "category":
+            values = pd.Categorical(
+                df[name].astype("string"), categories=schema["categories"]
+            )
+            values = values.codes.astype(np.int32)
+        else:
+            values = df[name].to_numpy(dtype=schema["dtype"])
+        np.save(os.path.join(path, _column_file(name)), values)
+        columns.append(schema)
+    with open(os.path.join(path, SCHEMA_FILE), "w") as f:
+        json.dump({"n_rows": len(df), "columns": columns}, f, indent=1)
+    log.info(f"wrote {len(df)} residues with {len(columns)} columns to {path}")
+    return FeatureStore(path)
+
+
+class FeatureStore:
+    """
+    Read only access to the residue features written with write_feature_store.
+
+    Columns are memory mapped and only the columns that are used are read.
+    Residues are sorted by (pdb_name, pdb_r_pos), so the residues of a pdb are
+    found with a binary search.
+
+    Example:
+        >>> store = FeatureStore("data/pdb-features/features")
+        >>> store.load(["sasa_2_0", "normalized_b_factor"])
+        >>> store.get("TWOWAY.3WBM.2-2.GACU-ACCC.0.pdb", 4)["partner_min_distance"]
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The directory of the store.
+        """
+        schema_file = os.path.join(path, SCHEMA_FILE)
+        if not os.path.isfile(schema_file):
+            raise FileNotFoundError(f"Feature store schema not found: {schema_file}")
+        self.path = path
+        with open(schema_file) as f:
+            schema = json.load(f)
+        self.n_rows = schema["n_rows"]
+        self._schema = {column["name"]: column for column in schema["columns"]}
+        self._arrays = {}
+        self._pdb_codes = None
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def __repr__(self) -> str:
+        return f"FeatureStore(path={self.path!r}, n_rows={self.n_rows})"
+
+    @property
+    def columns(self) -> List[str]:
+        """The feature columns, without the key columns."""
+        return [name for name in self._schema if name not in KEY_COLUMNS]
+
+    @property
+    def pdb_names(self) -> List[str]:
+        """The pdbs in the store, sorted."""
+        return self._schema["pdb_name"]["categories"]
+
+    def array(self, name: str) -> np.ndarray:
+        """
+        Returns the memory mapped values of a column, codes for categories.
+
+        Args:
+            name (str): The column name.
+
+        Returns:
+            np.ndarray: The read only values in row order.
+        """
+        if name not in self._schema:
+            raise KeyError(f"column {name} is not in the feature store")
+        if name not in self._arrays:
+            self._arrays[name] = np.load(
+                os.path.join(self.path, _column_file(name)), mmap_mode="r"
+            )
+        return self._arrays[name]
+
+    def _column(self, name: str, rows: Optional[np.ndarray]) -> pd.Series:
+        values = self.array(name)
+        values = values[rows] if rows is not None else np.asarray(values)
+        schema = self._schema[name]
+        if schema["dtype"] == "category":
+            values = pd.Categorical.from_codes(values, schema["categories"])
+        return pd.Series(values, name=name)
+
+    def locate(self, pdb_name: str) -> Tuple[int, int]:
+        """
+        Returns the range of rows of the residues of a pdb.
+
+        Args:
+            pdb_name (str): The pdb file name, e.g. "TWOWAY.3WBM.2-2.GACU-ACCC.0.pdb".
+
+        Returns:
+            Tuple[int, int]: The first row and the row after the last.
+        """
+        categories = self.pdb_names
+        code = np.searchsorted(categories, pdb_name)
+        if code == len(categories) or categories[code] != pdb_name:
+            raise KeyError(f"pdb {pdb_name} is not in the feature store")
+        codes = self.array("pdb_name")
+        start = np.searchsorted(codes, code, side="left")
+        end = np.searchsorted(codes, code, side="right")
+        return int(start), int(end)
+
+    def load(
+        self,
+        columns: Optional[List[str]] = None,
+        pdb_names: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Load features as a dataframe.
+
+        Args:
+            columns (List[str], optional): The feature columns. Defaults to all.
+            pdb_names (List[str], optional): Only load the residues of these pdbs.
+                Defaults to all.
+
+        Returns:
+            pd.DataFrame: The pdb_name and pdb_r_pos columns and the features,
+            sorted by (pdb_name, pdb_r_pos). Strings are categorical columns.
+        """
+        if columns is None:
+            columns = self.columns
+        rows = None
+        if pdb_names is not None:
+            ranges = [self.locate(name) for name in sorted(set(pdb_names))]
+            rows = np.concatenate(
+                [np.arange(start, end) for start, end in ranges] or [np.array([], int)]
+            )
+        names = KEY_COLUMNS + [c for c in columns if c not in KEY_COLUMNS]
+        return pd.concat([self._column(name, rows) for name in names], axis=1)
+
+    def get(self, pdb_name: str, pdb_r_pos: int) -> pd.Series:
+        """
+        Get the features of one residue.
+
+        Args:
+            pdb_name (str): The pdb file name.
+            pdb_r_pos (int): The residue number in the pdb.
+
+        Returns:
+            pd.Series: The features of the residue.
+        """
+        start, end = self.locate(pdb_name)
+        positions = self.array("pdb_r_pos")[start:end]
+        row = np.flatnonzero(positions == pdb_r_pos)
+        if len(row) == 0:
+            raise KeyError(f"residue {pdb_r_pos} of {pdb_name} is not in the store")
+        return self.load(pdb_names=[pdb_name]).iloc[row[0]]
+
+
+def load_features(
+    columns: Optional[List[str]] = None, pdb_names: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Load residue features from the feature store of the data path.
+
+    Args:
+        columns (List[str], optional): The feature columns. Defaults to all.
+        pdb_names (List[str], optional): Only load the residues of these pdbs.
+            Defaults to all.
+
+    Returns:
+        pd.DataFrame: The features, see FeatureStore.load.
+    """
+    return FeatureStore(get_input_file(FEATURE_STORE_DIR)).load(columns, pdb_names)
+
+
+def load_b_factors() -> pd.DataFrame:
+    """
+    Load the b-factors of each residue from the feature store, or from
+    b_factor.csv if the feature store has not been built.
+
+    Returns:
+        pd.DataFrame: The pdb_name, pdb_r_pos and B_FACTOR_COLUMNS.
+    """
+    if not os.path.isfile(get_input_file(f"{FEATURE_STORE_DIR}/{SCHEMA_FILE}")):
+        return pd.read_csv(
+            get_input_file("pdb-features/b_factor.csv"),
+            usecols=[*KEY_COLUMNS, *B_FACTOR_COLUMNS],
+        )
+    df = load_features(B_FACTOR_COLUMNS)
+    return df.astype({"pdb_name": str, "pdb_r_pos": np.int64})
+
+
+@instrument()
+def write_features() -> None:
+    """
+    Join the structural features of each residue and write them to the feature
+    store.
+    """
+    df_dist = pd.read_csv(
+        get_input_file("pdb-features/distances_all.csv"),
+        usecols=["pdb_name", "res_num1", "res_num2", "distance"],
+    )
+    df = build_feature_table(
+        pd.read_csv(get_input_file("pdb-features/sasa.csv")),
+        pd.read_csv(get_input_file("pdb-features/b_factor.csv")),
+        pd.read_csv(get_input_file("csvs/all_bp_details.csv")),
+        df_dist,
+        pd.read_csv(get_input_file("csvs/pdb_res.csv")),
+    )
+    write_feature_store(df, os.path.dirname(get_output_file(f"{FEATURE_STORE_DIR}/")))
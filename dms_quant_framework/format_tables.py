@@ -1,3 +1,6 @@
+from typing import List, Tuple
+
+import numpy as np
 import pandas as pd
 from IPython.display import display, HTML
 from tabulate import tabulate
@@ -31,96 +34,219 @@ def dataframe_column_table(df, num_columns=4):
 
 
 def generate_threshold_summary(
-    df, y_column, threshold=-5.45, greater_than=False, sort=True
+    df,
+    y_column,
+    threshold=-5.45,
+    greater_than=False,
+    sort=True,
+    value_column="ln_r_data",
 ):
     """Generates a summary table based on a threshold comparison for a specific column.
 
     This function creates a summary table that shows the percentage of values in a specified
     column that are above or below a given threshold, along with the count of occurrences for
-    each unique value in the y_column.
+    each unique value in the y_column. All groups are summarized in a single groupby pass.
 
     Args:
         df (pd.DataFrame): The input DataFrame containing the data.
         y_column (str): The name of the column to group by and summarize.
-        threshold (float, optional): The threshold value for comparison. Defaults to -5.45.
+        threshold (float or list of float, optional): The threshold value(s) for
+            comparison. Defaults to -5.45.
         greater_than (bool, optional): If True, calculates percentage above threshold.
             If False, calculates percentage below threshold. Defaults to False.
-        sort (bool, optional): If True, sorts the summary by percentage in descending order.
-            Defaults to True.
+        sort (bool, optional): If True, sorts the summary by percentage (of the first
+            threshold) in descending order. Defaults to True.
+        value_column (str, optional): The name of the column compared to the
+            threshold. Defaults to "ln_r_data".
 
     Returns:
-        None: Prints the formatted summary table to the console.
+        pd.DataFrame: The summary with one row per unique value of y_column, a
+        percentage column per threshold and a "Count" column. The formatted summary
+        table is also printed to the console.
     """
-    # Calculate percentages and counts
-    summary = []
     comparison = ">" if greater_than else "<"
-    for y_value in df[y_column].unique():
-        group = df[df[y_column] == y_value]
-        if greater_than:
-            percent = (group["ln_r_data"] > threshold).mean() * 100
-        else:
-            percent = (group["ln_r_data"] < threshold).mean() * 100
-        count = len(group)
-        summary.append([y_value, f"{percent:.2f}%", count])
+    thresholds = list(np.atleast_1d(threshold))
+    percent_cols = [f"% {comparison} {t}" for t in thresholds]
+    values = df[value_column].to_numpy()[:, None]
+    if greater_than:
+        flags = values > np.array(thresholds)[None, :]
+    else:
+        flags = values < np.array(thresholds)[None, :]
+    df_flags = pd.DataFrame(flags, columns=percent_cols, index=df.index)
+    grouped = df_flags.groupby(df[y_column], sort=False, dropna=False)
+    summary = grouped.mean() * 100
+    summary["Count"] = grouped.size()
+    summary.index.name = y_column
     # Sort by percentage descending if sort is True
     if sort:
-        summary.sort(key=lambda x: float(x[1][:-1]), reverse=True)
+        summary = summary.sort_values(percent_cols[0], ascending=False, kind="stable")
+    summary = summary.reset_index()
     # Create table
-    headers = [y_column, f"% {comparison} {threshold}", "Count"]
-    table = tabulate(summary, headers=headers, tablefmt="pipe", floatfmt=".2f")
+    table_rows = summary.copy()
+    for col in percent_cols:
+        table_rows[col] = [f"{p:.2f}%" for p in table_rows[col]]
+    headers = [y_column] + percent_cols + ["Count"]
+    table = tabulate(
+        table_rows.values.tolist(), headers=headers, tablefmt="pipe", floatfmt=".2f"
+    )
     print(f"Summary table for {y_column}:")
     print(table)
+    return summary
+
+
+# statistic name -> (title, number format, colormap)
+HEATMAP_STATISTICS = {
+    "mean": ("Mean", "{:.1f}", "YlOrRd"),
+    "std": ("Std Dev", "{:.2f}", "Greens"),
+    "count": ("Count", "{:.0f}", "Blues"),
+    "median": ("Median", "{:.1f}", "YlOrRd"),
+    "min": ("Min", "{:.1f}", "YlOrRd"),
+    "max": ("Max", "{:.1f}", "YlOrRd"),
+}
+
+
+def _parse_heatmap_statistic(statistic: str) -> Tuple[str, str, str]:
+    """
+    Get the title, number format and colormap of a heatmap statistic.
+
+    Besides the entries of HEATMAP_STATISTICS, percentiles are given as "p" plus the
+    percentile (e.g. "p90") and the percent of values below or above a cutoff as
+    "pct<" or "pct>" plus the cutoff (e.g. "pct<-5.45").
+    """
+    if statistic in HEATMAP_STATISTICS:
+        return HEATMAP_STATISTICS[statistic]
+    if statistic.startswith("pct<") or statistic.startswith("pct>"):
+        float(statistic[4:])
+        return f"% {statistic[3]} {statistic[4:]}", "{:.1f}", "Purples"
+    if statistic.startswith("p"):
+        percentile = float(statistic[1:])
+        if not 0 <= percentile <= 100:
+            raise ValueError(f"Percentile must be between 0 and 100: {statistic}")
+        return f"{statistic[1:]}th Percentile", "{:.1f}", "YlOrRd"
+    raise ValueError(f"Unknown heatmap statistic: {statistic}")
+
+
+def aggregate_heatmap_table(
+    df: pd.DataFrame,
+    index_col: str,
+    column_col: str,
+    value_col: str,
+    statistics: List[str] = ("mean", "std", "count"),
+) -> pd.DataFrame:
+    """
+    Compute the statistics shown by heatmap_table in a single aggregation pass.
+
+    The result can be saved and passed to heatmap_table with aggregated=True so
+    large tables only have to be grouped once.
+
+    Args:
+        df (pd.DataFrame): The input DataFrame containing the data.
+        index_col (str): The name of the column to use as the index for grouping.
+        column_col (str): The name of the column to use for the table columns.
+        value_col (str): The name of the column containing the values to be analyzed.
+        statistics (List[str]): The statistics to compute, see HEATMAP_STATISTICS.
+            Percentiles are given as e.g. "p90" and the percent of values below or
+            above a cutoff as e.g. "pct<-5.45". Defaults to mean, std and count.
+
+    Returns:
+        pd.DataFrame: A DataFrame indexed by (index_col, column_col) with one column
+        per statistic.
+    """
+    df = df[[index_col, column_col, value_col]]
+    named_aggs = {}
+    quantiles = {}
+    for statistic in statistics:
+        _parse_heatmap_statistic(statistic)
+        if statistic == "count":
+            named_aggs[statistic] = (value_col, "size")
+        elif statistic in HEATMAP_STATISTICS:
+            named_aggs[statistic] = (value_col, statistic)
+        elif statistic.startswith("pct"):
+            # percent of values past the cutoff is the mean of a boolean flag
+            cutoff = float(statistic[4:])
+            if statistic[3] == "<":
+                flags = df[value_col] < cutoff
+            else:
+                flags = df[value_col] > cutoff
+            df = df.assign(**{statistic: flags * 100.0})
+            named_aggs[statistic] = (statistic, "mean")
+        else:
+            quantiles[statistic] = float(statistic[1:]) / 100
+    grouped = df.groupby([index_col, column_col])
+    df_stats = grouped.agg(**named_aggs) if named_aggs else None
+    if quantiles:
+        # all percentiles of all groups are computed by one call
+        df_quantiles = (
+            grouped[value_col].quantile(sorted(set(quantiles.values()))).unstack()
+        )
+        df_quantiles = pd.DataFrame(
+            {statistic: df_quantiles[q] for statistic, q in quantiles.items()}
+        )
+        if df_stats is None:
+            df_stats = df_quantiles
+        else:
+            df_stats = df_stats.join(df_quantiles)
+    return df_stats[list(statistics)]
 
 
 def heatmap_table(
-    df: pd.DataFrame, index_col: str, column_col: str, value_col: str
+    df: pd.DataFrame,
+    index_col: str,
+    column_col: str,
+    value_col: str = None,
+    statistics: List[str] = ("mean", "std", "count"),
+    aggregated: bool = False,
 ) -> None:
     """
     Display a heatmap table with mean, standard deviation, and count values.
 
-    This function creates and displays a combined HTML table containing three heatmaps:
-    one for mean values, one for standard deviations, and one for counts. Each heatmap
-    is color-coded using a different colormap.
+    This function creates and displays a combined HTML table containing one heatmap
+    per statistic, by default one for mean values, one for standard deviations, and
+    one for counts. Each heatmap is color-coded using a different colormap. All
+    statistics are computed in a single aggregation pass.
 
     Args:
-        df (pd.DataFrame): The input DataFrame containing the data.
+        df (pd.DataFrame): The input DataFrame containing the data, or the output of
+            aggregate_heatmap_table if aggregated is True.
         index_col (str): The name of the column to use as the index for grouping.
         column_col (str): The name of the column to use for the table columns.
         value_col (str): The name of the column containing the values to be analyzed.
+            Not needed if aggregated is True.
+        statistics (List[str]): The statistics to display, see
+            aggregate_heatmap_table. Defaults to mean, std and count.
+        aggregated (bool): If True, df already holds the statistics computed by
+            aggregate_heatmap_table and is not grouped again. Defaults to False.
 
     Returns:
         None: Displays the combined heatmap table using IPython's display function.
     """
-    # Calculate mean, std, and count
-    mean_values = df.groupby([index_col, column_col])[value_col].mean().unstack()
-    std_values = df.groupby([index_col, column_col])[value_col].std().unstack()
-    count_values = df.groupby([index_col, column_col]).size().unstack()
-
-    # Sort index and columns alphabetically
-    for table in [mean_values, std_values, count_values]:
-        table.sort_index(inplace=True)
-        table.sort_index(axis=1, inplace=True)
-
-    # Style the tables
-    mean_styled = mean_values.style.format("{:.1f}").background_gradient(cmap="YlOrRd")
-    std_styled = std_values.style.format("{:.2f}").background_gradient(cmap="Greens")
-    count_styled = count_values.style.format("{:.0f}").background_gradient(cmap="Blues")
+    if aggregated:
+        df_stats = df
+        if index_col in df_stats.columns and column_col in df_stats.columns:
+            df_stats = df_stats.set_index([index_col, column_col])
+    else:
+        if value_col is None:
+            raise ValueError("value_col is required unless aggregated is True")
+        df_stats = aggregate_heatmap_table(
+            df, index_col, column_col, value_col, statistics
+        )
+
+    tables_html = ""
+    for statistic in statistics:
+        title, number_format, cmap = _parse_heatmap_statistic(statistic)
+        table = df_stats[statistic].unstack()
+        # Sort index and columns alphabetically
+        table = table.sort_index().sort_index(axis=1)
+        styled = table.style.format(number_format).background_gradient(cmap=cmap)
+        tables_html += f"""
+        <div>
+            <h3>{title}</h3>
+            {styled.to_html()}
+        </div>"""
 
     # Combine tables horizontally
     combined_html = f"""
-    <div style="display: flex; justify-content: space-around;">
-        <div>
-            <h3>Mean</h3>
-            {mean_styled.to_html()}
-        </div>
-        <div>
-            <h3>Std Dev</h3>
-            {std_styled.to_html()}
-        </div>
-        <div>
-            <h3>Count</h3>
-            {count_styled.to_html()}
-        </div>
+    <div style="display: flex; justify-content: space-around;">{tables_html}
     </div>
     """
 
@@ -1,9 +1,14 @@
 # Standard library imports
 import re
 import os
+import gzip
+import json
+import math
 import random
-from typing import List, Tuple, Dict
-from collections import defaultdict
+import time
+from typing import List, Tuple, Dict, Optional
+from collections import Counter, defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 
 # Third party imports
 import pandas as pd
@@ -12,7 +17,10 @@ from vienna import fold
 import numpy as np
 
 # Local imports
-from dms_quant_framework.paths import DATA_PATH
+from dms_quant_framework.logger import get_logger, instrument
+from dms_quant_framework.paths import get_input_file, get_output_file
+
+log = get_logger("library-build")
 
 
 def load_data(file_path: str) -> pd.DataFrame:
@@ -46,15 +54,23 @@ def initialize_variables() -> dict:
         "seq_len": [],
         "ens_def": [],
         "edit_dis": [],
+        # bookkeeping for incremental filtering of the pool
+        "n_checked": 0,
+        "usable_set": set(),
+        "diversity_index": BKTree(),
+        "fold_cache": {},
     }
 
 
-def generate_complementary_pairs(rna_bases: dict) -> Tuple[List[str], List[str]]:
+def generate_complementary_pairs(
+    rna_bases: dict, rng: random.Random = random
+) -> Tuple[List[str], List[str]]:
     """
     Generate complementary RNA base pairs for hairpin sets.
 
     Args:
         RNA_bases (dict): Dictionary mapping RNA bases to their complementary pairs.
+        rng (random.Random): Random number generator. Defaults to the random module.
 
     Returns:
         tuple[list[str], list[str]]: Two lists representing complementary hairpin sets.
@@ -62,75 +78,13 @@ def generate_complementary_pairs(rna_bases: dict) -> Tuple[List[str], List[str]]
     items = list(rna_bases.items())
     hairpin_set1, hairpin_set2 = [], []
     for _ in range(2):
-        random.shuffle(items)
-        key, value = random.choice(items)
+        rng.shuffle(items)
+        key, value = rng.choice(items)
         hairpin_set1.append(key)
         hairpin_set2.append(value)
     return hairpin_set1, hairpin_set2[::-1]
 
 
-def select_rows(df: pd.DataFrame, num_rows_to_select: int) -> List[int]:
-    """
-    Randomly select rows from the dataframe.
-
-    Args:
-        df (pd.DataFrame): The dataframe containing motif sequences.
-        num_rows_to_select (int): Number of rows to select.
-
-    Returns:
-        list[int]: List of indices for selected rows.
-    """
-    selected_rows = []
-    available_rows = [row for row in df.index if row not in selected_rows]
-    while len(selected_rows) < num_rows_to_select:
-        if not available_rows:
-            break
-        random_row = random.choice(available_rows)
-        selected_rows.append(random_row)
-    return selected_rows
-
-
-def get_rows_with_min_std_dev(
-    df: pd.DataFrame,
-    selected_count: Dict[str, int],
-    attempts=10,
-    min_rows=5,
-    max_rows=7,
-) -> list:
-    """
-    Find the set of rows that minimize the standard deviation of motif counts.
-
-    Args:
-        df (DataFrame): The data frame containing motif sequences.
-        selected_count (dict): Dictionary tracking the count of each motif.
-        attempts (int): Number of attempts to generate row combinations.
-        min_rows (int): Minimum number of rows to select.
-        max_rows (int): Maximum number of rows to select.
-
-    Returns:
-        list: The rows with the minimum standard deviation of motif counts.
-    """
-    min_std_dev = float("inf")
-    best_selected_rows = None
-
-    for _ in range(attempts):
-        num_rows_to_select = random.randint(min_rows, max_rows)
-        candidate_rows = select_rows(df, num_rows_to_select)
-
-        motif_counts = [
-            selected_count.get(df.loc[row, "motif_seq"], 0) + 1
-            for row in candidate_rows
-        ]
-
-        std_dev = np.std(motif_counts)
-
-        if std_dev < min_std_dev:
-            min_std_dev = std_dev
-            best_selected_rows = candidate_rows
-
-    return best_selected_rows
-
-
 def construct_sequences(
     selected_rows: List[int],
     df: pd.DataFrame,
@@ -143,6 +97,7 @@ def construct_sequences(
     three_prime: List[str],
     three_prime_ss: List[str],
     rna_bases: dict,
+    rng: random.Random = random,
 ) -> Tuple[str, str, List[str], List[str]]:
     """
     Construct RNA sequences and their secondary structures.
@@ -159,6 +114,7 @@ def construct_sequences(
         three_prime (list[str]): 3' sequence.
         three_prime_ss (list[str]): 3' secondary structure.
         rna_bases (dict): RNA base-pair mapping.
+        rng (random.Random): Random number generator. Defaults to the random module.
 
     Returns:
         tuple[str, str, list[str], list[str]]: Full RNA sequence, its secondary structure,
@@ -176,8 +132,8 @@ def construct_sequences(
         selected_ss.append(ss_value)
         set1, set2 = [], []
         for _ in range(3):
-            random.shuffle(items)
-            position1 = random.randint(0, len(items) - 1)
+            rng.shuffle(items)
+            position1 = rng.randint(0, len(items) - 1)
             key, value = items[position1]
             set1.append(key)
             set2.append(value)
@@ -212,213 +168,298 @@ def construct_sequences(
     return "".join(seq), "".join(ss), selected_motifs, selected_ss
 
 
-def validate_sequence(seq_length: int, usable_seq: List[str]) -> bool:
+def get_length_bounds(usable_seq: List[str]) -> Optional[Tuple[int, int]]:
     """
-    Validate the generated sequence based on length.
+    Get the shortest and longest length of the usable sequences.
 
     Args:
-        seq_length (int): the length of the sequence
         usable_seq (list[str]): List of already usable sequences.
 
+    Returns:
+        tuple[int, int]: The min and max length, None if there are no sequences.
+    """
+    if not usable_seq:
+        return None
+    lengths = [len(seq) for seq in usable_seq]
+    return min(lengths), max(lengths)
+
+
+def validate_sequence_length(
+    seq_length: int, length_bounds: Optional[Tuple[int, int]]
+) -> bool:
+    """
+    Validate the generated sequence length against the usable sequence lengths.
+
+    Args:
+        seq_length (int): the length of the sequence
+        length_bounds (tuple[int, int]): The min and max length of the usable
+            sequences, None if there are no usable sequences yet.
+
     Returns:
         bool: True if the sequence is valid, otherwise False.
     """
     if seq_length <= 140:
         return False
-    if usable_seq:
-        max_allowed_length = max(len(seq) for seq in usable_seq) * 1.05
-        min_allowed_length = min(len(seq) for seq in usable_seq) * 0.95
+    if length_bounds is not None:
+        max_allowed_length = length_bounds[1] * 1.05
+        min_allowed_length = length_bounds[0] * 0.95
         if not (min_allowed_length <= seq_length <= max_allowed_length):
             return False
 
     return True
 
 
-def add_to_pool(
-    full_seq: str,
-    full_ss: str,
-    pool: List[str],
-    pool_motifs: List[str],
-    pool_m_ss: List[str],
-    selected_motif: List[str],
-    selected_ss: List[str],
-) -> None:
-    """
-    Add a valid sequence to the pool.
+# candidate verification ##########################################################
 
-    Args:
-        full_seq (str): Generated RNA sequence.
-        full_ss (str): Secondary structure of the sequence.
-        pool (list[str]): List of sequences in the pool.
-        pool_motifs (list[str]): Motifs corresponding to pool sequences.
-        pool_m_ss (list[str]): Secondary structures of the motifs in the pool.
-        selected_motif (list[str]): List of selected motifs.
-        selected_ss (list[str]): List of secondary structures for the motifs.
-    """
-    full_ss_RNAfold = fold(full_seq).dot_bracket
-    if full_ss == full_ss_RNAfold:
-        pool.append(full_seq)
-        pool_motifs.append(selected_motif)
-        pool_m_ss.append(selected_ss)
+WATSON_CRICK_WOBBLE_PAIRS = {"AU", "UA", "GC", "CG", "GU", "UG"}
 
 
-def no_of_seqs_less_than_50(
-    selected_rows: List[int],
-    df: pd.DataFrame,
-    hairpin_set1: List[str],
-    hairpin_set2: List[str],
-    hairpin: List[str],
-    hairpin_ss: List[str],
-    five_prime: List[str],
-    five_prime_ss: List[str],
-    three_prime: List[str],
-    three_prime_ss: List[str],
-    rna_bases: Dict[str, str],
-    variables: Dict,
-    selected_count: Dict[str, int],
-) -> bool:
+def get_base_pairs(ss: str) -> List[Tuple[int, int]]:
     """
-    Process the iteration when usable sequences are less than 50.
+    Get the base pairs of a dot-bracket structure.
 
     Args:
-        selected_rows (list[int]): Indices of selected rows.
-        df (pd.DataFrame): DataFrame containing the motif data.
-        hairpin_set1 (list[str]): First complementary hairpin set.
-        hairpin_set2 (list[str]): Second complementary hairpin set.
-        hairpin (list[str]): Hairpin sequence.
-        hairpin_ss (list[str]): Hairpin secondary structure.
-        five_prime (list[str]): 5' sequence.
-        five_prime_ss (list[str]): 5' secondary structure.
-        three_prime (list[str]): 3' sequence.
-        three_prime_ss (list[str]): 3' secondary structure.
-        rna_bases (dict): RNA base-pair mapping.
-        variables (dict): Dictionary containing global variables for the process.
-        selected_count (dict[str, int]): Dictionary that would give the number of times
-                                         motif was used in the final pool.
+        ss (str): Secondary structure in dot-bracket notation.
 
     Returns:
-        bool: True if a sequence is added to the pool, otherwise False.
+        list[tuple[int, int]]: The (i, j) positions of each base pair, i < j.
     """
-    for row in selected_rows:
-        seq_value = df.loc[row, "motif_seq"]
-        selected_count[seq_value] = selected_count.get(seq_value, 0) + 1
-
-    full_seq, full_ss, selected_motifs, selected_ss = construct_sequences(
-        selected_rows,
-        df,
-        hairpin_set1,
-        hairpin_set2,
-        hairpin,
-        hairpin_ss,
-        five_prime,
-        five_prime_ss,
-        three_prime,
-        three_prime_ss,
-        rna_bases,
-    )
+    stack, pairs = [], []
+    for i, e in enumerate(ss):
+        if e == "(":
+            stack.append(i)
+        elif e == ")":
+            if not stack:
+                raise ValueError(f"Unbalanced structure: {ss}")
+            pairs.append((stack.pop(), i))
+    if stack:
+        raise ValueError(f"Unbalanced structure: {ss}")
+    return pairs
+
+
+def check_candidate_prefilters(
+    seq: str,
+    ss: str,
+    min_gc: Optional[float] = None,
+    max_gc: Optional[float] = None,
+    max_homopolymer: Optional[int] = None,
+    forbidden_sequences: Tuple[str, ...] = (),
+) -> Optional[str]:
+    """
+    Run cheap checks that reject candidates before they are folded.
 
-    add_to_pool(
-        full_seq,
-        full_ss,
-        variables["pool"],
-        variables["pool_motifs"],
-        variables["pool_m_ss"],
-        selected_motifs,
-        selected_ss,
-    )
-    return True
+    By default only candidates that cannot fold into their designed structure are
+    rejected, the GC content and repeat checks are opt-in so they do not change
+    which designs are accepted.
 
+    Args:
+        seq (str): Generated RNA sequence.
+        ss (str): Designed secondary structure of the sequence.
+        min_gc (float, optional): Minimum GC fraction, e.g. 0.3. Defaults to None,
+            no minimum.
+        max_gc (float, optional): Maximum GC fraction, e.g. 0.7. Defaults to None,
+            no maximum.
+        max_homopolymer (int, optional): Longest allowed run of a single base,
+            e.g. 5. Defaults to None, runs of any length.
+        forbidden_sequences (tuple[str, ...]): Subsequences that may not appear.
+            Defaults to none.
 
-def no_of_seqs_greater_than_50(
-    df: pd.DataFrame,
-    hairpin_set1: List[str],
-    hairpin_set2: List[str],
-    hairpin: List[str],
-    hairpin_ss: List[str],
-    five_prime: List[str],
-    five_prime_ss: List[str],
-    three_prime: List[str],
-    three_prime_ss: List[str],
-    rna_bases: Dict[str, str],
-    variables: Dict,
-    selected_count: Dict[str, int],
-    length_w_no_motifs: int,
-) -> bool:
+    Returns:
+        str: The name of the first failed check ("pairing", "gc_content" or
+        "repeat"), None if all checks pass.
+    """
+    if len(seq) != len(ss):
+        return "pairing"
+    for i, j in get_base_pairs(ss):
+        if seq[i] + seq[j] not in WATSON_CRICK_WOBBLE_PAIRS:
+            return "pairing"
+    gc_fraction = (seq.count("G") + seq.count("C")) / len(seq)
+    if min_gc is not None and gc_fraction < min_gc:
+        return "gc_content"
+    if max_gc is not None and gc_fraction > max_gc:
+        return "gc_content"
+    if max_homopolymer is not None and re.search(r"(.)\1{%d,}" % max_homopolymer, seq):
+        return "repeat"
+    for forbidden in forbidden_sequences:
+        if forbidden in seq:
+            return "repeat"
+    return None
+
+
+def get_fold(seq: str, fold_cache: Dict[str, Tuple[str, float]]) -> Tuple[str, float]:
     """
-    Process the iteration when usable sequences are greater than or equal to 50.
+    Get the MFE structure and ensemble defect of a sequence, folding it only once.
 
     Args:
-        df (pd.DataFrame): DataFrame containing the motif data.
-        hairpin_set1 (list[str]): First complementary hairpin set.
-        hairpin_set2 (list[str]): Second complementary hairpin set.
-        hairpin (list[str]): Hairpin sequence.
-        hairpin_ss (list[str]): Hairpin secondary structure.
-        five_prime (list[str]): 5' sequence.
-        five_prime_ss (list[str]): 5' secondary structure.
-        three_prime (list[str]): 3' sequence.
-        three_prime_ss (list[str]): 3' secondary structure.
-        rna_bases (dict): RNA base-pair mapping.
-        variables (dict): Dictionary containing global variables for the process.
-        selected_count (dict[str, int]): Dictionary that would give the number of times
-                                         motif was used in the final pool.
-        length_w_no_motifs (int): length of the sequence without adding the motifs
+        seq (str): The RNA sequence.
+        fold_cache (dict[str, tuple[str, float]]): Cached fold results by sequence.
 
     Returns:
-        bool: True if a sequence is added to the pool, otherwise False.
+        tuple[str, float]: The MFE dot-bracket structure and the ensemble defect.
+    """
+    if seq not in fold_cache:
+        folded = fold(seq)
+        fold_cache[seq] = (folded.dot_bracket, folded.ens_defect)
+    return fold_cache[seq]
+
+
+def verify_candidate(
+    seq: str,
+    ss: str,
+    fold_cache: Dict[str, Tuple[str, float]],
+    **prefilter_kwargs,
+) -> Tuple[str, Optional[Tuple[str, float]]]:
     """
-    best_selected_rows = get_rows_with_min_std_dev(df, selected_count)
+    Verify that a candidate folds into its designed structure.
 
-    if not best_selected_rows:
-        return False
+    Cheap prefilters run first, so obviously invalid candidates are never folded.
+    Survivors are folded once, which gives both the MFE structure and the ensemble
+    defect, and the result is cached so a sequence is never folded twice.
 
-    motifs_length = sum(
-        (len(df.loc[row, "motif_seq"]) - 1) for row in best_selected_rows
-    )
-    seq_length = length_w_no_motifs + motifs_length
+    Args:
+        seq (str): Generated RNA sequence.
+        ss (str): Designed secondary structure of the sequence.
+        fold_cache (dict[str, tuple[str, float]]): Cached fold results by sequence.
+        **prefilter_kwargs: Passed to check_candidate_prefilters.
 
-    if not validate_sequence(seq_length, variables["usable_seq"]):
-        return False
+    Returns:
+        tuple[str, tuple[str, float]]: The status ("ok", "misfold" or the failed
+        prefilter) and the fold result, None if the candidate was not folded.
+    """
+    if seq not in fold_cache:
+        failed = check_candidate_prefilters(seq, ss, **prefilter_kwargs)
+        if failed is not None:
+            return failed, None
+    fold_result = get_fold(seq, fold_cache)
+    if fold_result[0] != ss:
+        return "misfold", fold_result
+    return "ok", fold_result
 
-    for row in best_selected_rows:
-        seq_value = df.loc[row, "motif_seq"]
-        selected_count[seq_value] = selected_count.get(seq_value, 0) + 1
-
-    full_seq, full_ss, selected_motifs, selected_ss = construct_sequences(
-        best_selected_rows,
-        df,
-        hairpin_set1,
-        hairpin_set2,
-        hairpin,
-        hairpin_ss,
-        five_prime,
-        five_prime_ss,
-        three_prime,
-        three_prime_ss,
-        rna_bases,
-    )
 
-    add_to_pool(
-        full_seq,
-        full_ss,
-        variables["pool"],
-        variables["pool_motifs"],
-        variables["pool_m_ss"],
-        selected_motifs,
-        selected_ss,
-    )
-    return True
+# diversity filtering #############################################################
+
+
+class BKTree:
+    """
+    A BK-tree over sequences using the edit distance as the metric.
+
+    Each child is stored under its distance to the parent, so by the triangle
+    inequality a range query only has to descend into the children whose distance
+    is within the query radius of the distance to the parent.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, seq: str) -> None:
+        """
+        Add a sequence to the tree.
+
+        Args:
+            seq (str): The sequence to add.
+        """
+        self.size += 1
+        if self.root is None:
+            self.root = (seq, {})
+            return
+        node = self.root
+        while True:
+            dist = editdistance.eval(seq, node[0])
+            if dist == 0:
+                self.size -= 1
+                return
+            if dist not in node[1]:
+                node[1][dist] = (seq, {})
+                return
+            node = node[1][dist]
+
+    def search(self, seq: str, radius: int) -> List[Tuple[int, str]]:
+        """
+        Find all sequences within a given edit distance of a sequence.
+
+        Args:
+            seq (str): The query sequence.
+            radius (int): The maximum edit distance.
+
+        Returns:
+            list[tuple[int, str]]: The (distance, sequence) of each match.
+        """
+        matches = []
+        if self.root is None:
+            return matches
+        stack = [self.root]
+        while stack:
+            node_seq, children = stack.pop()
+            dist = editdistance.eval(seq, node_seq)
+            if dist <= radius:
+                matches.append((dist, node_seq))
+            for child_dist, child in children.items():
+                if dist - radius <= child_dist <= dist + radius:
+                    stack.append(child)
+        return matches
+
+    def nearest(
+        self, seq: str, stop_dist: Optional[int] = None
+    ) -> Tuple[Optional[int], Optional[str]]:
+        """
+        Find the sequence closest to a sequence.
+
+        Args:
+            seq (str): The query sequence.
+            stop_dist (int, optional): Stop at the first sequence within this edit
+                distance, which is then returned instead of the closest one.
+                Defaults to None, the closest sequence is always found.
+
+        Returns:
+            tuple[int, str]: The distance and closest sequence, (None, None) if the
+            tree is empty.
+        """
+        best_dist, best_seq = None, None
+        if self.root is None:
+            return best_dist, best_seq
+        stack = [self.root]
+        while stack:
+            node_seq, children = stack.pop()
+            dist = editdistance.eval(seq, node_seq)
+            if best_dist is None or dist < best_dist:
+                best_dist, best_seq = dist, node_seq
+                if stop_dist is not None and best_dist <= stop_dist:
+                    break
+            for child_dist, child in children.items():
+                if dist - best_dist < child_dist < dist + best_dist:
+                    stack.append(child)
+        return best_dist, best_seq
 
 
 def finalize_sequences(
-    pool: List[str], variables: dict, desired_sequences: int
+    pool: List[str],
+    variables: dict,
+    desired_sequences: int,
+    min_edit_distance: int = 20,
+    max_ens_defect: float = 5,
 ) -> None:
     """
     Filter and finalize usable sequences from the pool.
 
+    Only the pool sequences added since the last call are checked. A sequence is
+    usable if its ensemble defect is at most `max_ens_defect` and it is more than
+    `min_edit_distance` away from every usable sequence. Fold results are cached and
+    the usable sequences are kept in a BK-tree, so each check only computes edit
+    distances to the plausible neighbors of the candidate. The same nearest
+    neighbor query rejects close candidates, stopping at the first usable sequence
+    within `min_edit_distance`, and gives the edit distance of accepted ones.
+
     Args:
         pool (list[str]): List of sequences in the pool.
         variables (dict): Dictionary containing global variables for the process.
         desired_sequences (int): Number of desired sequences to finalize.
+        min_edit_distance (int): Sequences must be more than this edit distance
+            from all usable sequences. Defaults to 20.
+        max_ens_defect (float): Maximum ensemble defect. Defaults to 5.
     """
     usable_seq, usable_motifs, usable_ss, usable_m_ss, seq_len, ens_def, edit_dis = (
         variables["usable_seq"],
@@ -429,29 +470,33 @@ def finalize_sequences(
         variables["ens_def"],
         variables["edit_dis"],
     )
+    usable_set = variables["usable_set"]
+    diversity_index = variables["diversity_index"]
 
-    for i, (p1, m1, s1) in enumerate(
-        zip(pool, variables["pool_motifs"], variables["pool_m_ss"])
-    ):
-        folded_p1 = fold(p1)
-        ens_defect_p1 = folded_p1.ens_defect
-
-        for p2 in pool[i:]:
-            y = editdistance.eval(p1, p2)
-            if y > 20 and ens_defect_p1 <= 5:
-                if p1 not in usable_seq:
-                    print(p1)
-                    usable_motifs.append(m1)
-                    usable_m_ss.append(s1)
-                    usable_seq.append(p1)
-                    usable_ss.append(folded_p1.dot_bracket)
-                    seq_len.append(len(p1))
-                    ens_def.append(ens_defect_p1)
-                    edit_dis.append(y)
-                break
-
+    while variables["n_checked"] < len(pool):
         if len(usable_seq) >= desired_sequences:
             break
+        i = variables["n_checked"]
+        variables["n_checked"] += 1
+        p1 = pool[i]
+        if p1 in usable_set:
+            continue
+        dot_bracket, ens_defect_p1 = get_fold(p1, variables["fold_cache"])
+        if ens_defect_p1 > max_ens_defect:
+            continue
+        nearest_dist, _ = diversity_index.nearest(p1, stop_dist=min_edit_distance)
+        if nearest_dist is not None and nearest_dist <= min_edit_distance:
+            continue
+        log.debug(p1)
+        usable_motifs.append(variables["pool_motifs"][i])
+        usable_m_ss.append(variables["pool_m_ss"][i])
+        usable_seq.append(p1)
+        usable_set.add(p1)
+        diversity_index.add(p1)
+        usable_ss.append(dot_bracket)
+        seq_len.append(len(p1))
+        ens_def.append(ens_defect_p1)
+        edit_dis.append(nearest_dist if nearest_dist is not None else -1)
 
 
 def save_to_json(variables: dict, output_file: str) -> None:
@@ -476,89 +521,797 @@ def save_to_json(variables: dict, output_file: str) -> None:
     df_final.to_json(output_file, orient="records")
 
 
-def main() -> None:
+# motif sampling ##################################################################
+
+
+def get_motif_length_window(
+    length_bounds: Optional[Tuple[int, int]], length_w_no_motifs: int
+) -> Tuple[int, float]:
     """
-    Main function to generate and save RNA sequences with secondary structures.
+    Get the range of total motif lengths that give a valid sequence length.
+
+    Inverts validate_sequence_length, the total motif length is the sum of
+    len(motif_seq) - 1 over the selected motifs.
+
+    Args:
+        length_bounds (tuple[int, int]): Min and max length of the usable sequences,
+            None if there are none yet.
+        length_w_no_motifs (int): length of the sequence without adding the motifs
+
+    Returns:
+        tuple[int, float]: The min and max total motif length, the max is infinite
+        if there are no usable sequences yet.
     """
-    file_path = f"{DATA_PATH}/csvs/motif_sequences.csv"
-    output_file = f"{DATA_PATH}/jsons/pdb_library.json"
+    min_length = 141
+    max_length = float("inf")
+    if length_bounds is not None:
+        min_length = max(min_length, math.ceil(length_bounds[0] * 0.95))
+        max_length = math.floor(length_bounds[1] * 1.05)
+    return min_length - length_w_no_motifs, max_length - length_w_no_motifs
 
-    jsons_folder = os.path.join(DATA_PATH, "jsons")
-    if not os.path.exists(jsons_folder):
-        os.makedirs(jsons_folder)
 
-    hairpin = list("GCGAGUAGC")
-    hairpin_ss = list("((.....))")
-    rna_bases = {"A": "U", "U": "A", "C": "G", "G": "C"}
-    five_prime = list("GGGCUUCGGCCCA")
-    five_prime_ss = list("((((....)))).")
-    three_prime = list("AAAGAAACAACAACAACAAC")
-    three_prime_ss = list("....................")
-    desired_sequences = 100
+class MotifSampler:
+    """
+    Draws sets of motif rows whose total length is within a given window.
+
+    Instead of drawing motifs at random and rejecting sets with an invalid total
+    length, the sampler precomputes which total lengths can be reached with each
+    number of motifs and only draws motifs that still allow a total length inside
+    the window. Motifs can be weighted by how often they have been used to keep the
+    usage of all motifs balanced.
+    """
+
+    def __init__(self, df: pd.DataFrame, min_rows: int = 5, max_rows: int = 7):
+        """
+        Args:
+            df (pd.DataFrame): DataFrame containing the motif data.
+            min_rows (int): Minimum number of rows to select. Defaults to 5.
+            max_rows (int): Maximum number of rows to select. Defaults to 7.
+        """
+        self.rows = list(df.index)
+        self.motif_seqs = df["motif_seq"].tolist()
+        self.lengths = df["motif_seq"].str.len().to_numpy() - 1
+        self.usage = np.zeros(len(self.rows))
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        # reachable[n][total] is True if n motifs can have a total length of total
+        max_total = max_rows * int(self.lengths.max()) if len(self.rows) else 0
+        unique_lengths = np.unique(self.lengths)
+        reachable = np.zeros((max_rows + 1, max_total + 1), dtype=bool)
+        reachable[0, 0] = True
+        for n in range(1, max_rows + 1):
+            for length in unique_lengths:
+                reachable[n, length:] |= reachable[n - 1, : max_total + 1 - length]
+        # prefix sums make checking if any total in a range is reachable O(1)
+        self.reachable_cumsum = np.concatenate(
+            [np.zeros((max_rows + 1, 1), dtype=int), np.cumsum(reachable, axis=1)],
+            axis=1,
+        )
 
-    df = load_data(file_path)
+    def set_usage(self, selected_count: Dict[str, int]) -> None:
+        """
+        Set the number of times each motif was used.
+
+        Args:
+            selected_count (dict[str, int]): Number of times each motif was used.
+        """
+        self.usage = np.array(
+            [selected_count.get(seq, 0) for seq in self.motif_seqs], dtype=float
+        )
+
+    def _any_reachable(self, n: int, low: float, high: float) -> np.ndarray:
+        """Check if a total length in [low, high] is reachable with n motifs."""
+        max_total = self.reachable_cumsum.shape[1] - 2
+        low = np.clip(np.ceil(low), 0, max_total + 1).astype(int)
+        high = np.clip(np.floor(high), -1, max_total).astype(int)
+        counts = self.reachable_cumsum[n, high + 1] - self.reachable_cumsum[n, low]
+        return (high >= low) & (counts > 0)
+
+    def sample(
+        self,
+        rng: random.Random,
+        length_window: Tuple[int, float],
+        balance: bool = False,
+    ) -> Optional[List[int]]:
+        """
+        Draw a set of motif rows with a total length inside the window.
+
+        Args:
+            rng (random.Random): Random number generator.
+            length_window (tuple[int, float]): Min and max total motif length.
+            balance (bool): If True, motifs are drawn with weights inversely
+                proportional to how often they have been used. Defaults to False.
+
+        Returns:
+            list[int]: The selected rows, None if no set of motifs fits the window.
+        """
+        low, high = length_window
+        num_rows = [
+            n
+            for n in range(self.min_rows, self.max_rows + 1)
+            if self._any_reachable(n, low, high)
+        ]
+        if not num_rows:
+            return None
+        weights = np.ones(len(self.rows))
+        if balance:
+            weights = 1.0 / (1.0 + self.usage - self.usage.min())
+
+        remaining = rng.choice(num_rows)
+        total = 0
+        selected_rows = []
+        while remaining > 0:
+            remaining -= 1
+            # motifs that still allow the remaining motifs to end inside the window
+            allowed = self._any_reachable(
+                remaining, low - total - self.lengths, high - total - self.lengths
+            )
+            allowed_idx = np.flatnonzero(allowed)
+            i = rng.choices(allowed_idx, weights=weights[allowed_idx])[0]
+            selected_rows.append(self.rows[i])
+            total += self.lengths[i]
+        return selected_rows
+
+
+# checkpoints #####################################################################
+
+# design state that is saved in checkpoints, the rest is rebuilt on load
+CHECKPOINT_KEYS = [
+    "pool",
+    "pool_motifs",
+    "pool_m_ss",
+    "usable_seq",
+    "usable_ss",
+    "usable_motifs",
+    "usable_m_ss",
+    "seq_len",
+    "ens_def",
+    "edit_dis",
+    "n_checked",
+]
+
+
+def save_checkpoint(
+    path: str,
+    variables: dict,
+    selected_count: Dict[str, int],
+    seed: int,
+    batch_index: int,
+    run_settings: dict,
+) -> None:
+    """
+    Save the state of a design run to a gzipped JSON checkpoint.
+
+    Candidates are generated from seeds derived from the run seed and the batch
+    index, so these two values are the full random state of the run. The file is
+    written to a temporary file first and then renamed, so an interrupted write
+    never replaces a good checkpoint.
+
+    Args:
+        path (str): Path of the checkpoint file.
+        variables (dict): Dictionary containing global variables for the process.
+        selected_count (dict[str, int]): Number of times each motif was selected.
+        seed (int): Seed of the run.
+        batch_index (int): Index of the next batch to generate.
+        run_settings (dict): Design parameters and batching of the run, used to
+            check that a resumed run matches the original one.
+    """
+    state = {
+        "seed": seed,
+        "batch_index": batch_index,
+        "selected_count": dict(selected_count),
+        "run_settings": run_settings,
+        "variables": {key: variables[key] for key in CHECKPOINT_KEYS},
+    }
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt") as f:
+        json.dump(state, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str) -> dict:
+    """
+    Load the state of a design run from a checkpoint.
+
+    Args:
+        path (str): Path of the checkpoint file.
+
+    Returns:
+        dict: The checkpoint with the seed, batch_index, selected_count,
+        run_settings and the restored variables of the run.
+    """
+    with gzip.open(path, "rt") as f:
+        state = json.load(f)
     variables = initialize_variables()
-    selected_count = defaultdict(int)
+    variables.update(state["variables"])
+    for seq in variables["usable_seq"]:
+        variables["usable_set"].add(seq)
+        variables["diversity_index"].add(seq)
+    # fold results of accepted sequences are not saved, prefill what is known
+    for seq, ss, ens_defect in zip(
+        variables["usable_seq"], variables["usable_ss"], variables["ens_def"]
+    ):
+        variables["fold_cache"][seq] = (ss, ens_defect)
+    state["variables"] = variables
+    return state
 
-    helices_length = 46
-    length_w_no_motifs = (
-        len(hairpin) + len(five_prime) + len(three_prime) + helices_length
-    )
 
-    while len(variables["usable_seq"]) < desired_sequences:
-        hairpin_set1, hairpin_set2 = generate_complementary_pairs(rna_bases)
+# parallel design #################################################################
+
+# set in each worker process by _init_design_worker so the motif dataframe and the
+# design parameters are only sent to each worker once, keyed by design name so one
+# pool can serve several designs
+_worker_state = {}
+# fold results cached by each worker before the cache is reset
+MAX_WORKER_FOLD_CACHE = 100000
+
+
+def get_batch_seed(seed: int, batch_index: int) -> int:
+    """
+    Get the seed of the random number generator used for a batch of candidates.
 
-        num_rows_to_select = random.randint(5, 7)
-        selected_rows = select_rows(df, num_rows_to_select)
+    Each batch gets an independent stream derived from the run seed, so a design run
+    is reproducible no matter which worker generates which batch.
 
+    Args:
+        seed (int): The seed of the design run.
+        batch_index (int): The index of the batch in the run.
+
+    Returns:
+        int: The seed for the batch.
+    """
+    seed_seq = np.random.SeedSequence(entropy=seed, spawn_key=(batch_index,))
+    return int(seed_seq.generate_state(1, dtype=np.uint64)[0])
+
+
+def _init_design_worker(designs: Dict[str, Tuple[pd.DataFrame, dict]]) -> None:
+    """
+    Store the motif dataframe, design parameters and motif sampler of each design
+    in the worker process.
+    """
+    for design_key, (df, params) in designs.items():
+        _worker_state[design_key] = {
+            "df": df,
+            "params": params,
+            "sampler": MotifSampler(df),
+            "fold_cache": {},
+        }
+
+
+def generate_candidate_batch(
+    design_key: str,
+    seed: int,
+    batch_size: int,
+    n_usable: int,
+    length_bounds: Optional[Tuple[int, int]],
+    selected_count: Dict[str, int],
+) -> List[dict]:
+    """
+    Generate and fold a batch of candidate constructs.
+
+    Runs in a worker process. Candidates are built from a snapshot of the design
+    state taken when the batch was submitted, the coordinator re-checks them against
+    the current state before they are accepted.
+
+    Args:
+        design_key (str): Name of the design the batch belongs to.
+        seed (int): Seed for the random number generator of this batch.
+        batch_size (int): Number of candidates to generate.
+        n_usable (int): Number of usable sequences when the batch was submitted.
+        length_bounds (tuple[int, int]): Min and max length of the usable sequences,
+            None if there are none yet.
+        selected_count (dict[str, int]): Number of times each motif was used.
+
+    Returns:
+        list[dict]: One dictionary per candidate that passed the length check with
+        the sequence, structure, motifs, their structures, the verification status
+        and fold result from verify_candidate and whether it had to be folded.
+    """
+    state = _worker_state[design_key]
+    df, params, sampler = state["df"], state["params"], state["sampler"]
+    sampler.set_usage(selected_count)
+    length_window = get_motif_length_window(length_bounds, params["length_w_no_motifs"])
+    rng = random.Random(seed)
+    candidates = []
+    for _ in range(batch_size):
+        hairpin_set1, hairpin_set2 = generate_complementary_pairs(
+            params["rna_bases"], rng
+        )
+        # balance motif usage once half of the library is designed
+        selected_rows = sampler.sample(rng, length_window, balance=n_usable >= 50)
+        if not selected_rows:
+            continue
         motifs_length = sum(
             (len(df.loc[row, "motif_seq"]) - 1) for row in selected_rows
         )
-        seq_length = length_w_no_motifs + motifs_length
+        seq_length = params["length_w_no_motifs"] + motifs_length
+        if not validate_sequence_length(seq_length, length_bounds):
+            continue
+        full_seq, full_ss, selected_motifs, selected_ss = construct_sequences(
+            selected_rows,
+            df,
+            hairpin_set1,
+            hairpin_set2,
+            params["hairpin"],
+            params["hairpin_ss"],
+            params["five_prime"],
+            params["five_prime_ss"],
+            params["three_prime"],
+            params["three_prime_ss"],
+            params["rna_bases"],
+            rng,
+        )
+        fold_cache = state["fold_cache"]
+        if len(fold_cache) > MAX_WORKER_FOLD_CACHE:
+            fold_cache.clear()
+        n_cached = len(fold_cache)
+        status, fold_result = verify_candidate(
+            full_seq, full_ss, fold_cache, **params.get("prefilters", {})
+        )
+        candidates.append(
+            {
+                "seq": full_seq,
+                "ss": full_ss,
+                "seq_length": seq_length,
+                "motifs": selected_motifs,
+                "motifs_ss": selected_ss,
+                "status": status,
+                "fold": fold_result,
+                "folded": len(fold_cache) > n_cached,
+            }
+        )
+    return candidates
+
+
+def accept_candidates(
+    candidates: List[dict], variables: dict, selected_count: Dict[str, int]
+) -> int:
+    """
+    Add the candidates that still satisfy the pool constraints to the pool.
 
-        if not validate_sequence(seq_length, variables["usable_seq"]):
+    Args:
+        candidates (list[dict]): Candidates from generate_candidate_batch.
+        variables (dict): Dictionary containing global variables for the process.
+        selected_count (dict[str, int]): Dictionary that would give the number of times
+                                         motif was used in the final pool.
+
+    Returns:
+        int: The number of candidates added to the pool.
+    """
+    length_bounds = get_length_bounds(variables["usable_seq"])
+    n_added = 0
+    for candidate in candidates:
+        # the usable sequences may have changed since the batch was generated
+        if not validate_sequence_length(candidate["seq_length"], length_bounds):
             continue
+        for motif in candidate["motifs"]:
+            selected_count[motif] = selected_count.get(motif, 0) + 1
+        if candidate["status"] != "ok":
+            continue
+        # keep the fold result so finalize_sequences doesn't fold it again
+        variables["fold_cache"][candidate["seq"]] = candidate["fold"]
+        variables["pool"].append(candidate["seq"])
+        variables["pool_motifs"].append(candidate["motifs"])
+        variables["pool_m_ss"].append(candidate["motifs_ss"])
+        n_added += 1
+    return n_added
+
+
+def get_design_metrics(
+    status_counts: Dict[str, int], n_folded: int, n_accepted: int, elapsed: float
+) -> dict:
+    """
+    Summarize the throughput of a design run.
+
+    Args:
+        status_counts (dict[str, int]): Number of candidates per verification status.
+        n_folded (int): Number of fold calls made by the workers.
+        n_accepted (int): Number of usable sequences found during the run.
+        elapsed (float): Wall time of the run in seconds.
+
+    Returns:
+        dict: The number of candidates, fold calls and accepted sequences, the
+        candidates and fold calls per second, the fraction of candidates that
+        folded into their designed structure, the fraction that became usable
+        sequences (acceptance rate) and the count of each verification status.
+    """
+    n_candidates = sum(status_counts.values())
+    return {
+        "elapsed_sec": round(elapsed, 3),
+        "n_candidates": n_candidates,
+        "n_folds": n_folded,
+        "n_accepted": n_accepted,
+        "candidates_per_sec": n_candidates / elapsed if elapsed > 0 else 0.0,
+        "folds_per_sec": n_folded / elapsed if elapsed > 0 else 0.0,
+        "fold_pass_rate": (
+            status_counts.get("ok", 0) / n_candidates if n_candidates else 0.0
+        ),
+        "acceptance_rate": n_accepted / n_candidates if n_candidates else 0.0,
+        "status_counts": dict(status_counts),
+    }
+
 
-        if len(variables["usable_seq"]) < 50:
-            success = no_of_seqs_less_than_50(
-                selected_rows,
-                df,
-                hairpin_set1,
-                hairpin_set2,
-                hairpin,
-                hairpin_ss,
-                five_prime,
-                five_prime_ss,
-                three_prime,
-                three_prime_ss,
-                rna_bases,
-                variables,
-                selected_count,
+def design_library(
+    df: pd.DataFrame,
+    params: dict,
+    desired_sequences: int,
+    n_workers: int = 1,
+    batch_size: int = 16,
+    batches_per_round: int = 8,
+    seed: Optional[int] = None,
+    checkpoint_path: Optional[str] = None,
+    checkpoint_every: int = 1,
+    resume: bool = False,
+    executor: Optional[Executor] = None,
+    design_key: str = "design",
+) -> dict:
+    """
+    Design a library of constructs by generating and folding candidates in parallel.
+
+    Candidates are generated in rounds of `batches_per_round` batches. All batches
+    of a round see the same snapshot of the design state and are accepted in batch
+    order, so a run with a given seed gives the same library for any number of
+    workers.
+
+    Args:
+        df (pd.DataFrame): DataFrame containing the motif data.
+        params (dict): The design parameters, see main for the keys. An optional
+            "prefilters" entry is passed to check_candidate_prefilters.
+        desired_sequences (int): Number of desired sequences to finalize.
+        n_workers (int): Number of worker processes. Defaults to 1, which runs in
+            the current process.
+        batch_size (int): Number of candidates per batch. Defaults to 16.
+        batches_per_round (int): Number of batches per round. Defaults to 8.
+        seed (int, optional): Seed of the run, a random seed is drawn and logged if
+            not given. Defaults to None.
+        checkpoint_path (str, optional): Path of a checkpoint that is written every
+            `checkpoint_every` rounds. Defaults to None, no checkpoints.
+        checkpoint_every (int): Number of rounds between checkpoints. Defaults to 1.
+        resume (bool): Continue the run saved at `checkpoint_path` if it exists.
+            The resumed run gives the same library as an uninterrupted one.
+            Defaults to False.
+        executor (Executor, optional): A process pool shared with other designs,
+            its workers must be initialized with _init_design_worker for this
+            design. Defaults to None, a pool of `n_workers` is created.
+        design_key (str): Name of the design in the worker processes. Defaults to
+            "design".
+
+    Returns:
+        dict: Dictionary containing global variables for the process. The
+        throughput of the run is stored under "metrics", see get_design_metrics.
+    """
+    run_settings = json.loads(
+        json.dumps(
+            {
+                "params": params,
+                "batch_size": batch_size,
+                "batches_per_round": batches_per_round,
+            }
+        )
+    )
+    variables = initialize_variables()
+    selected_count = defaultdict(int)
+    batch_index = 0
+    if resume and checkpoint_path is not None and os.path.isfile(checkpoint_path):
+        state = load_checkpoint(checkpoint_path)
+        if state["run_settings"] != run_settings:
+            raise ValueError(
+                f"checkpoint {checkpoint_path} was written with different design "
+                "parameters and cannot be resumed"
             )
-        else:
-            success = no_of_seqs_greater_than_50(
-                df,
-                hairpin_set1,
-                hairpin_set2,
-                hairpin,
-                hairpin_ss,
-                five_prime,
-                five_prime_ss,
-                three_prime,
-                three_prime_ss,
-                rna_bases,
-                variables,
-                selected_count,
-                length_w_no_motifs,
+        if seed is not None and seed != state["seed"]:
+            raise ValueError(
+                f"checkpoint {checkpoint_path} was written with seed {state['seed']}"
+                f" not {seed}"
             )
+        seed, batch_index = state["seed"], state["batch_index"]
+        variables = state["variables"]
+        selected_count.update(state["selected_count"])
+        log.info(
+            f"resuming from {checkpoint_path} at batch {batch_index} with "
+            f"{len(variables['usable_seq'])} usable sequences"
+        )
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % (2**63))
+    log.info(f"designing {desired_sequences} sequences with seed {seed}")
+
+    own_executor = None
+    if executor is None and n_workers > 1:
+        executor = own_executor = ProcessPoolExecutor(
+            max_workers=n_workers,
+            initializer=_init_design_worker,
+            initargs=({design_key: (df, params)},),
+        )
+    elif executor is None:
+        _init_design_worker({design_key: (df, params)})
+
+    n_rounds = 0
+    status_counts = Counter()
+    n_folded = 0
+    n_usable_start = len(variables["usable_seq"])
+    start_time = time.perf_counter()
+    try:
+        while len(variables["usable_seq"]) < desired_sequences:
+            snapshot = (
+                len(variables["usable_seq"]),
+                get_length_bounds(variables["usable_seq"]),
+                dict(selected_count),
+            )
+            seeds = [
+                get_batch_seed(seed, batch_index + i) for i in range(batches_per_round)
+            ]
+            batch_index += batches_per_round
+            args = [(design_key, s, batch_size) + snapshot for s in seeds]
+            if executor is not None:
+                results = executor.map(generate_candidate_batch, *zip(*args))
+            else:
+                results = (generate_candidate_batch(*a) for a in args)
+            n_added = 0
+            for candidates in results:
+                status_counts.update(c["status"] for c in candidates)
+                n_folded += sum(c["folded"] for c in candidates)
+                n_added += accept_candidates(candidates, variables, selected_count)
+            if n_added > 0:
+                finalize_sequences(variables["pool"], variables, desired_sequences)
+            log.info(
+                f"Current usable sequences: {len(variables['usable_seq'])}/"
+                f"{desired_sequences}"
+            )
+            n_rounds += 1
+            done = len(variables["usable_seq"]) >= desired_sequences
+            if checkpoint_path is not None and (
+                done or n_rounds % checkpoint_every == 0
+            ):
+                save_checkpoint(
+                    checkpoint_path,
+                    variables,
+                    selected_count,
+                    seed,
+                    batch_index,
+                    run_settings,
+                )
+    finally:
+        if own_executor is not None:
+            own_executor.shutdown()
+    variables["metrics"] = get_design_metrics(
+        status_counts,
+        n_folded,
+        len(variables["usable_seq"]) - n_usable_start,
+        time.perf_counter() - start_time,
+    )
+    log.info(f"{design_key} metrics: {json.dumps(variables['metrics'])}")
+    return variables
+
+
+# library designer ################################################################
+
+
+class LibraryDesigner:
+    """
+    Designs a library of constructs that each hold several motifs.
 
-        if success:
-            finalize_sequences(variables["pool"], variables, desired_sequences)
+    Each construct is a 5' flank, the motifs stacked on helices around a hairpin
+    and a 3' flank. All settings of the design are parameters, the defaults are
+    the ones used for pdb_library_1.
 
-        print(
-            f"Current usable sequences: {len(variables['usable_seq'])}/{desired_sequences}"
+    Example:
+        >>> designer = LibraryDesigner(desired_sequences=50, output_file="lib.json")
+        >>> variables = designer.run(n_workers=4, seed=1)
+        >>> designer.metrics["candidates_per_sec"]
+    """
+
+    def __init__(
+        self,
+        motif_file: Optional[str] = None,
+        output_file: Optional[str] = None,
+        desired_sequences: int = 100,
+        hairpin: str = "GCGAGUAGC",
+        hairpin_ss: str = "((.....))",
+        five_prime: str = "GGGCUUCGGCCCA",
+        five_prime_ss: str = "((((....)))).",
+        three_prime: str = "AAAGAAACAACAACAACAAC",
+        three_prime_ss: str = "....................",
+        helices_length: int = 46,
+        prefilters: Optional[dict] = None,
+        checkpoint_path: Optional[str] = None,
+        name: str = "design",
+    ):
+        """
+        Args:
+            motif_file (str, optional): CSV file with the motif_seq and motif_ss
+                columns. Defaults to csvs/motif_sequences.csv in the data path.
+            output_file (str, optional): JSON file the usable sequences are saved
+                to. Defaults to None, they are not saved.
+            desired_sequences (int): Number of sequences to design. Defaults to 100.
+            hairpin (str): Hairpin at the center of each construct.
+            hairpin_ss (str): Secondary structure of the hairpin.
+            five_prime (str): 5' flank of each construct.
+            five_prime_ss (str): Secondary structure of the 5' flank.
+            three_prime (str): 3' flank of each construct.
+            three_prime_ss (str): Secondary structure of the 3' flank.
+            helices_length (int): Total length of the helices between motifs.
+                Defaults to 46.
+            prefilters (dict, optional): Arguments of check_candidate_prefilters.
+                Defaults to None, the defaults of check_candidate_prefilters.
+            checkpoint_path (str, optional): Path of the run checkpoint. Defaults to
+                None, no checkpoints.
+            name (str): Name of the design used in logs. Defaults to "design".
+        """
+        for seq, ss in [
+            (hairpin, hairpin_ss),
+            (five_prime, five_prime_ss),
+            (three_prime, three_prime_ss),
+        ]:
+            if len(seq) != len(ss):
+                raise ValueError(
+                    f"sequence {seq} and structure {ss} must have the same length"
+                )
+        if motif_file is None:
+            motif_file = get_input_file("csvs/motif_sequences.csv")
+        self.motif_file = motif_file
+        self.output_file = output_file
+        self.desired_sequences = desired_sequences
+        self.hairpin = hairpin
+        self.hairpin_ss = hairpin_ss
+        self.five_prime = five_prime
+        self.five_prime_ss = five_prime_ss
+        self.three_prime = three_prime
+        self.three_prime_ss = three_prime_ss
+        self.helices_length = helices_length
+        self.prefilters = prefilters
+        self.checkpoint_path = checkpoint_path
+        self.name = name
+        self.metrics = None
+
+    def get_params(self) -> dict:
+        """
+        Get the design parameters used by design_library.
+
+        Returns:
+            dict: The design parameters.
+        """
+        params = {
+            "hairpin": list(self.hairpin),
+            "hairpin_ss": list(self.hairpin_ss),
+            "rna_bases": {"A": "U", "U": "A", "C": "G", "G": "C"},
+            "five_prime": list(self.five_prime),
+            "five_prime_ss": list(self.five_prime_ss),
+            "three_prime": list(self.three_prime),
+            "three_prime_ss": list(self.three_prime_ss),
+            "length_w_no_motifs": len(self.hairpin)
+            + len(self.five_prime)
+            + len(self.three_prime)
+            + self.helices_length,
+        }
+        if self.prefilters is not None:
+            params["prefilters"] = self.prefilters
+        return params
+
+    def load_motifs(self) -> pd.DataFrame:
+        """
+        Load the motifs the library is designed from.
+
+        Returns:
+            pd.DataFrame: DataFrame containing the motif data.
+        """
+        return load_data(self.motif_file)
+
+    @instrument()
+    def run(
+        self,
+        n_workers: int = 1,
+        seed: Optional[int] = None,
+        resume: bool = False,
+        executor: Optional[Executor] = None,
+        df: Optional[pd.DataFrame] = None,
+    ) -> dict:
+        """
+        Design the library and save it to the output file.
+
+        Args:
+            n_workers (int): Number of worker processes. Defaults to 1.
+            seed (int, optional): Seed of the run. Defaults to None.
+            resume (bool): Resume from the checkpoint if there is one.
+                Defaults to False.
+            executor (Executor, optional): A process pool shared with other
+                designs, see run_designs. Defaults to None.
+            df (pd.DataFrame, optional): The motifs, loaded from the motif file if
+                not given. Defaults to None.
+
+        Returns:
+            dict: Dictionary containing global variables for the process.
+        """
+        if df is None:
+            df = self.load_motifs()
+        variables = design_library(
+            df,
+            self.get_params(),
+            self.desired_sequences,
+            n_workers=n_workers,
+            seed=seed,
+            checkpoint_path=self.checkpoint_path,
+            resume=resume,
+            executor=executor,
+            design_key=self.name,
         )
-    save_to_json(variables, output_file)
+        self.metrics = variables["metrics"]
+        if self.output_file is not None:
+            output_dir = os.path.dirname(self.output_file)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
+            save_to_json(variables, self.output_file)
+        return variables
+
+
+def run_designs(
+    designers: List[LibraryDesigner],
+    n_workers: int = 1,
+    seeds: Optional[List[Optional[int]]] = None,
+    resume: bool = False,
+) -> List[dict]:
+    """
+    Run several independent library designs that share one process pool.
+
+    Each design is coordinated by its own thread, the candidate batches of all
+    designs are generated and folded by the same worker processes.
+
+    Args:
+        designers (list[LibraryDesigner]): The designs to run, names must be unique.
+        n_workers (int): Number of worker processes shared by all designs.
+            Defaults to 1, the designs run one after the other in this process.
+        seeds (list[int], optional): Seed of each design. Defaults to None.
+        resume (bool): Resume each design from its checkpoint if there is one.
+            Defaults to False.
+
+    Returns:
+        list[dict]: The variables of each design, in the order of `designers`.
+    """
+    names = [designer.name for designer in designers]
+    if len(set(names)) != len(names):
+        raise ValueError(f"design names must be unique: {names}")
+    if seeds is None:
+        seeds = [None] * len(designers)
+    dfs = [designer.load_motifs() for designer in designers]
+    if n_workers <= 1:
+        return [
+            designer.run(seed=seed, resume=resume, df=df)
+            for designer, seed, df in zip(designers, seeds, dfs)
+        ]
+    designs = {
+        designer.name: (df, designer.get_params())
+        for designer, df in zip(designers, dfs)
+    }
+    with ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_init_design_worker, initargs=(designs,)
+    ) as executor, ThreadPoolExecutor(max_workers=len(designers)) as threads:
+        futures = [
+            threads.submit(
+                designer.run, seed=seed, resume=resume, executor=executor, df=df
+            )
+            for designer, seed, df in zip(designers, seeds, dfs)
+        ]
+        return [future.result() for future in futures]
+
+
+def main(n_workers: int = 1, seed: Optional[int] = None, resume: bool = False) -> None:
+    """
+    Main function to generate and save RNA sequences with secondary structures.
+
+    The design state is checkpointed after every round, so an interrupted run can
+    be continued with `resume=True`.
+
+    Args:
+        n_workers (int): Number of worker processes used to generate and fold
+            candidates. Defaults to 1.
+        seed (int, optional): Seed of the design run. Defaults to None.
+        resume (bool): Resume from the last checkpoint if there is one.
+            Defaults to False.
+    """
+    designer = LibraryDesigner(
+        output_file=get_output_file("jsons/pdb_library.json"),
+        checkpoint_path=get_output_file("jsons/pdb_library.checkpoint.json.gz"),
+    )
+    designer.run(n_workers=n_workers, seed=seed, resume=resume)
 
 
 if __name__ == "__main__":
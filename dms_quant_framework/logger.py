@@ -11,23 +11,45 @@ Functions:
 
     - get_logger(module_name: str = "") -> logging.Logger
         Get a logger instance with the specified module name.
+
+    - stage(name: str, ...) / span(name: str, ...) -> ContextManager[Span]
+        Record the wall time, CPU time, peak RSS and rows of a block of code.
+
+    - instrument(name: str = None, kind: str = "span") -> Callable
+        Decorator that records each call of a function as a span.
+
+    - log_span_summary() -> str
+        Log a table of the time spent in each stage and span of the run.
 """
 
+import contextlib
+import functools
+import json
 import logging
 import sys
+import threading
+import time
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
 
 # logging #####################################################################
 
 APP_LOGGER_NAME = "dms-quant-framework"
 
 
-def setup_logging(file_name: str = None) -> logging.Logger:
+def setup_logging(file_name: str = None, metrics_file: str = None) -> logging.Logger:
     """
     Set up logging configuration.
 
     Args:
         file_name (str, optional): The name of the log file. If provided, logs will be
         written to this file.
+        metrics_file (str, optional): The name of a JSON lines file. If provided, a
+        record of each finished stage and span is appended to this file.
 
     Returns:
         None
@@ -50,6 +72,8 @@ def setup_logging(file_name: str = None) -> logging.Logger:
         fh.setFormatter(formatter)
         root_logger.addHandler(fh)
 
+    if metrics_file:
+        setup_instrumentation(metrics_file)
     return root_logger
 
 
@@ -65,3 +89,314 @@ def get_logger(module_name: str = "") -> logging.Logger:
 
     """
     return logging.getLogger(APP_LOGGER_NAME).getChild(module_name)
+
+
+# instrumentation #############################################################
+
+_spans_lock = threading.Lock()
+_span_stack = threading.local()
+_span_records: List[Dict[str, Any]] = []
+_metrics_file: Optional[str] = None
+
+
+def setup_instrumentation(metrics_file: str = None) -> None:
+    """
+    Clear the recorded spans and set where they are written.
+
+    Args:
+        metrics_file (str, optional): The name of a JSON lines file that each
+        finished span is appended to. If None, spans are only kept in memory.
+    """
+    global _metrics_file
+    with _spans_lock:
+        _span_records.clear()
+        _metrics_file = metrics_file
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    """
+    Get the peak resident set size of this process in MB.
+
+    Returns:
+        float: The peak RSS, None if it is not available on this platform.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == "darwin":
+        return max_rss / 2**20
+    return max_rss / 2**10
+
+
+class Span:
+    """
+    A timed block of code, created by the stage and span context managers.
+
+    Rows are the sizes of the data going in and out of the block, they are set
+    by the caller when they are known.
+    """
+
+    def __init__(self, name: str, kind: str, parent: Optional[str], **fields):
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.path = name if parent is None else f"{parent}/{name}"
+        self.rows_in: Optional[int] = None
+        self.rows_out: Optional[int] = None
+        self.fields = fields
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._rss_start = get_peak_rss_mb()
+        self.record: Optional[Dict[str, Any]] = None
+
+    def set_rows(self, rows_in: int = None, rows_out: int = None) -> None:
+        """
+        Set the number of rows going in and out of the span.
+
+        Args:
+            rows_in (int, optional): The number of input rows.
+            rows_out (int, optional): The number of output rows.
+        """
+        if rows_in is not None:
+            self.rows_in = int(rows_in)
+        if rows_out is not None:
+            self.rows_out = int(rows_out)
+
+    def finish(self, error: Optional[BaseException] = None) -> Dict[str, Any]:
+        """
+        Stop the span and build its record.
+
+        Args:
+            error (BaseException, optional): The exception that ended the span.
+
+        Returns:
+            Dict[str, Any]: The record of the span.
+        """
+        peak_rss_mb = get_peak_rss_mb()
+        self.record = {
+            "name": self.name,
+            "kind": self.kind,
+            "path": self.path,
+            "parent": self.parent,
+            "wall_sec": round(time.perf_counter() - self._wall_start, 6),
+            "cpu_sec": round(time.process_time() - self._cpu_start, 6),
+            "peak_rss_mb": peak_rss_mb,
+            "rss_growth_mb": (
+                None if peak_rss_mb is None else peak_rss_mb - self._rss_start
+            ),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "status": "ok" if error is None else type(error).__name__,
+            "timestamp": time.time(),
+            **self.fields,
+        }
+        return self.record
+
+
+def _emit_span(record: Dict[str, Any]) -> None:
+    line = json.dumps(record, default=str)
+    with _spans_lock:
+        _span_records.append(record)
+        if _metrics_file is not None:
+            with open(_metrics_file, "a") as f:
+                f.write(line + "\n")
+    get_logger("spans").debug(line)
+
+
+@contextlib.contextmanager
+def span(
+    name: str, rows_in: int = None, kind: str = "span", **fields
+) -> Iterator[Span]:
+    """
+    Record the wall time, CPU time, peak RSS and rows of a block of code.
+
+    Spans nest, a span opened inside another is recorded with the path of its
+    parent, e.g. "generate-motif-data/GenerateMotifDataFrame.run". CPU time is the
+    CPU time of the whole process, so it includes threads working in parallel.
+
+    Example:
+        >>> with span("merge", rows_in=len(df)) as s:
+        ...     df = df.merge(df_other)
+        ...     s.set_rows(rows_out=len(df))
+
+    Args:
+        name (str): The name of the span.
+        rows_in (int, optional): The number of input rows.
+        kind (str): The kind of span, "stage" or "span". Defaults to "span".
+        **fields: Extra values added to the record.
+
+    Yields:
+        Span: The span, to set the rows once they are known.
+    """
+    stack = _span_stack.__dict__.setdefault("spans", [])
+    parent = stack[-1].path if stack else None
+    current = Span(name, kind, parent, **fields)
+    current.set_rows(rows_in=rows_in)
+    stack.append(current)
+    error = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        stack.pop()
+        _emit_span(current.finish(error))
+
+
+def stage(name: str, rows_in: int = None, **fields) -> ContextManager[Span]:
+    """
+    Record a top level step of the pipeline, see span.
+
+    Args:
+        name (str): The name of the stage.
+        rows_in (int, optional): The number of input rows.
+        **fields: Extra values added to the record.
+
+    Returns:
+        ContextManager[Span]: The span of the stage.
+    """
+    return span(name, rows_in=rows_in, kind="stage", **fields)
+
+
+def _count_rows(value: Any) -> Optional[int]:
+    if hasattr(value, "shape") and len(getattr(value, "shape")) > 0:
+        return value.shape[0]
+    if isinstance(value, (list, tuple, dict)):
+        return len(value)
+    return None
+
+
+def instrument(name: str = None, kind: str = "span") -> Callable:
+    """
+    Decorator that records each call of a function as a span.
+
+    The input rows are the rows of the first dataframe or array argument and the
+    output rows are the rows of the return value, when they have any.
+
+    Args:
+        name (str, optional): The name of the span. Defaults to the qualified name
+        of the function.
+        kind (str): The kind of span, "stage" or "span". Defaults to "span".
+
+    Returns:
+        Callable: The decorator.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows_in = None
+            for arg in list(args) + list(kwargs.values()):
+                if hasattr(arg, "shape"):
+                    rows_in = _count_rows(arg)
+                    break
+            with span(span_name, rows_in=rows_in, kind=kind) as current:
+                result = func(*args, **kwargs)
+                current.set_rows(rows_out=_count_rows(result))
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def add_span_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Record spans that finished in another process, e.g. a worker process.
+
+    The spans are nested under the span that is open in this thread.
+
+    Args:
+        records (List[Dict[str, Any]]): The span records, in the order the spans
+        finished.
+
+    Returns:
+        List[Dict[str, Any]]: The records as they were added.
+    """
+    stack = _span_stack.__dict__.get("spans", [])
+    parent = stack[-1].path if stack else None
+    added = []
+    for record in records:
+        record = dict(record)
+        if parent is not None:
+            record["path"] = f"{parent}/{record['path']}"
+            record["parent"] = (
+                parent if record["parent"] is None else f"{parent}/{record['parent']}"
+            )
+        _emit_span(record)
+        added.append(record)
+    return added
+
+
+def get_span_records() -> List[Dict[str, Any]]:
+    """
+    Get the records of the spans finished since instrumentation was set up.
+
+    Returns:
+        List[Dict[str, Any]]: The records, in the order the spans finished.
+    """
+    with _spans_lock:
+        return list(_span_records)
+
+
+def format_span_summary(records: List[Dict[str, Any]] = None) -> str:
+    """
+    Format a table of the time spent in each span, grouped by span path.
+
+    Args:
+        records (List[Dict[str, Any]], optional): The span records. Defaults to the
+        spans recorded in this run.
+
+    Returns:
+        str: The table, one line per span path in the order they first started.
+    """
+    if records is None:
+        records = get_span_records()
+    records = sorted(records, key=lambda r: r["timestamp"] - r["wall_sec"])
+    total_sec = sum(r["wall_sec"] for r in records if r["parent"] is None)
+    summary: Dict[str, Dict[str, Any]] = {}
+    for r in records:
+        row = summary.setdefault(
+            r["path"],
+            {"calls": 0, "wall_sec": 0.0, "cpu_sec": 0.0, "peak_rss_mb": None},
+        )
+        row["calls"] += 1
+        row["wall_sec"] += r["wall_sec"]
+        row["cpu_sec"] += r["cpu_sec"]
+        if r["peak_rss_mb"] is not None:
+            row["peak_rss_mb"] = max(row["peak_rss_mb"] or 0, r["peak_rss_mb"])
+        for key in ["rows_in", "rows_out"]:
+            if r[key] is not None:
+                row[key] = row.get(key, 0) + r[key]
+    lines = [
+        f"{'span':<60} {'calls':>6} {'wall s':>10} {'cpu s':>10} {'% run':>6} "
+        f"{'peak MB':>9} {'rows in':>10} {'rows out':>10}"
+    ]
+    for path, row in summary.items():
+        depth = path.count("/")
+        label = "  " * depth + path.split("/")[-1]
+        percent = 100 * row["wall_sec"] / total_sec if total_sec > 0 else 0.0
+        peak = row["peak_rss_mb"]
+        lines.append(
+            f"{label:<60} {row['calls']:>6} {row['wall_sec']:>10.3f} "
+            f"{row['cpu_sec']:>10.3f} {percent:>6.1f} "
+            f"{'-' if peak is None else f'{peak:.1f}':>9} "
+            f"{row.get('rows_in', '-'):>10} {row.get('rows_out', '-'):>10}"
+        )
+    return "\n".join(lines)
+
+
+def log_span_summary() -> str:
+    """
+    Log the summary table of the spans recorded in this run.
+
+    Returns:
+        str: The table.
+    """
+    table = format_span_summary()
+    get_logger("spans").info("time spent per stage and span:\n" + table)
+    return table
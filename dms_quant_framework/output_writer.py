@@ -0,0 +1,294 @@
+"""
+Writes output tables on a background thread so stages continue computing while
+their outputs are serialized.
+
+Files are written to a temporary file in the same directory and renamed into
+place when complete, so readers never see a partial file. Frames are copied when
+they are submitted and can be changed afterwards. Call flush_outputs before
+reading a file that was just written, the pipeline flushes after each stage and
+the CLI when a command ends.
+
+Writes are synchronous when the DMS_QUANT_SYNC_WRITES environment variable is
+set, with set_sync_writes or the --sync-writes option of the CLI.
+"""
+
+import atexit
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional
+
+import pandas as pd
+
+from dms_quant_framework.logger import get_logger
+
+log = get_logger("output-writer")
+
+SYNC_WRITES_ENV = "DMS_QUANT_SYNC_WRITES"
+
+FORMATS = ["csv", "json", "parquet"]
+COMPRESSION_EXTENSIONS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "xz",
+    ".zst": "zstd",
+    ".zip": "zip",
+}
+
+
+def get_format(path: str) -> str:
+    """
+    Get the format of an output file from its extension.
+
+    Args:
+        path (str): The output file, e.g. "csvs/wc_details.csv.gz".
+
+    Returns:
+        str: "csv", "json" or "parquet".
+    """
+    root, ext = os.path.splitext(path)
+    if ext in COMPRESSION_EXTENSIONS:
+        ext = os.path.splitext(root)[1]
+    file_format = ext[1:]
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown output format of {path}, must be one of {FORMATS}")
+    return file_format
+
+
+def write_frame_atomic(
+    df: pd.DataFrame,
+    path: str,
+    file_format: Optional[str] = None,
+    compression: Optional[str] = "infer",
+    **kwargs,
+) -> None:
+    """
+    Write a dataframe to a temporary file and rename it to the output file.
+
+    Args:
+        df (pd.DataFrame): The dataframe.
+        path (str): The output file.
+        file_format (str, optional): "csv", "json" or "parquet". Defaults to the
+            extension of the path.
+        compression (str, optional): Passed to pandas, "infer" uses the
+            extension of the path, e.g. ".gz". Defaults to "infer".
+        **kwargs: Passed to to_csv, to_json or to_parquet. CSVs are written
+            without the index and JSON as records unless given.
+    """
+    if file_format is None:
+        file_format = get_format(path)
+    if compression == "infer":
+        ext = os.path.splitext(path)[1]
+        compression = COMPRESSION_EXTENSIONS.get(ext)
+    output_dir = os.path.dirname(path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tmp_file = os.path.join(
+        output_dir,
+        f".{os.path.basename(path)}.{os.getpid()}.{threading.get_ident()}.tmp",
+    )
+    try:
+        if file_format == "csv":
+            kwargs.setdefault("index", False)
+            df.to_csv(tmp_file, compression=compression, **kwargs)
+        elif file_format == "json":
+            kwargs.setdefault("orient", "records")
+            df.to_json(tmp_file, compression=compression, **kwargs)
+        elif file_format == "parquet":
+            df.to_parquet(tmp_file, compression=compression or "snappy", **kwargs)
+        else:
+            raise ValueError(f"Unknown output format {file_format}")
+        os.replace(tmp_file, path)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
+class OutputWriter:
+    """
+    Writes dataframes on background threads.
+
+    At most max_pending frames wait to be written, submit blocks when more are
+    pending so a fast stage does not hold every frame it made in memory. Errors of
+    background writes are raised by flush.
+
+    Example:
+        >>> writer = OutputWriter()
+        >>> writer.submit(df, "data/csvs/wc_details.csv")
+        >>> writer.submit(df_motif, "data/raw-jsons/motifs/motifs.json.gz")
+        >>> writer.flush()  # both files are written
+    """
+
+    def __init__(self, n_threads: int = 1, max_pending: int = 8):
+        """
+        Args:
+            n_threads (int): Number of files written at the same time.
+                Defaults to 1.
+            max_pending (int): Number of frames that can wait to be written.
+                Defaults to 8.
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=n_threads, thread_name_prefix="output-writer"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._futures: List[Future] = []
+
+    def __enter__(self) -> "OutputWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _write(self, df: pd.DataFrame, path: str, **kwargs) -> str:
+        try:
+            write_frame_atomic(df, path, **kwargs)
+        finally:
+            self._slots.release()
+        log.debug(f"wrote {len(df)} rows to {path}")
+        return path
+
+    def submit(
+        self,
+        df: pd.DataFrame,
+        path: str,
+        file_format: Optional[str] = None,
+        compression: Optional[str] = "infer",
+        copy: bool = True,
+        **kwargs,
+    ) -> Future:
+        """
+        Queue a dataframe to be written.
+
+        Args:
+            df (pd.DataFrame): The dataframe.
+            path (str): The output file.
+            file_format (str, optional): "csv", "json" or "parquet". Defaults to
+                the extension of the path.
+            compression (str, optional): See write_frame_atomic. Defaults to
+                "infer".
+            copy (bool): Copy the frame so it can be changed while it is written.
+                Objects in cells, e.g. lists, are not copied. Defaults to True.
+            **kwargs: Passed to write_frame_atomic.
+
+        Returns:
+            Future: Resolves to the path once the file is written.
+        """
+        if file_format is None:
+            file_format = get_format(path)
+        if copy:
+            df = df.copy()
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(
+                self._write,
+                df,
+                path,
+                file_format=file_format,
+                compression=compression,
+                **kwargs,
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._futures.append(future)
+        return future
+
+    def flush(self) -> List[str]:
+        """
+        Wait until every submitted frame is written.
+
+        Returns:
+            List[str]: The files written since the last flush.
+        """
+        with self._lock:
+            futures, self._futures = self._futures, []
+        paths = []
+        error = None
+        for future in futures:
+            try:
+                paths.append(future.result())
+            except Exception as e:
+                log.error(f"background write failed: {e}")
+                error = error or e
+        if error is not None:
+            raise error
+        return paths
+
+    def close(self) -> None:
+        """Flush and stop the background threads."""
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+
+_writer: Optional[OutputWriter] = None
+_writer_lock = threading.Lock()
+
+
+def _reset_output_writer() -> None:
+    # the threads of the writer are not copied to forked worker processes
+    global _writer, _writer_lock
+    _writer = None
+    _writer_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_output_writer)
+
+
+def get_output_writer() -> OutputWriter:
+    """Get the output writer of this process, created when first used."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = OutputWriter()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def set_sync_writes(sync: bool) -> None:
+    """
+    Write outputs in the calling thread instead of in the background, in this
+    process and the processes it starts.
+
+    Args:
+        sync (bool): True to write synchronously.
+    """
+    if sync:
+        os.environ[SYNC_WRITES_ENV] = "1"
+    else:
+        os.environ.pop(SYNC_WRITES_ENV, None)
+
+
+def write_output(df: pd.DataFrame, path: str, **kwargs) -> Optional[Future]:
+    """
+    Write a dataframe in the background with the output writer of this process.
+
+    Args:
+        df (pd.DataFrame): The dataframe.
+        path (str): The output file, e.g. get_output_file("csvs/wc_details.csv").
+        **kwargs: Passed to OutputWriter.submit.
+
+    Returns:
+        Future: Resolves to the path once the file is written, None if writes are
+        synchronous.
+    """
+    if os.environ.get(SYNC_WRITES_ENV):
+        kwargs.pop("copy", None)
+        write_frame_atomic(df, path, **kwargs)
+        return None
+    return get_output_writer().submit(df, path, **kwargs)
+
+
+def flush_outputs() -> List[str]:
+    """
+    Wait until every output submitted with write_output is written.
+
+    Returns:
+        List[str]: The files written since the last flush.
+    """
+    if _writer is None:
+        return []
+    return _writer.flush()
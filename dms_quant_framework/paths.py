@@ -1,2 +1,108 @@
+"""
+Locations of the data the pipeline reads and the files it writes.
+
+Inputs are read from the data path and outputs are written to the output path,
+which defaults to the data path. When they differ, files written to the output
+path are read before the files of the same name in the data path, so many runs
+can share one read only data path and each write to its own scratch directory.
+
+Both paths are set, in order of priority, with set_paths (the --data-path and
+--output-path options of the CLI), the DMS_QUANT_DATA_PATH and
+DMS_QUANT_OUTPUT_PATH environment variables, or default to "data" in the current
+directory. Paths of files are relative to these directories, e.g.
+get_input_file("csvs/pdb_res.csv").
+"""
+
+import glob
+import os
+from typing import List, Optional
+
+# default data path, relative to the current directory
 DATA_PATH = "data"
 RESOURCE_PATH = "dms_quant_framework/resources"
+
+DATA_PATH_ENV = "DMS_QUANT_DATA_PATH"
+OUTPUT_PATH_ENV = "DMS_QUANT_OUTPUT_PATH"
+
+
+def set_paths(data_path: Optional[str] = None, output_path: Optional[str] = None):
+    """
+    Set the data and output paths of this process and the processes it starts.
+
+    Args:
+        data_path (str, optional): The directory inputs are read from. Unchanged
+            if None.
+        output_path (str, optional): The directory outputs are written to.
+            Unchanged if None.
+    """
+    if data_path is not None:
+        os.environ[DATA_PATH_ENV] = data_path
+    if output_path is not None:
+        os.environ[OUTPUT_PATH_ENV] = output_path
+
+
+def get_data_path() -> str:
+    """Get the directory inputs are read from."""
+    return os.environ.get(DATA_PATH_ENV) or DATA_PATH
+
+
+def get_output_path() -> str:
+    """Get the directory outputs are written to, the data path if not set."""
+    return os.environ.get(OUTPUT_PATH_ENV) or get_data_path()
+
+
+def get_input_file(relative_path: str) -> str:
+    """
+    Get the path of a file to read.
+
+    Args:
+        relative_path (str): The path relative to the data directory, e.g.
+            "csvs/pdb_res.csv".
+
+    Returns:
+        str: The file in the output path if it exists, otherwise the file in the
+        data path.
+    """
+    output_file = os.path.join(get_output_path(), relative_path)
+    if os.path.exists(output_file):
+        return output_file
+    return os.path.join(get_data_path(), relative_path)
+
+
+def get_output_file(relative_path: str) -> str:
+    """
+    Get the path of a file to write and create its directory.
+
+    Args:
+        relative_path (str): The path relative to the data directory, e.g.
+            "pdb-features/sasa.csv".
+
+    Returns:
+        str: The file in the output path.
+    """
+    output_file = os.path.join(get_output_path(), relative_path)
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    return output_file
+
+
+def glob_input_files(pattern: str) -> List[str]:
+    """
+    Get the paths that match a pattern in the data and output paths.
+
+    Args:
+        pattern (str): A glob pattern relative to the data directory, e.g.
+            "pdbs/*/*.pdb".
+
+    Returns:
+        List[str]: The matching paths, sorted. Paths in the output path replace
+        the paths of the same name in the data path.
+    """
+    if os.path.isabs(pattern):
+        return sorted(glob.glob(pattern))
+    paths = {}
+    for root in [get_data_path(), get_output_path()]:
+        for path in glob.glob(os.path.join(root, pattern)):
+            paths[os.path.relpath(path, root)] = path
+    return sorted(paths.values())
@@ -1,4 +1,3 @@
-import glob
 import concurrent.futures
 from itertools import product
 import numpy as np
@@ -7,11 +6,19 @@ import os
 from typing import List, Dict, Tuple, Optional
 import subprocess
 import shutil
+import tempfile
 import regex as re
 from biopandas.pdb import PandasPdb
 
-from dms_quant_framework.logger import get_logger
-from dms_quant_framework.paths import DATA_PATH
+from dms_quant_framework.dataset import read_dataset
+from dms_quant_framework.feature_store import BP_PARAM_COLUMNS, load_b_factors
+from dms_quant_framework.logger import get_logger, instrument
+from dms_quant_framework.output_writer import write_output
+from dms_quant_framework.paths import (
+    get_input_file,
+    get_output_file,
+    glob_input_files,
+)
 from dms_quant_framework.stats import r2
 
 log = get_logger("pdb-features")
@@ -66,35 +73,29 @@ def generate_basepair_details_from_3dna(pdb: str, output_dir: str = None) -> Non
     check_command_accessibility("analyze")
 
     pdbname = os.path.basename(pdb)
-    subprocess.call(
-        f"find_pair {pdb} {pdb[:-4]}.inp",
-        shell=True,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
-    subprocess.call(
-        f"analyze {pdb[:-4]}.inp",
-        shell=True,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
-    shutil.move(f"{pdbname[:-4]}.out", f"{output_dir}/{pdbname[:-4]}_x3dna.out")
-    remove_files = [
-        "auxiliary.par",
-        "bestpairs.pdb",
-        "bp_helical.par",
-        "bp_order.dat",
-        "bp_step.par",
-        "cf_7methods.par",
-        "col_chains.scr",
-        "col_helices.scr",
-        "hel_regions.pdb",
-        "ref_frames.dat",
-        "stacking.pdb",
-        "hstacking.pdb",
-    ]
-    for file in remove_files:
-        os.remove(file)
+    pdb = os.path.abspath(pdb)
+    output_dir = os.path.abspath(output_dir)
+    # 3dna writes its scratch files to the working directory, each call gets its
+    # own so concurrent runs do not overwrite each other
+    with tempfile.TemporaryDirectory(prefix="x3dna-") as work_dir:
+        subprocess.call(
+            f"find_pair {pdb} {pdbname[:-4]}.inp",
+            shell=True,
+            cwd=work_dir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        subprocess.call(
+            f"analyze {pdbname[:-4]}.inp",
+            shell=True,
+            cwd=work_dir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        shutil.move(
+            os.path.join(work_dir, f"{pdbname[:-4]}.out"),
+            f"{output_dir}/{pdbname[:-4]}_x3dna.out",
+        )
 
 
 def extract_bp_type_and_res_num_into_a_table(filename: str) -> list:
@@ -347,7 +348,7 @@ def calculate_rmsd_bp(bp: str, filename: str, resi_nums: list) -> float:
     }
 
     try:
-        ppdb_ideal = PandasPdb().read_pdb(f"{DATA_PATH}/ideal_pdbs/{bp}.pdb")
+        ppdb_ideal = PandasPdb().read_pdb(get_input_file(f"ideal_pdbs/{bp}.pdb"))
         ideal_df = ppdb_ideal.df["ATOM"]
         ppdb_pdb = PandasPdb().read_pdb(filename)
         pdb_df = ppdb_pdb.df["ATOM"]
@@ -371,23 +372,128 @@ def calculate_rmsd_bp(bp: str, filename: str, resi_nums: list) -> float:
         return None
 
 
+def _is_flanking_pair(df: pd.DataFrame) -> np.ndarray:
+    """
+    Checks which pairs close the motif, the pair of residues 3 and len(motif) + 5 or
+    of strand_1_length + 2 and strand_1_length + 7.
+    """
+    res_num1 = df["res_num1"].to_numpy(dtype=int)
+    res_num2 = df["res_num2"].to_numpy(dtype=int)
+    # the motif length includes the _ between the strands
+    motif_len = df["motif"].str.len().to_numpy()
+    strand_1_len = df["motif"].str.split("_").str[0].str.len().to_numpy()
+
+    def has_both(pos1, pos2):
+        return ((res_num1 == pos1) | (res_num2 == pos1)) & (
+            (res_num1 == pos2) | (res_num2 == pos2)
+        )
+
+    return has_both(3, motif_len + 5) | has_both(strand_1_len + 2, strand_1_len + 7)
+
+
+def generate_wc_details_dataframe(
+    df_wc: pd.DataFrame, df_residues: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Attaches the reactivities of the residues of each WC pair to its 3DNA details.
+
+    The reactivities of the first residue of a pair are used, the second if the
+    first has none. Pairs without reactivities are skipped.
+
+    Args:
+        df_wc (pd.DataFrame): The WC pairs of all_bp_details.csv with their rmsd.
+        df_residues (pd.DataFrame): The residues, with the m_sequence, r_nuc,
+            pdb_r_pos and r_data columns.
+
+    Returns:
+        pd.DataFrame: One row per reactivity of each pair, in the order of the pairs
+        and then of the residues.
+    """
+    key_cols = ["m_sequence", "r_nuc", "pdb_r_pos"]
+    df_residues = pd.DataFrame(
+        {
+            "m_sequence": df_residues["m_sequence"].to_numpy(),
+            "r_nuc": df_residues["r_nuc"].to_numpy(),
+            "pdb_r_pos": df_residues["pdb_r_pos"].to_numpy(dtype=int),
+            "r_data": df_residues["r_data"].to_numpy(),
+            "residue_order": np.arange(len(df_residues)),
+        }
+    )
+    df = pd.DataFrame(
+        {
+            "pair_order": np.arange(len(df_wc)),
+            "m_sequence": df_wc["motif"].str.replace("_", "&").to_numpy(),
+            "bp": df_wc["bp"].to_numpy(),
+            "pdb_r_pos1": df_wc["res_num1"].to_numpy(),
+            "pdb_r_pos2": df_wc["res_num2"].to_numpy(),
+            "rmsd_from_ideal": df_wc["rmsd"].to_numpy(),
+            **{col: df_wc[col].to_numpy() for col in BP_PARAM_COLUMNS},
+            "flanking_pairs": np.where(_is_flanking_pair(df_wc), "YES", "NO"),
+        }
+    )
+    # the reactivity key of each residue of the pairs
+    keys = []
+    for i in [1, 2]:
+        keys.append(
+            pd.DataFrame(
+                {
+                    "m_sequence": df["m_sequence"],
+                    "r_nuc": df["bp"].str[i - 1],
+                    "pdb_r_pos": df[f"pdb_r_pos{i}"].astype(int),
+                }
+            )
+        )
+    has_key = [
+        pd.MultiIndex.from_frame(key).isin(
+            pd.MultiIndex.from_frame(df_residues[key_cols])
+        )
+        for key in keys
+    ]
+    use_key2 = ~has_key[0] & has_key[1]
+    n_missing = int((~has_key[0] & ~has_key[1]).sum())
+    if n_missing > 0:
+        log.warning(
+            f"No match found for either residue of {n_missing} of {len(df)} WC "
+            "pairs, skipping them"
+        )
+    df_keys = keys[0].copy()
+    df_keys.loc[use_key2] = keys[1].loc[use_key2]
+    df = pd.concat([df, df_keys[["r_nuc", "pdb_r_pos"]]], axis=1)
+    df = df.merge(df_residues, on=key_cols, how="inner")
+    df = df.sort_values(["pair_order", "residue_order"], kind="stable")
+    columns = [
+        "m_sequence",
+        "bp",
+        "pdb_r_pos1",
+        "pdb_r_pos2",
+        "rmsd_from_ideal",
+        *BP_PARAM_COLUMNS,
+        "r_data",
+        "flanking_pairs",
+    ]
+    return df[columns].reset_index(drop=True)
+
+
+@instrument()
 def process_basepair_details():
-    pdb_paths = sorted(glob.glob(f"{DATA_PATH}/pdbs/*/*.pdb"))
-    output_dir = f"{DATA_PATH}/dssr-output/"
+    pdb_paths = glob_input_files("pdbs/*/*.pdb")
+    output_dir = os.path.dirname(get_output_file("dssr-output/"))
 
     all_tables = []
     for pdb_path in pdb_paths:
         pdb_name = os.path.basename(pdb_path)[:-4]
-        x3dna_out_path = f"{output_dir}/{pdb_name}_x3dna.out"
+        # 3dna outputs are reused from the data path if they were computed before
+        x3dna_out_path = get_input_file(f"dssr-output/{pdb_name}_x3dna.out")
         if not os.path.exists(x3dna_out_path):
             log.info(f"Generating basepair details for {pdb_name}")
             generate_basepair_details_from_3dna(pdb_path, output_dir)
+            x3dna_out_path = f"{output_dir}/{pdb_name}_x3dna.out"
         extracted_table = extract_basepair_details_into_a_table(x3dna_out_path)
         if not extracted_table.empty:
             all_tables.append(extracted_table)
 
     combined_df = pd.concat(all_tables, ignore_index=True)
-    combined_df.to_csv(f"{DATA_PATH}/csvs/all_bp_details.csv", index=False)
+    write_output(combined_df, get_output_file("csvs/all_bp_details.csv"))
     filtered_df = combined_df[combined_df["r_type"] == "WC"].copy()
 
     rmsd = []
@@ -395,7 +501,7 @@ def process_basepair_details():
         res_num1 = int(row["res_num1"])
         res_num2 = int(row["res_num2"])
 
-        pdb_path = f"{DATA_PATH}/pdbs/{row['motif']}/{row['name'][:-10]}.pdb"
+        pdb_path = get_input_file(f"pdbs/{row['motif']}/{row['name'][:-10]}.pdb")
         rmsd_val = calculate_rmsd_bp(row["bp"], pdb_path, [res_num1, res_num2])
 
         if rmsd_val is not None:
@@ -405,71 +511,28 @@ def process_basepair_details():
         rmsd.append(rmsd_val)
 
     filtered_df["rmsd"] = rmsd
-    filtered_df.to_csv(f"{DATA_PATH}/csvs/wc_with_rmsd.csv", index=False)
-    df_all = pd.read_json(f"{DATA_PATH}/raw-jsons/residues/pdb_library_1_residues.json")
-
-    dms_dict = {}
-    for k, all_row in df_all.iterrows():
-        key = (all_row["m_sequence"], all_row["r_nuc"], all_row["pdb_r_pos"])
-        if key not in dms_dict:
-            dms_dict[key] = all_row["r_data"]
-        else:
-            if isinstance(dms_dict[key], list):
-                dms_dict[key].append(all_row["r_data"])
-            else:
-                dms_dict[key] = [dms_dict[key], all_row["r_data"]]
+    write_output(filtered_df, get_output_file("csvs/wc_with_rmsd.csv"))
 
-    all_data = []
-    for j, row1 in filtered_df.iterrows():
-        key1 = (row1["motif"].replace("_", "&"), row1["bp"][0], int(row1["res_num1"]))
-        key2 = (row1["motif"].replace("_", "&"), row1["bp"][1], int(row1["res_num2"]))
-
-        r_data_list = []
-        if key1 in dms_dict:
-            r_data_list = dms_dict.get(key1, ["None"])
-        elif key2 in dms_dict:
-            r_data_list = dms_dict.get(key2, ["None"])
-        else:
-            print(f"No match found for {key1} or {key2}, skipping...")
-            continue
-        strand_1_length = len(row1["motif"].split("_")[0])
-
-        if (int(row1["res_num1"]) == 3 or int(row1["res_num2"]) == 3) and (
-            int(row1["res_num1"]) == (len(row1["motif"]) + 5)
-            or int(row1["res_num2"]) == (len(row1["motif"]) + 5)
-        ):
-            flanking_pair = "YES"
-        elif (
-            int(row1["res_num1"]) == (strand_1_length + 2)
-            or int(row1["res_num2"]) == (strand_1_length + 2)
-        ) and (
-            int(row1["res_num1"]) == (strand_1_length + 7)
-            or int(row1["res_num2"]) == (strand_1_length + 7)
-        ):
-            flanking_pair = "YES"
-        else:
-            flanking_pair = "NO"
-
-        for r_data in r_data_list:
-            data = {
-                "m_sequence": row1["motif"].replace("_", "&"),
-                "bp": row1["bp"],
-                "pdb_r_pos1": row1["res_num1"],
-                "pdb_r_pos2": row1["res_num2"],
-                "rmsd_from_ideal": row1["rmsd"],
-                "shear": row1["shear"],
-                "stretch": row1["stretch"],
-                "stagger": row1["stagger"],
-                "buckle": row1["buckle"],
-                "propeller": row1["propeller"],
-                "opening": row1["opening"],
-                "r_data": r_data,
-                "flanking_pairs": flanking_pair,
-            }
-            all_data.append(data)
 
-    df_fin = pd.DataFrame(all_data)
-    df_fin.to_csv(f"{DATA_PATH}/csvs/wc_details.csv", index=False)
+@instrument()
+def write_wc_details_dataframe(name: str = "pdb_library_1") -> None:
+    """
+    Write the reactivities of the residues of each WC pair with its 3DNA details
+    to wc_details.csv.
+
+    Kept apart from process_basepair_details so the 3DNA analysis does not wait
+    for the residue dataframes.
+
+    Args:
+        name (str): The library name. Defaults to "pdb_library_1".
+    """
+    df_wc = pd.read_csv(get_input_file("csvs/wc_with_rmsd.csv"))
+    df_residues = read_dataset(
+        get_input_file(f"raw-jsons/residues/{name}_residues.json"),
+        columns=["m_sequence", "r_nuc", "pdb_r_pos", "r_data"],
+    )
+    df = generate_wc_details_dataframe(df_wc, df_residues)
+    write_output(df, get_output_file("csvs/wc_details.csv"))
 
 
 ## distance #######################################################################
@@ -565,20 +628,44 @@ def get_distance_between_all_atom_pairs_dataframe(
     return pd.DataFrame(all_data)
 
 
+@instrument()
 def generate_distance_dataframe(max_distance: float = 10):
-    folders = glob.glob(f"{DATA_PATH}/pdbs/*")
     all_dfs = []
-    for folder in folders:
-        filenames = glob.glob(f"{folder}/*.pdb")
-        for file in filenames:
-            df = get_distance_between_all_atom_pairs_dataframe(file, max_distance)
-            all_dfs.append(df)
+    for file in glob_input_files("pdbs/*/*.pdb"):
+        df = get_distance_between_all_atom_pairs_dataframe(file, max_distance)
+        all_dfs.append(df)
     final_df = pd.concat(all_dfs, ignore_index=True)
     return final_df
 
 
+def write_distance_dataframe(max_distance: float = 1000) -> None:
+    """
+    Write the distances between all atom pairs of the pdbs to distances_all.csv.
+
+    Args:
+        max_distance (float): The max distance between atoms. Defaults to 1000.
+    """
+    df = generate_distance_dataframe(max_distance=max_distance)
+    write_output(df, get_output_file("pdb-features/distances_all.csv"))
+
+
 ## reactivity correlation with distance ##########################################
 
+# columns of the pdb residue dataframe used by the distance analyses
+PDB_RESIDUE_DISTANCE_COLUMNS = [
+    "pdb_name",
+    "pdb_path",
+    "pdb_r_pos",
+    "pair_pdb_r_pos",
+    "pdb_r_pair",
+    "pdb_r_bp_type",
+    "pdb_res",
+    "r_nuc",
+    "r_type",
+    "no_of_interactions",
+    "ln_r_data",
+]
+
 
 def calculate_atom_distances(df_pdb, df_dist, r_atom, pair_atom):
     data = []
@@ -636,17 +723,22 @@ def process_pair_and_atoms(df_pdb, df_dist, args):
 
 
 def get_all_atom_distances():
-    df_pdb = pd.read_json(
-        f"{DATA_PATH}/raw-jsons/residues/pdb_library_1_residues_pdb.json"
+    pairs = ["A-G", "A-A", "C-A", "C-C", "C-U"]
+    # only load the non-canonical residues in the pairs of interest
+    df_pdb = read_dataset(
+        get_input_file("raw-jsons/residues/pdb_library_1_residues_pdb.json"),
+        columns=PDB_RESIDUE_DISTANCE_COLUMNS,
+        filters=[
+            ("r_type", "==", "NON-WC"),
+            ("no_of_interactions", "==", 1),
+            ("pdb_r_pair", "in", pairs),
+        ],
     )
-    df_dist = pd.read_csv(f"{DATA_PATH}/pdb-features/distances_all.csv")
-    df_bfact = pd.read_csv(f"{DATA_PATH}/pdb-features/b_factor.csv")
-    df_bfact = df_bfact[
-        ["pdb_name", "pdb_r_pos", "average_b_factor", "normalized_b_factor"]
-    ]
+    df_dist = pd.read_csv(get_input_file("pdb-features/distances_all.csv"))
+    # the b-factors are joined once by the features stage
+    df_bfact = load_b_factors()
     df_pdb = df_pdb.merge(df_bfact, on=["pdb_name", "pdb_r_pos"], how="left")
 
-    pairs = ["A-G", "A-A", "C-A", "C-C", "C-U"]
     import multiprocessing
     from itertools import product
 
@@ -668,12 +760,12 @@ def get_all_atom_distances():
 
     df_all_results = pd.concat(results, ignore_index=True)
     df_all_results.to_csv(
-        f"{DATA_PATH}/pdb-features/non_canonical_atom_distances.csv", index=False
+        get_output_file("pdb-features/non_canonical_atom_distances.csv"), index=False
     )
 
 
 def get_non_canonical_atom_distances_reactivity_correlation():
-    df = pd.read_csv(f"{DATA_PATH}/pdb-features/non_canonical_atom_distances.csv")
+    df = pd.read_csv(get_input_file("pdb-features/non_canonical_atom_distances.csv"))
     data = []
     for (pair, atom1, atom2), g in df.groupby(["pair", "atom1", "atom2"]):
         data.append(
@@ -686,7 +778,9 @@ def get_non_canonical_atom_distances_reactivity_correlation():
             }
         )
     pd.DataFrame(data).to_csv(
-        f"{DATA_PATH}/pdb-features/non_canonical_atom_distances_reactivity_correlation.csv",
+        get_output_file(
+            "pdb-features/non_canonical_atom_distances_reactivity_correlation.csv"
+        ),
         index=False,
     )
 
@@ -764,14 +858,14 @@ def process_pair_and_atoms_with_ratio(df_pdb, df_dist, args):
 
 
 def get_all_atom_distances_with_ratio():
-    df_pdb = pd.read_json(
-        f"{DATA_PATH}/raw-jsons/residues/pdb_library_1_residues_pdb.json"
+    # partner residues can be of any type so only columns are projected here
+    df_pdb = read_dataset(
+        get_input_file("raw-jsons/residues/pdb_library_1_residues_pdb.json"),
+        columns=PDB_RESIDUE_DISTANCE_COLUMNS,
     )
-    df_dist = pd.read_csv(f"{DATA_PATH}/pdb-features/distances_all.csv")
-    df_bfact = pd.read_csv(f"{DATA_PATH}/pdb-features/b_factor.csv")
-    df_bfact = df_bfact[
-        ["pdb_name", "pdb_r_pos", "average_b_factor", "normalized_b_factor"]
-    ]
+    df_dist = pd.read_csv(get_input_file("pdb-features/distances_all.csv"))
+    # the b-factors are joined once by the features stage
+    df_bfact = load_b_factors()
     df_pdb = df_pdb.merge(df_bfact, on=["pdb_name", "pdb_r_pos"], how="left")
 
     pairs = ["A-A", "C-A", "C-C"]
@@ -796,14 +890,14 @@ def get_all_atom_distances_with_ratio():
 
     df_all_results = pd.concat(results, ignore_index=True)
     df_all_results.to_csv(
-        f"{DATA_PATH}/pdb-features/non_canonical_atom_distances_with_ratio.csv",
+        get_output_file("pdb-features/non_canonical_atom_distances_with_ratio.csv"),
         index=False,
     )
 
 
 def get_non_canonical_atom_distances_reactivity_ratio_correlation():
     df = pd.read_csv(
-        f"{DATA_PATH}/pdb-features/non_canonical_atom_distances_with_ratio.csv"
+        get_input_file("pdb-features/non_canonical_atom_distances_with_ratio.csv")
     )
     data = []
     for (pair, atom1, atom2), g in df.groupby(["pair", "atom1", "atom2"]):
@@ -817,7 +911,9 @@ def get_non_canonical_atom_distances_reactivity_ratio_correlation():
             }
         )
     pd.DataFrame(data).to_csv(
-        f"{DATA_PATH}/pdb-features/non_canonical_atom_distances_reactivity_ratio_correlation.csv",
+        get_output_file(
+            "pdb-features/non_canonical_atom_distances_reactivity_ratio_correlation.csv"
+        ),
         index=False,
     )
 
@@ -0,0 +1,399 @@
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from dms_quant_framework.logger import (
+    add_span_records,
+    get_logger,
+    get_span_records,
+    setup_instrumentation,
+    span,
+)
+from dms_quant_framework.output_writer import flush_outputs
+from dms_quant_framework.paths import (
+    get_input_file,
+    get_output_path,
+    glob_input_files,
+)
+from dms_quant_framework.profiling import worker_profile
+
+log = get_logger("pipeline")
+
+# kept in the output path
+STATE_FILE = ".pipeline-state.json"
+
+
+class Stage:
+    """
+    A step of the pipeline with the files it reads and the files it writes.
+
+    Inputs can be paths or glob patterns, e.g. "pdbs/*/*.pdb", outputs are
+    paths. Relative paths are in the data and output paths, see paths. A stage
+    depends on every stage that writes a file matching one of its inputs.
+
+    External inputs are files the stage reads that are shipped with the data or
+    built by another command, e.g. the 3DNA base pairs of get-pdb-features. They
+    are hashed like inputs and the stage runs after the stage that writes them if
+    both run, but building the stage does not run that stage.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable,
+        inputs: List[str],
+        outputs: List[str],
+        kwargs: Optional[Dict[str, Any]] = None,
+        version: str = "1",
+        external_inputs: Optional[List[str]] = None,
+    ):
+        """
+        Args:
+            name (str): The name of the stage, must be unique in a pipeline.
+            func (Callable): The module level function that runs the stage.
+            inputs (List[str]): The paths and glob patterns the stage reads.
+            outputs (List[str]): The paths the stage writes.
+            kwargs (Dict[str, Any], optional): Keyword arguments of func. Stages
+                rerun when they change. Defaults to None.
+            version (str): Bump to rerun the stage after its code changes.
+                Defaults to "1".
+            external_inputs (List[str], optional): The paths and glob patterns
+                the stage reads that are not built with it. Defaults to None.
+        """
+        self.name = name
+        self.func = func
+        self.inputs = inputs
+        self.outputs = outputs
+        self.kwargs = kwargs or {}
+        self.version = version
+        self.external_inputs = external_inputs or []
+
+    def __repr__(self) -> str:
+        return f"Stage(name={self.name!r})"
+
+    def reads(self, path: str, external: bool = True) -> bool:
+        """
+        Returns True if the path matches one of the inputs of the stage, or one of
+        the external inputs if external is True.
+        """
+        patterns = self.inputs + self.external_inputs if external else self.inputs
+        return any(
+            path == pattern or fnmatch.fnmatch(path, pattern) for pattern in patterns
+        )
+
+    def get_input_files(self) -> List[str]:
+        """Returns the existing files that match the inputs, sorted."""
+        files = set()
+        for pattern in self.inputs + self.external_inputs:
+            if glob.has_magic(pattern):
+                files.update(p for p in glob_input_files(pattern) if os.path.isfile(p))
+            elif os.path.isfile(get_input_file(pattern)):
+                files.add(get_input_file(pattern))
+        return sorted(files)
+
+    def get_output_files(self) -> List[str]:
+        """Returns the paths the outputs are written to."""
+        return [os.path.join(get_output_path(), path) for path in self.outputs]
+
+
+def _run_stage(stage: Stage) -> Dict[str, Any]:
+    with span(stage.name, kind="stage") as current:
+        stage.func(**stage.kwargs)
+        # outputs written in the background are complete when the stage ends
+        flush_outputs()
+    return current.record
+
+
+def _run_stage_in_worker(stage: Stage) -> List[Dict[str, Any]]:
+    # spans of the worker are sent back to be recorded by the main process
+    setup_instrumentation()
+    # the profile of the main process does not see the workers
+    with worker_profile(stage.name):
+        _run_stage(stage)
+    return get_span_records()
+
+
+class Pipeline:
+    """
+    Runs stages in dependency order and skips stages whose inputs are unchanged.
+
+    The content hash of the inputs of each stage, and of the outputs it wrote, are
+    kept in a state file. A stage is rerun when the hash of its inputs, its
+    kwargs or its version changed, or when one of its outputs is missing or was
+    changed by something else. Since a stage that reruns with the same result
+    writes the same outputs, the stages after it are skipped. Independent stages
+    run in parallel worker processes.
+
+    Example:
+        >>> pipeline = Pipeline([
+        ...     Stage("sasa", write_sasa, ["pdbs_w_2bp/*/*.pdb"], ["sasa.csv"]),
+        ... ])
+        >>> pipeline.run(n_workers=4)
+    """
+
+    def __init__(self, stages: List[Stage], state_file: Optional[str] = None):
+        """
+        Args:
+            stages (List[Stage]): The stages of the pipeline.
+            state_file (str, optional): The file the hashes are kept in.
+                Defaults to STATE_FILE in the output path.
+        """
+        if state_file is None:
+            state_file = os.path.join(get_output_path(), STATE_FILE)
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"stage names must be unique: {names}")
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_file = state_file
+        self.dependencies = self._get_dependencies()
+        # the stages that are built with each stage, without external inputs
+        self.requirements = self._get_dependencies(external=False)
+        self.order = self._get_order()
+        # span record of each stage that ran in the last run
+        self.stage_records: Dict[str, Dict[str, Any]] = {}
+
+    def _get_dependencies(self, external: bool = True) -> Dict[str, Set[str]]:
+        dependencies = {name: set() for name in self.stages}
+        for stage in self.stages.values():
+            for other in self.stages.values():
+                if other is not stage and any(
+                    stage.reads(p, external) for p in other.outputs
+                ):
+                    dependencies[stage.name].add(other.name)
+        return dependencies
+
+    def _get_order(self) -> List[str]:
+        order = []
+        done = set()
+        while len(order) < len(self.stages):
+            ready = [
+                name
+                for name in self.stages
+                if name not in done and self.dependencies[name] <= done
+            ]
+            if not ready:
+                remaining = [name for name in self.stages if name not in done]
+                raise ValueError(f"stages have circular dependencies: {remaining}")
+            order.extend(ready)
+            done.update(ready)
+        return order
+
+    def get_upstream(self, targets: List[str]) -> Set[str]:
+        """
+        Get the stages needed to build the targets.
+
+        Args:
+            targets (List[str]): Stage names.
+
+        Returns:
+            Set[str]: The targets and every stage they depend on, except the
+            stages that only write their external inputs.
+        """
+        needed = set()
+        todo = list(targets)
+        while todo:
+            name = todo.pop()
+            if name not in self.stages:
+                raise ValueError(f"unknown stage {name}, must be one of {self.order}")
+            if name not in needed:
+                needed.add(name)
+                todo.extend(self.requirements[name])
+        return needed
+
+    # hashing #################################################################
+
+    def _load_state(self) -> Dict[str, Any]:
+        if not os.path.isfile(self.state_file):
+            return {"files": {}, "stages": {}}
+        with open(self.state_file) as f:
+            return json.load(f)
+
+    def _save_state(self, state: Dict[str, Any]) -> None:
+        state_dir = os.path.dirname(self.state_file)
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp_file, self.state_file)
+
+    def _hash_file(self, path: str, state: Dict[str, Any]) -> str:
+        # files whose size and modification time are unchanged are not reread
+        stat = os.stat(path)
+        cached = state["files"].get(path)
+        if cached is not None and cached[:2] == [stat.st_mtime_ns, stat.st_size]:
+            return cached[2]
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(2**20), b""):
+                digest.update(chunk)
+        state["files"][path] = [stat.st_mtime_ns, stat.st_size, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def _hash_inputs(self, stage: Stage, state: Dict[str, Any]) -> str:
+        digest = hashlib.sha256()
+        digest.update(
+            json.dumps(
+                [stage.func.__module__, stage.func.__qualname__, stage.version],
+            ).encode()
+        )
+        digest.update(json.dumps(stage.kwargs, sort_keys=True, default=str).encode())
+        for path in stage.get_input_files():
+            digest.update(f"{path}\0{self._hash_file(path, state)}\0".encode())
+        return digest.hexdigest()
+
+    def _hash_outputs(self, stage: Stage, state: Dict[str, Any]) -> Dict[str, str]:
+        return {
+            path: self._hash_file(path, state)
+            for path in stage.get_output_files()
+            if os.path.isfile(path)
+        }
+
+    def is_up_to_date(self, name: str, state: Dict[str, Any] = None) -> bool:
+        """
+        Check if a stage can be skipped.
+
+        Args:
+            name (str): The stage name.
+            state (Dict[str, Any], optional): The loaded state. Defaults to the
+                state file.
+
+        Returns:
+            bool: True if the inputs of the stage are unchanged since it last ran
+            and its outputs are as it wrote them.
+        """
+        if state is None:
+            state = self._load_state()
+        stage = self.stages[name]
+        record = state["stages"].get(name)
+        if record is None or record["inputs"] != self._hash_inputs(stage, state):
+            return False
+        outputs = self._hash_outputs(stage, state)
+        return len(outputs) == len(stage.outputs) and outputs == record["outputs"]
+
+    # running #################################################################
+
+    def run(
+        self,
+        targets: Optional[List[str]] = None,
+        n_workers: int = 1,
+        force: bool = False,
+        dry_run: bool = False,
+    ) -> Dict[str, str]:
+        """
+        Run the stages that are out of date.
+
+        Args:
+            targets (List[str], optional): The stages to build, with the stages
+                they depend on. Defaults to all stages.
+            n_workers (int): Number of stages run at the same time in worker
+                processes, at most the number of CPUs. Defaults to 1, stages
+                run in this process.
+            force (bool): Rerun stages even if they are up to date.
+                Defaults to False.
+            dry_run (bool): Only report which stages are out of date, their
+                inputs are checked before any stage runs. Defaults to False.
+
+        Returns:
+            Dict[str, str]: "ran", "skipped" or "stale" (dry run) for each stage.
+        """
+        needed = self.get_upstream(targets) if targets else set(self.stages)
+        state = self._load_state()
+        status = {}
+        if dry_run:
+            # stages after a stale stage are stale, their inputs will be rewritten
+            for name in self.order:
+                if name in needed:
+                    stale_deps = any(
+                        status.get(d) == "stale" for d in self.dependencies[name]
+                    )
+                    up_to_date = (
+                        not force and not stale_deps and self.is_up_to_date(name, state)
+                    )
+                    status[name] = "skipped" if up_to_date else "stale"
+            return status
+
+        def finish(name: str, record: Dict[str, Any]) -> None:
+            log.info(
+                f"finished {name} in {record['wall_sec']:.1f} sec "
+                f"({record['cpu_sec']:.1f} cpu sec)"
+            )
+            self.stage_records[name] = record
+            stage = self.stages[name]
+            missing = [
+                path for path in stage.get_output_files() if not os.path.isfile(path)
+            ]
+            if missing:
+                raise RuntimeError(f"stage {name} did not write {missing}")
+            state["stages"][name] = {
+                "inputs": self._hash_inputs(stage, state),
+                "outputs": self._hash_outputs(stage, state),
+            }
+            self._save_state(state)
+            status[name] = "ran"
+
+        def next_ready(running: Set[str]) -> List[str]:
+            # a stage is checked once everything it reads is written, skipped
+            # stages can make more stages ready
+            while True:
+                ready = [
+                    name
+                    for name in self.order
+                    if name in needed
+                    and name not in status
+                    and name not in running
+                    and all(d in status for d in self.dependencies[name] & needed)
+                ]
+                skipped = [
+                    name
+                    for name in ready
+                    if not force and self.is_up_to_date(name, state)
+                ]
+                if not skipped:
+                    return ready
+                for name in skipped:
+                    log.info(f"skipping {name}, inputs are unchanged")
+                    status[name] = "skipped"
+
+        self.stage_records = {}
+        start = time.perf_counter()
+        n_workers = min(n_workers, os.cpu_count() or 1)
+        if n_workers <= 1:
+            ready = next_ready(set())
+            while ready:
+                log.info(f"running {ready[0]}")
+                finish(ready[0], _run_stage(self.stages[ready[0]]))
+                ready = next_ready(set())
+        else:
+            self._run_in_workers(n_workers, next_ready, finish)
+        if self.stage_records:
+            stage_sec = sum(r["wall_sec"] for r in self.stage_records.values())
+            log.info(
+                f"ran {len(self.stage_records)} stages in "
+                f"{time.perf_counter() - start:.1f} sec, {stage_sec:.1f} sec of "
+                f"stage time with {n_workers} workers"
+            )
+        return status
+
+    def _run_in_workers(
+        self, n_workers: int, next_ready: Callable, finish: Callable
+    ) -> None:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {}
+            while True:
+                for name in next_ready(set(futures.values())):
+                    log.info(f"running {name}")
+                    stage = self.stages[name]
+                    futures[executor.submit(_run_stage_in_worker, stage)] = name
+                if not futures:
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = futures.pop(future)
+                    records = add_span_records(future.result())
+                    finish(name, records[-1])
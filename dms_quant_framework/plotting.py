@@ -187,7 +187,9 @@ def plot_pop_avg_from_row(row, data_col="data", ax=None):
     return plot_pop_avg(row["sequence"], row["structure"], row[data_col], ax)
 
 
-def plot_pop_avg_all(df, data_col="data", axis="sequence_structure", **kwargs):
+def plot_pop_avg_all(
+    df, data_col="data", axis="sequence_structure", store=None, **kwargs
+):
     """
     Plots the population average for each row in the given DataFrame. plots are
     seperated and are in a column format.
@@ -198,6 +200,8 @@ def plot_pop_avg_all(df, data_col="data", axis="sequence_structure", **kwargs):
             the data to be plotted. Defaults to "data".
         axis (str, optional): The axis along which to calculate the population
             average. Defaults to "sequence_structure".
+        store (ReactivityStore, optional): If given, the data of each row is read
+            from the store by its "name" instead of from `data_col`.
         **kwargs: Additional keyword arguments to be passed to the plt.subplots()
             function.
 
@@ -209,7 +213,8 @@ def plot_pop_avg_all(df, data_col="data", axis="sequence_structure", **kwargs):
     j = 0
     for i, row in df.iterrows():
         colors = colors_for_sequence(row["sequence"])
-        axes[j].bar(range(0, len(row[data_col])), row[data_col], color=colors)
+        data = store[row["name"]] if store is not None else row[data_col]
+        axes[j].bar(range(0, len(data)), data, color=colors)
         axes[j].set_title(row["rna_name"])
         j += 1
     plot_pop_avg_from_row(df.iloc[-1], ax=axes[-1], axis=axis)
@@ -1,13 +1,12 @@
 # Standard library imports
 from concurrent.futures import ThreadPoolExecutor
-import glob
 import os
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 # Third party imports
 import numpy as np
 import pandas as pd
-from scipy.stats import ks_2samp, linregress, pearsonr, zscore
+from scipy.stats import pearsonr, zscore
 
 # Yesselman lab imports
 from rna_map.mutation_histogram import (
@@ -20,8 +19,24 @@ from seq_tools import SequenceStructure, fold, has_5p_sequence, to_rna
 from seq_tools.structure import find as seq_ss_find
 
 # Local imports
-from dms_quant_framework.logger import get_logger, setup_logging
-from dms_quant_framework.paths import DATA_PATH
+from dms_quant_framework.dataset import read_dataset
+from dms_quant_framework.logger import get_logger, instrument, setup_logging
+from dms_quant_framework.output_writer import flush_outputs, write_output
+from dms_quant_framework.paths import (
+    get_input_file,
+    get_output_file,
+    glob_input_files,
+)
+from dms_quant_framework.reactivity_store import (
+    INDEX_FILE,
+    ReactivityStore,
+    write_reactivity_store,
+)
+from dms_quant_framework.stats import (
+    grouped_ks_2samp,
+    grouped_linregress,
+    grouped_mean_std,
+)
 
 
 log = get_logger("process-motifs")
@@ -97,7 +112,7 @@ def trim_p5_and_p3(df: pd.DataFrame, is_rna=True) -> pd.DataFrame:
         ValueError: If no common p5 sequence is found or the sequence is not
             registered in the CSV file.
     """
-    df_p5 = pd.read_csv(f"{DATA_PATH}/csvs/p5_sequences.csv")
+    df_p5 = pd.read_csv(get_input_file("csvs/p5_sequences.csv"))
     if is_rna:
         df_p5 = to_rna(df_p5)
     common_p5_seq = ""
@@ -168,10 +183,102 @@ def flip_pair(bp_name: str) -> str:
     return bp_name[::-1]
 
 
+def build_motif_index_map(
+    motif_positions: List[List[int]],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds a flat index map for the motifs of a construct template.
+
+    Args:
+        motif_positions (List[List[int]]): The positions of each motif in the
+            construct, -1 marks a strand break that gets a reactivity of 0.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The positions of all motifs concatenated
+        and the offsets of each motif in them, motif i is
+        positions[offsets[i]:offsets[i + 1]].
+    """
+    lengths = [len(positions) for positions in motif_positions]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(int)
+    if len(motif_positions) == 0:
+        return np.zeros(0, dtype=int), offsets
+    return np.concatenate(motif_positions).astype(int), offsets
+
+
+def gather_motif_data(
+    data: np.ndarray, positions: np.ndarray, offsets: np.ndarray
+) -> List[List[List[float]]]:
+    """
+    Extracts the reactivities of all motifs of constructs that share a template.
+
+    Args:
+        data (np.ndarray): The (n_constructs, length) reactivity matrix.
+        positions (np.ndarray): The flat motif positions from build_motif_index_map.
+        offsets (np.ndarray): The motif offsets from build_motif_index_map.
+
+    Returns:
+        List[List[List[float]]]: The reactivities of each motif of each construct,
+        rounded to 6 decimals, with an int 0 at each strand break.
+    """
+    is_break = (positions < 0).tolist()
+    # float32 data from a reactivity store is converted before rounding, but its
+    # values are only exact to about 1e-7 so rounded values can differ by 1e-6
+    m_data = data[:, np.where(positions < 0, 0, positions)].astype(np.float64)
+    # round rounds exact ties like the per residue extraction, np.round does not
+    m_data = [
+        [0 if brk else round(value, 6) for value, brk in zip(row, is_break)]
+        for row in m_data.tolist()
+    ]
+    return [
+        [row[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+        for row in m_data
+    ]
+
+
+def iter_structure_templates(df: pd.DataFrame, store: Optional[ReactivityStore] = None):
+    """
+    Groups constructs by their (sequence length, structure) template.
+
+    Constructs of a template share the positions of all their motifs.
+
+    Args:
+        df (pd.DataFrame): The constructs with sequence, structure and data
+            columns, the data column is not needed if a store is given.
+        store (ReactivityStore, optional): A store with the reactivities of the
+            constructs by name. If given, the reactivity matrix of each template
+            is sliced from the store instead of stacked from the data column.
+            The store holds float32 values, so reactivities can differ from the
+            data column by about 1e-7.
+
+    Yields:
+        Tuple[np.ndarray, pd.DataFrame, np.ndarray]: The row numbers of the
+        constructs in df, the constructs and their stacked reactivity matrix.
+    """
+    # data is grouped by length too so each group stacks into a matrix
+    if store is not None:
+        data_lengths = df["name"].map(lambda name: store.locate(name)[0])
+    else:
+        data_lengths = df["data"].apply(len)
+    keys = [
+        df["sequence"].str.len().to_numpy(),
+        data_lengths.to_numpy(),
+        df["structure"].to_numpy(),
+    ]
+    row_numbers = np.arange(len(df))
+    for _, rows in pd.Series(row_numbers).groupby(keys, sort=False):
+        df_template = df.iloc[rows.to_numpy()]
+        if store is not None:
+            data = store.rows(df_template["name"].tolist())
+        else:
+            data = np.array(df_template["data"].tolist(), dtype=float)
+        yield rows.to_numpy(), df_template, data
+
+
 # processing steps ##################################################################
 
 
 # step 1: convert raw pickled mutation histograms to dataframe json files ##########
+@instrument()
 def process_mutation_histograms_to_json():
     """
     Processes mutation histograms from pickle files, converts them to DataFrames,
@@ -188,14 +295,13 @@ def process_mutation_histograms_to_json():
         None
     """
     log.info("Processing mutation histograms")
-    if not os.path.isdir(f"{DATA_PATH}/mutation-histograms"):
+    histogram_dir = get_input_file("mutation-histograms")
+    if not os.path.isdir(histogram_dir):
         raise ValueError(
-            f"{DATA_PATH}/mutation-histograms directory does not exist, please download our data from FigShare"
+            f"{histogram_dir} directory does not exist, please download our data from FigShare"
         )
-    log.info(
-        f"Found {len(glob.glob(DATA_PATH + '/mutation-histograms/*.p'))} pickle files"
-    )
-    pickle_files = glob.glob(f"{DATA_PATH}/mutation-histograms/*.p")
+    pickle_files = glob_input_files("mutation-histograms/*.p")
+    log.info(f"Found {len(pickle_files)} pickle files")
     cols = [
         "name",
         "sequence",
@@ -214,9 +320,14 @@ def process_mutation_histograms_to_json():
 
     for pfile in pickle_files:
         name = os.path.splitext(os.path.basename(pfile))[0]
-        output_file = f"{DATA_PATH}/raw-jsons/constructs/{name}.json"
+        output_file = get_output_file(f"raw-jsons/constructs/{name}.json")
+        store_path = get_output_file(f"raw-jsons/constructs/{name}_data")
 
         if os.path.isfile(output_file):
+            if not os.path.isfile(os.path.join(store_path, INDEX_FILE)):
+                # JSON files written before the store existed
+                log.info(f"Writing the reactivity store of {name} from {output_file}")
+                write_reactivity_store(pd.read_json(output_file), store_path)
             log.info(f"Skipping {name}: Output file already exists")
             continue
 
@@ -235,7 +346,8 @@ def process_mutation_histograms_to_json():
 
         final_result = pd.concat(results)
         final_result = trim_p5_and_p3(final_result)
-        final_result.to_json(output_file, orient="records")
+        write_output(final_result, output_file)
+        write_reactivity_store(final_result, store_path)
 
     log.info("Mutation histogram processing and JSON conversion completed successfully")
 
@@ -246,17 +358,27 @@ class GenerateMotifDataFrame:
     A class used to generate and process motif data from constructs.
     """
 
-    def run(self, df: pd.DataFrame, name: str) -> pd.DataFrame:
+    # reactivities of the constructs, set by run
+    store = None
+
+    @instrument()
+    def run(
+        self, df: pd.DataFrame, name: str, store: Optional[ReactivityStore] = None
+    ) -> pd.DataFrame:
         """
         Process the input dataframe to generate motif data.
 
         Args:
             df (pd.DataFrame): Input dataframe with sequence and structure data.
+            store (ReactivityStore, optional): The reactivities of the constructs,
+                sliced instead of the data column if given. Motif reactivities can
+                then differ by 1e-6 from the data column. Defaults to None.
 
         Returns:
             pd.DataFrame: Processed dataframe with average motif data.
         """
         self.name = name
+        self.store = store
         log.info(f"Processing {name} with {len(df)} rows")
         df_filtered = df.query("num_aligned > 2000 and sn > 4.0")
         log.info(
@@ -266,47 +388,61 @@ class GenerateMotifDataFrame:
         df_motif_helix = self.__create_helix_motif_dataframe(df_filtered)
         dfs = [df_motif, df_motif_helix]
         df_motif_concat = pd.concat(dfs).reset_index(drop=True)
-        df_motif_concat.to_json(
-            f"{DATA_PATH}/raw-jsons/motifs/{self.name}_motifs_concat.json",
-            orient="records",
+        write_output(
+            df_motif_concat,
+            get_output_file(f"raw-jsons/motifs/{self.name}_motifs_concat.json"),
         )
         df_motif_concat_standardized = self._standardize_motifs(df_motif_concat)
-        df_motif_concat_standardized.to_json(
-            f"{DATA_PATH}/raw-jsons/motifs/{self.name}_motifs_standard.json",
-            orient="records",
+        write_output(
+            df_motif_concat_standardized,
+            get_output_file(f"raw-jsons/motifs/{self.name}_motifs_standard.json"),
         )
         df_motif_avg = self._calculate_average_motif_data(df_motif_concat_standardized)
         return df_motif_avg
 
+    @instrument()
     def _create_motif_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """Create the initial motif dataframe from the filtered data."""
-        motif_data = []
-        for _, row in df.iterrows():
-            junctions = SecStruct(row["sequence"], row["structure"]).get_junctions()
-            for j, m in enumerate(junctions):
-                motif_data.append(self._extract_motif_data(row, j, m))
+        motif_data_by_row = [None] * len(df)
+        for rows, df_template, data in iter_structure_templates(df, self.store):
+            first = df_template.iloc[0]
+            junctions = SecStruct(first["sequence"], first["structure"]).get_junctions()
+            m_positions = [self._get_motif_positions(m.strands) for m in junctions]
+            all_m_data = gather_motif_data(data, *build_motif_index_map(m_positions))
+            for i, (_, row) in enumerate(df_template.iterrows()):
+                motif_data_by_row[rows[i]] = [
+                    self._extract_motif_data(row, j, m, m_data)
+                    for j, (m, m_data) in enumerate(zip(junctions, all_m_data[i]))
+                ]
+        motif_data = [data for row_data in motif_data_by_row for data in row_data]
         df_motif = pd.DataFrame(motif_data)
-        df_motif.to_json(
-            f"{DATA_PATH}/raw-jsons/motifs/{self.name}_motifs.json",
-            orient="records",
+        write_output(
+            df_motif, get_output_file(f"raw-jsons/motifs/{self.name}_motifs.json")
         )
         return df_motif
 
     def _extract_motif_data(
-        self, row: pd.Series, m_pos: int, m: SecStruct
+        self, row: pd.Series, m_pos: int, m: SecStruct, m_data: List[float]
     ) -> Dict[str, Any]:
-        """Extract motif data for a single motif."""
+        """
+        Extract motif data for a single motif.
+
+        The motif comes from the template of the construct, so its sequence is
+        read from the construct at the motif strands.
+        """
         strands = m.strands
         flank_bps = self._get_flanking_base_pairs(row, strands)
-        m_data = self._get_motif_reactivity_data(row, strands)
         m_strands = strands[0] + [-1] + strands[1]
-        token = self._generate_motif_token(m.sequence)
+        m_sequence = "&".join(
+            "".join(row["sequence"][pos] for pos in strand) for strand in strands
+        )
+        token = self._generate_motif_token(m_sequence)
 
         return {
             "construct": row["name"],
             "m_data": m_data,
             "m_pos": m_pos,
-            "m_sequence": m.sequence,
+            "m_sequence": m_sequence,
             "m_structure": m.structure,
             "m_strands": m_strands,
             "m_token": token,
@@ -316,6 +452,7 @@ class GenerateMotifDataFrame:
             "sn": row["sn"],
         }
 
+    @instrument()
     def __create_helix_motif_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Create the initial motif dataframe from the input dataframe.
@@ -326,25 +463,33 @@ class GenerateMotifDataFrame:
         Returns:
             pd.DataFrame: The initial motif dataframe.
         """
-        all_data = []
-        for _, row in df.iterrows():
-            ss = SecStruct(row["sequence"], row["structure"])
-            for j, m in enumerate(ss.get_helices()):
-                all_data.append(self.__get_helix_data(m, row, j))
+        all_data_by_row = [None] * len(df)
+        for rows, df_template, data in iter_structure_templates(df, self.store):
+            first = df_template.iloc[0]
+            helices = SecStruct(first["sequence"], first["structure"]).get_helices()
+            m_positions = [m.strands[0][:-1] + [-1] + m.strands[1][1:] for m in helices]
+            all_m_data = gather_motif_data(data, *build_motif_index_map(m_positions))
+            for i, (_, row) in enumerate(df_template.iterrows()):
+                all_data_by_row[rows[i]] = [
+                    self.__get_helix_data(m, row, j, m_data)
+                    for j, (m, m_data) in enumerate(zip(helices, all_m_data[i]))
+                ]
+        all_data = [data for row_data in all_data_by_row for data in row_data]
         df_motif = pd.DataFrame(all_data)
-        df_motif.to_json(
-            f"{DATA_PATH}/raw-jsons/motifs/{self.name}_helix.json", orient="records"
+        write_output(
+            df_motif, get_output_file(f"raw-jsons/motifs/{self.name}_helix.json")
         )
         return df_motif
 
-    def __get_helix_data(self, m, row, m_pos) -> Dict[str, Any]:
+    def __get_helix_data(self, m, row, m_pos, m_data) -> Dict[str, Any]:
         """
         Get the motif data for a given motif and construct row.
 
         Args:
-            m (Motif): The motif object.
+            m (Motif): The motif object from the template of the construct.
             row (pd.Series): The row containing the sequence, data, and name.
             m_pos (int): The position of the motif.
+            m_data (List[float]): The reactivities of the motif.
 
         Returns:
             Dict[str, Any]: A dictionary containing the motif data.
@@ -355,14 +500,8 @@ class GenerateMotifDataFrame:
         second_bp_id = row["sequence"][second_bp[0]] + row["sequence"][second_bp[1]]
         flank_bp_5p = row["sequence"][strands[0][0]] + row["sequence"][strands[1][-1]]
         flank_bp_3p = row["sequence"][strands[0][-2]] + row["sequence"][strands[1][1]]
-        m_data = []
         m_strands = strands[0][:-1] + [-1] + strands[1][1:]
-        for pos in m_strands:
-            if pos == -1:
-                m_data.append(0)
-            else:
-                m_data.append(round(row["data"][pos], 6))
-        seqs = m.sequence.split("&")
+        seqs = ["".join(row["sequence"][pos] for pos in strand) for strand in strands]
         ss = m.structure.split("&")
         token = "HELIX." + str(len(seqs[0]))
         data = {
@@ -394,20 +533,19 @@ class GenerateMotifDataFrame:
             "m_second_flank_bp_3p": seq[strands[0][-1] + 1] + seq[strands[1][0] - 1],
         }
 
-    def _get_motif_reactivity_data(
-        self, row: pd.Series, strands: List[List[int]]
-    ) -> List[float]:
-        """Get the reactivity data for a motif."""
-        m_data = [round(row["data"][pos], 6) for strand in strands for pos in strand]
+    def _get_motif_positions(self, strands: List[List[int]]) -> List[int]:
+        """Get the positions of the reactivity data of a motif, -1 for the break."""
+        positions = [pos for strand in strands for pos in strand]
         if len(strands) == 2:
-            m_data.insert(len(strands[0]), 0)
-        return m_data
+            positions.insert(len(strands[0]), -1)
+        return positions
 
     def _generate_motif_token(self, sequence: str) -> str:
         """Generate a token for the motif."""
         seqs = sequence.split("&")
         return f"{len(seqs[0]) - 2}x{len(seqs[1]) - 2}"
 
+    @instrument()
     def _standardize_motifs(self, df_motif: pd.DataFrame) -> pd.DataFrame:
         """Standardize motifs to ensure consistent orientation."""
         df_motif = df_motif.copy()
@@ -463,58 +601,111 @@ class GenerateMotifDataFrame:
         """Flip a base pair."""
         return pair[::-1]
 
+    @instrument()
     def _calculate_average_motif_data(self, df_motif: pd.DataFrame) -> pd.DataFrame:
-        """Calculate average motif data for each unique motif sequence."""
-        grouped = df_motif.groupby("m_sequence")
-        avg_data = []
-
-        for motif_seq, group in grouped:
-            pdb_paths = self._get_pdb_paths(motif_seq)
-            m_data_array = np.array(group["m_data"].tolist())
-            m_data_avg, m_data_std, m_data_cv = self._calculate_statistics(m_data_array)
-            pairs = self._get_likely_pairs(motif_seq)
-
-            avg_data.append(
-                {
-                    "constructs": group["construct"].tolist(),
-                    "has_pdbs": bool(pdb_paths),
-                    "m_data_array": m_data_array,
-                    "m_data_avg": m_data_avg,
-                    "m_data_cv": m_data_cv,
-                    "m_data_std": m_data_std,
-                    "m_flank_bp_5p": group["m_flank_bp_5p"].tolist(),
-                    "m_flank_bp_3p": group["m_flank_bp_3p"].tolist(),
-                    "m_orientation": group["m_orientation"].tolist(),
-                    "m_pos": group["m_pos"].tolist(),
-                    "m_second_flank_bp_5p": group["m_second_flank_bp_5p"].tolist(),
-                    "m_second_flank_bp_3p": group["m_second_flank_bp_3p"].tolist(),
-                    "m_sequence": motif_seq,
-                    "m_strands": group["m_strands"].tolist(),
-                    "m_structure": group["m_structure"].iloc[0],
-                    "m_token": group["m_token"].iloc[0],
-                    "pairs": pairs,
-                    "pdbs": pdb_paths,
-                }
-            )
+        """
+        Calculate average motif data for each unique motif sequence.
 
-        df_avg = pd.DataFrame(avg_data)
-        df_avg.to_json(
-            f"{DATA_PATH}/raw-jsons/motifs/{self.name}_motifs_avg.json",
-            orient="records",
+        The mean, std and cv of all motifs are computed as segmented reductions over
+        the motif data sorted by motif, one stacked matrix per motif length.
+        """
+        df_motif = df_motif.reset_index(drop=True)
+        codes, motif_seqs = pd.factorize(df_motif["m_sequence"], sort=True)
+        n_motifs = len(motif_seqs)
+        m_data_arrays = [None] * n_motifs
+        m_data_avgs = [None] * n_motifs
+        m_data_stds = [None] * n_motifs
+        m_data_cvs = [None] * n_motifs
+        lengths = df_motif["m_data"].apply(len).to_numpy()
+        for length in np.unique(lengths):
+            rows = np.flatnonzero(lengths == length)
+            rows = rows[np.argsort(codes[rows], kind="stable")]
+            motif_codes, local_codes = np.unique(codes[rows], return_inverse=True)
+            m_data = np.array(df_motif["m_data"].iloc[rows].tolist(), dtype=float)
+            m_data = m_data.reshape(len(rows), length)
+            avg, std = grouped_mean_std(local_codes, m_data)
+            cv = np.divide(std, avg, out=np.zeros_like(std), where=avg != 0)
+            bounds = np.concatenate([[0], np.cumsum(np.bincount(local_codes))])
+            for k, code in enumerate(motif_codes):
+                m_data_arrays[code] = m_data[bounds[k] : bounds[k + 1]]
+                m_data_avgs[code] = avg[k]
+                m_data_stds[code] = std[k]
+                m_data_cvs[code] = cv[k]
+
+        list_cols = [
+            "construct",
+            "m_flank_bp_5p",
+            "m_flank_bp_3p",
+            "m_orientation",
+            "m_pos",
+            "m_second_flank_bp_5p",
+            "m_second_flank_bp_3p",
+            "m_strands",
+        ]
+        aggs = {col: (col, list) for col in list_cols}
+        aggs["m_structure"] = ("m_structure", "first")
+        aggs["m_token"] = ("m_token", "first")
+        df_lists = df_motif.groupby(codes, sort=True).agg(**aggs)
+
+        pdb_index = self._build_pdb_index()
+        pdb_paths = [self._get_pdb_paths(seq, pdb_index) for seq in motif_seqs]
+        df_avg = pd.DataFrame(
+            {
+                "constructs": df_lists["construct"].tolist(),
+                "has_pdbs": [bool(paths) for paths in pdb_paths],
+                "m_data_array": m_data_arrays,
+                "m_data_avg": m_data_avgs,
+                "m_data_cv": m_data_cvs,
+                "m_data_std": m_data_stds,
+                "m_flank_bp_5p": df_lists["m_flank_bp_5p"].tolist(),
+                "m_flank_bp_3p": df_lists["m_flank_bp_3p"].tolist(),
+                "m_orientation": df_lists["m_orientation"].tolist(),
+                "m_pos": df_lists["m_pos"].tolist(),
+                "m_second_flank_bp_5p": df_lists["m_second_flank_bp_5p"].tolist(),
+                "m_second_flank_bp_3p": df_lists["m_second_flank_bp_3p"].tolist(),
+                "m_sequence": list(motif_seqs),
+                "m_strands": df_lists["m_strands"].tolist(),
+                "m_structure": df_lists["m_structure"].tolist(),
+                "m_token": df_lists["m_token"].tolist(),
+                "pairs": [self._get_likely_pairs(seq) for seq in motif_seqs],
+                "pdbs": pdb_paths,
+            }
+        )
+        write_output(
+            df_avg, get_output_file(f"raw-jsons/motifs/{self.name}_motifs_avg.json")
         )
         return df_avg
 
-    def _get_pdb_paths(self, motif_seq: str) -> List[str]:
+    def _build_pdb_index(self) -> Dict[str, List[str]]:
+        """
+        Index the PDB files of each motif directory with a single glob.
+
+        Returns:
+            Dict[str, List[str]]: The PDB paths in each motif directory, by
+            directory name.
+        """
+        # be consistent and use pdbs with 2 extra base pairs built by farfar
+        pdb_index = {
+            os.path.basename(os.path.normpath(path)): []
+            for path in glob_input_files("pdbs_w_2bp/*/")
+        }
+        for path in glob_input_files("pdbs_w_2bp/*/*.pdb"):
+            pdb_index[os.path.basename(os.path.dirname(path))].append(path)
+        return pdb_index
+
+    def _get_pdb_paths(
+        self, motif_seq: str, pdb_index: Optional[Dict[str, List[str]]] = None
+    ) -> List[str]:
         """Get PDB file paths for a given motif sequence."""
+        if pdb_index is None:
+            pdb_index = self._build_pdb_index()
         motif_seq_path = motif_seq.replace("&", "_")
         rev_motif_seq_path = "_".join(reversed(motif_seq_path.split("_")))
         pdb_paths = []
 
         for seq_path in [motif_seq_path, rev_motif_seq_path]:
-            # be consistent and use pdbs with 2 extra base pairs built by farfar
-            path = f"{DATA_PATH}/pdbs_w_2bp/{seq_path}"
-            if os.path.exists(path):
-                pdbs = glob.glob(f"{path}/*.pdb")
+            if seq_path in pdb_index:
+                pdbs = pdb_index[seq_path]
                 if pdbs:
                     pdb_paths.extend(pdbs)
                 else:
@@ -522,16 +713,6 @@ class GenerateMotifDataFrame:
 
         return pdb_paths
 
-    @staticmethod
-    def _calculate_statistics(
-        data_array: np.ndarray,
-    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
-        """Calculate average, standard deviation, and coefficient of variation."""
-        avg = np.mean(data_array, axis=0)
-        std = np.std(data_array, axis=0)
-        cv = np.divide(std, avg, out=np.zeros_like(std), where=avg != 0)
-        return avg, std, cv
-
     @staticmethod
     def _get_likely_pairs(motif_seq: str) -> List[str]:
         """Get likely base pairs for a symmetric junction in the motif sequence."""
@@ -545,6 +726,7 @@ class GenerateMotifDataFrame:
 
 # step 3: generate residue dataframes ##############################################
 class GenerateResidueDataFrame:
+    @instrument()
     def run(self, df_motif, name):
         self.name = name
         df_residues_avg = self.__generate_avg_residue_dataframe(df_motif)
@@ -717,34 +899,35 @@ class GenerateResidueDataFrame:
         return df_residues
 
     def __save_residues_to_json(self, df_residues):
-        df_residues.to_json(
-            f"{DATA_PATH}/raw-jsons/residues/{self.name}_residues.json",
-            orient="records",
+        write_output(
+            df_residues,
+            get_output_file(f"raw-jsons/residues/{self.name}_residues.json"),
         )
 
     def __save_avg_residues_to_json(self, df_residues):
-        df_residues.to_json(
-            f"{DATA_PATH}/raw-jsons/residues/{self.name}_residues_avg.json",
-            orient="records",
+        write_output(
+            df_residues,
+            get_output_file(f"raw-jsons/residues/{self.name}_residues_avg.json"),
         )
 
 
 # step 4: merge pdb info into motif and residue dataframes ##########################
+@instrument()
 def generate_pdb_residue_dataframe(df_residue):
     # this stores what type of non-wc bair each residue is part of
-    df_pairs = pd.read_csv(f"{DATA_PATH}/csvs/basepair_data_for_motifs.csv")
+    df_pairs = pd.read_csv(get_input_file("csvs/basepair_data_for_motifs.csv"))
     # describes which residues are in a pair
-    df_pair_info = pd.read_csv(f"{DATA_PATH}/csvs/all_bp_details.csv")
+    df_pair_info = pd.read_csv(get_input_file("csvs/all_bp_details.csv"))
     df_pair_info = df_pair_info[["name", "motif", "res_num1", "res_num2", "bp"]]
     df_pair_info["name"] = df_pair_info["name"].str.replace("_x3dna.out", "")
     df_pair_info.rename(columns={"name": "pdb_name"}, inplace=True)
     df_pair_info["pdb_name"] = df_pair_info["pdb_name"] + ".pdb"
     # gives the resolution of each pdb
-    df_res = pd.read_csv(f"{DATA_PATH}/csvs/pdb_res.csv")
+    df_res = pd.read_csv(get_input_file("csvs/pdb_res.csv"))
     df_res.drop(["m_sequence"], axis=1, inplace=True)
     df_res["pdb_name"] = [x + ".pdb" for x in df_res["pdb_name"]]
     # gives the b-factor of each residue
-    df_bfact = pd.read_csv(f"data/pdb-features/b_factor.csv")
+    df_bfact = pd.read_csv(get_input_file("pdb-features/b_factor.csv"))
     df_bfact = df_bfact[
         ["pdb_name", "pdb_r_pos", "average_b_factor", "normalized_b_factor"]
     ]
@@ -752,7 +935,7 @@ def generate_pdb_residue_dataframe(df_residue):
     df_paths = []
     for i, row in df_pairs.iterrows():
         try:
-            path = glob.glob(f"{DATA_PATH}/pdbs_w_2bp/*/{row['pdb_name']}")[0]
+            path = glob_input_files(f"pdbs_w_2bp/*/{row['pdb_name']}")[0]
         except:
             log.info(f"no pdb found for {row['pdb_name']}")
             path = ""
@@ -760,7 +943,7 @@ def generate_pdb_residue_dataframe(df_residue):
     df_pairs["pdb_path"] = df_paths
     df_pairs = df_pairs.merge(df_res, on="pdb_name")
     # df_pairs = df_pairs.merge(df_bfact, on=["pdb_name", "pdb_r_pos"])
-    df_pairs.to_csv(f"{DATA_PATH}/pdb-features/pairs.csv", index=False)
+    write_output(df_pairs, get_output_file("pdb-features/pairs.csv"))
     df_residue = df_residue.query("has_pdbs == True").copy()
     df_residue["m_sequence"] = df_residue["m_sequence"].apply(
         lambda x: x.replace("&", "_")
@@ -792,59 +975,162 @@ def generate_pdb_residue_dataframe(df_residue):
     return df_final
 
 
-def generate_stats(df):
-    all_data = []
-    for [m_sequence, r_loc_pos], g in df.groupby(["m_sequence", "r_loc_pos"]):
-        g_sort = g.sort_values("r_pos", ascending=True)
-        r = linregress(g["r_pos"], normalize(g["r_data"]))
-        if len(g) > 20:
-            min_vals = g_sort["r_data"].values[0:10]
-            max_vals = g_sort["r_data"].values[-10:]
-            ks_2samp_stat, ks_2samp_p_value = ks_2samp(min_vals, max_vals)
-        else:
-            ks_2samp_stat, ks_2samp_p_value = -1, -1
-        data = {
-            "r_nuc": g["r_nuc"].iloc[0],
-            "r_type": g["r_type"].iloc[0],
-            "pairs": g["likely_pair"].iloc[0],
-            "m_sequence": m_sequence,
-            "m_token": g["m_token"].iloc[0],
-            "r_loc_pos": r_loc_pos,
-            "slope": r.slope,
-            "intercept": r.intercept,
-            "r2": r.rvalue**2,
-            "p_val ": r.pvalue,
-            "ks_stat": ks_2samp_stat,
-            "ks_p_val": ks_2samp_p_value,
-            "count": len(g),
-            "r_pos_min": g["r_pos"].min(),
-            "r_pos_max": g["r_pos"].max(),
-            "r_data_min": g["r_data"].min(),
-            "r_data_max": g["r_data"].max(),
-            "r_data": g["r_data"].tolist(),
-            "r_pos": g["r_pos"].tolist(),
-        }
-        all_data.append(data)
-    df_stats = pd.DataFrame(all_data)
-    df_stats.to_json("stats.json", orient="records")
+def generate_stats(
+    df: pd.DataFrame, output_file: Optional[str] = None, n_ks_vals: int = 10
+) -> pd.DataFrame:
+    """
+    Computes position dependent statistics for each residue of each motif.
 
+    For each (m_sequence, r_loc_pos) group, regresses the normalized reactivity
+    against the position of the residue in the construct and compares the
+    reactivities of the `n_ks_vals` most 5' and 3' positions with a KS test. All
+    groups are computed at once over arrays sorted by group.
 
-def regen_data():
-    df = pd.read_json(f"{DATA_PATH}/raw-jsons/constructs/pdb_library_1.json")
-    gen = GenerateMotifDataFrame()
+    Args:
+        df (pd.DataFrame): The residue dataframe.
+        output_file (str, optional): The path to write the stats JSON to.
+            Defaults to stats.json in the output path.
+        n_ks_vals (int): The number of values at each end used in the KS test. Only
+            groups with more than 2 * n_ks_vals values are tested. Defaults to 10.
+
+    Returns:
+        pd.DataFrame: The statistics of each group.
+    """
+    group_cols = ["m_sequence", "r_loc_pos"]
+    grouped = df.groupby(group_cols, sort=True)
+    df_stats = grouped.agg(
+        r_nuc=("r_nuc", "first"),
+        r_type=("r_type", "first"),
+        pairs=("likely_pair", "first"),
+        m_token=("m_token", "first"),
+        count=("r_data", "size"),
+        r_pos_min=("r_pos", "min"),
+        r_pos_max=("r_pos", "max"),
+        r_data_min=("r_data", "min"),
+        r_data_max=("r_data", "max"),
+        r_data=("r_data", list),
+        r_pos=("r_pos", list),
+    ).reset_index()
+
+    codes = grouped.ngroup().to_numpy()
+    r_pos = df["r_pos"].to_numpy(dtype=np.float64)
+    r_data = df["r_data"].to_numpy(dtype=np.float64)
+    # normalize the reactivities within each group
+    r_min = df_stats["r_data_min"].to_numpy(dtype=np.float64)[codes]
+    r_max = df_stats["r_data_max"].to_numpy(dtype=np.float64)[codes]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r_norm = (r_data - r_min) / (r_max - r_min)
+    df_reg = grouped_linregress(codes, r_pos, r_norm)
+
+    # the n_ks_vals lowest and highest positions of each group sorted by r_pos
+    order = np.lexsort((r_pos, codes))
+    sorted_data = r_data[order]
+    counts = df_stats["count"].to_numpy()
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    eligible = np.flatnonzero(counts > 2 * n_ks_vals)
+    ks_stat = np.full(len(df_stats), -1.0)
+    ks_p_val = np.full(len(df_stats), -1.0)
+    if len(eligible) > 0:
+        offsets = np.arange(n_ks_vals)
+        min_idx = starts[eligible][:, None] + offsets
+        max_idx = (starts + counts)[eligible][:, None] - n_ks_vals + offsets
+        stat, p_val = grouped_ks_2samp(sorted_data[min_idx], sorted_data[max_idx])
+        ks_stat[eligible] = stat
+        ks_p_val[eligible] = p_val
+
+    df_stats["slope"] = df_reg["slope"].to_numpy()
+    df_stats["intercept"] = df_reg["intercept"].to_numpy()
+    df_stats["r2"] = df_reg["rvalue"].to_numpy() ** 2
+    df_stats["p_val "] = df_reg["pvalue"].to_numpy()
+    df_stats["ks_stat"] = ks_stat
+    df_stats["ks_p_val"] = ks_p_val
+    df_stats = df_stats[
+        [
+            "r_nuc",
+            "r_type",
+            "pairs",
+            "m_sequence",
+            "m_token",
+            "r_loc_pos",
+            "slope",
+            "intercept",
+            "r2",
+            "p_val ",
+            "ks_stat",
+            "ks_p_val",
+            "count",
+            "r_pos_min",
+            "r_pos_max",
+            "r_data_min",
+            "r_data_max",
+            "r_data",
+            "r_pos",
+        ]
+    ]
+    if output_file is None:
+        output_file = get_output_file("stats.json")
+    write_output(df_stats, output_file)
+    return df_stats
+
+
+# pipeline stages, each reads the output files of the previous one ###############
+def write_motif_dataframes(
+    name: str = "pdb_library_1", use_store: bool = False
+) -> None:
+    """
+    Generate the motif dataframes of a library from its construct JSON file.
+
+    Args:
+        name (str): The library name. Defaults to "pdb_library_1".
+        use_store (bool): Slice the reactivities from the float32 reactivity store
+            of the library instead of the data column. Motif reactivities can then
+            differ by 1e-6 from the default outputs. Defaults to False.
+    """
+    df = pd.read_json(get_input_file(f"raw-jsons/constructs/{name}.json"))
+    store = None
+    if use_store:
+        store = ReactivityStore(get_input_file(f"raw-jsons/constructs/{name}_data"))
     log.info("Generating motif dataframe")
-    gen.run(df, "pdb_library_1")
-    df = pd.read_json(f"{DATA_PATH}/raw-jsons/motifs/pdb_library_1_motifs_avg.json")
+    GenerateMotifDataFrame().run(df, name, store=store)
+
+
+def write_residue_dataframes(name: str = "pdb_library_1") -> None:
+    """
+    Generate the residue dataframes of a library from its average motif data.
+
+    Args:
+        name (str): The library name. Defaults to "pdb_library_1".
+    """
+    df = pd.read_json(get_input_file(f"raw-jsons/motifs/{name}_motifs_avg.json"))
     log.info("Generating residue dataframe")
-    gen = GenerateResidueDataFrame()
-    gen.run(df, "pdb_library_1")
-    df = pd.read_json(f"{DATA_PATH}/raw-jsons/residues/pdb_library_1_residues.json")
+    GenerateResidueDataFrame().run(df, name)
+
+
+def write_pdb_residue_dataframe(name: str = "pdb_library_1") -> None:
+    """
+    Merge the pdb features into the residues of a library that have pdbs.
+
+    Args:
+        name (str): The library name. Defaults to "pdb_library_1".
+    """
+    # only residues with pdbs are used for the pdb residue dataframe
+    df = read_dataset(
+        get_input_file(f"raw-jsons/residues/{name}_residues.json"),
+        filters=[("has_pdbs", "==", True)],
+    )
     log.info("Generating pdb residue dataframe")
     df = generate_pdb_residue_dataframe(df)
-    df.to_json(
-        f"{DATA_PATH}/raw-jsons/residues/pdb_library_1_residues_pdb.json",
-        orient="records",
-    )
+    write_output(df, get_output_file(f"raw-jsons/residues/{name}_residues_pdb.json"))
+
+
+def regen_data():
+    # each step reads the files written by the step before
+    write_motif_dataframes()
+    flush_outputs()
+    write_residue_dataframes()
+    flush_outputs()
+    write_pdb_residue_dataframe()
+    flush_outputs()
 
 
 def main():
@@ -0,0 +1,317 @@
+import collections
+import contextlib
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from typing import ContextManager, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from dms_quant_framework.logger import get_logger
+
+log = get_logger("profiling")
+
+PROFILE_MODES = ["cprofile", "sample"]
+
+# the profile settings of worker processes, see set_worker_profiling
+PROFILE_DIR_ENV = "DMS_QUANT_PROFILE_DIR"
+PROFILE_MODE_ENV = "DMS_QUANT_PROFILE_MODE"
+PROFILE_INTERVAL_ENV = "DMS_QUANT_PROFILE_INTERVAL"
+
+
+def get_profile_path(output_dir: str, name: str, mode: str) -> str:
+    """
+    Get the file a profile of a stage is written to.
+
+    Args:
+        output_dir (str): The directory of the profiles.
+        name (str): The name of the stage, e.g. the CLI command.
+        mode (str): "cprofile" writes a pstats file and "sample" writes collapsed
+            stacks.
+
+    Returns:
+        str: The path of the profile.
+    """
+    ext = "pstats" if mode == "cprofile" else "collapsed"
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+    return os.path.join(output_dir, f"{safe_name}.{ext}")
+
+
+# sampling profiler ###########################################################
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    label = (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+    # ; separates frames in the collapsed stack format
+    return label.replace(";", ":")
+
+
+class StackSampler:
+    """
+    A low overhead profiler that samples the stacks of all threads at an interval.
+
+    The samples are written in the collapsed stack format, one line per unique
+    stack with its frames from the root to the leaf separated by ";" followed by
+    the number of samples. The format is read by flamegraph.pl, speedscope and
+    get_top_functions.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        """
+        Args:
+            interval (float): Seconds between samples. Defaults to 0.005.
+        """
+        self.interval = interval
+        self.counts: Dict[str, int] = collections.Counter()
+        self.n_samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        sampler_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == sampler_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            self.counts[";".join(reversed(stack))] += 1
+        self.n_samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        """Start sampling in a background thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def dump(self, path: str) -> None:
+        """
+        Write the samples as collapsed stacks.
+
+        Args:
+            path (str): The output file.
+        """
+        with open(path, "w") as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+
+# profiling ###################################################################
+
+
+@contextlib.contextmanager
+def profile(
+    path: str, mode: str = "cprofile", interval: float = 0.005
+) -> Iterator[None]:
+    """
+    Profile a block of code and write the profile when the block ends.
+
+    cProfile records every call of the thread the block runs in and slows the
+    code down, the sampling mode records the stacks of all threads at an interval
+    with little overhead. Worker processes are not profiled in either mode, see
+    set_worker_profiling.
+
+    Example:
+        >>> with profile("profiles/motifs.pstats"):
+        ...     GenerateMotifDataFrame().run(df, "pdb_library_1")
+        >>> print(format_top_functions("profiles/motifs.pstats"))
+
+    Args:
+        path (str): The output file, a pstats file for cprofile and collapsed
+            stacks for sample.
+        mode (str): "cprofile" or "sample". Defaults to "cprofile".
+        interval (float): Seconds between samples in the sampling mode.
+            Defaults to 0.005.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode}, must be one of {PROFILE_MODES}")
+    output_dir = os.path.dirname(path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    else:
+        profiler = StackSampler(interval)
+        profiler.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if mode == "cprofile":
+            profiler.disable()
+            profiler.dump_stats(path)
+        else:
+            profiler.stop()
+            profiler.dump(path)
+        log.info(
+            f"wrote {mode} profile of {time.perf_counter() - start:.1f} sec to {path}"
+        )
+
+
+def set_worker_profiling(
+    output_dir: Optional[str], mode: str = "cprofile", interval: float = 0.005
+) -> None:
+    """
+    Profile each stage that runs in a worker process of the pipeline, in the
+    processes this process starts.
+
+    The profile of a stage is written to get_profile_path(output_dir, stage name,
+    mode).
+
+    Args:
+        output_dir (str, optional): The directory of the profiles, None to stop
+            profiling workers.
+        mode (str): "cprofile" or "sample". Defaults to "cprofile".
+        interval (float): Seconds between samples in the sampling mode.
+            Defaults to 0.005.
+    """
+    if output_dir is None:
+        for env in [PROFILE_DIR_ENV, PROFILE_MODE_ENV, PROFILE_INTERVAL_ENV]:
+            os.environ.pop(env, None)
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode}, must be one of {PROFILE_MODES}")
+    os.environ[PROFILE_DIR_ENV] = output_dir
+    os.environ[PROFILE_MODE_ENV] = mode
+    os.environ[PROFILE_INTERVAL_ENV] = str(interval)
+
+
+def worker_profile(name: str) -> ContextManager[None]:
+    """
+    Profile a stage run in a worker process if set_worker_profiling was called.
+
+    Args:
+        name (str): The name of the stage.
+
+    Returns:
+        ContextManager[None]: The profile, or a context that does
+        nothing if workers are not profiled.
+    """
+    output_dir = os.environ.get(PROFILE_DIR_ENV)
+    if not output_dir:
+        return contextlib.nullcontext()
+    mode = os.environ.get(PROFILE_MODE_ENV, "cprofile")
+    interval = float(os.environ.get(PROFILE_INTERVAL_ENV, 0.005))
+    return profile(get_profile_path(output_dir, name, mode), mode, interval)
+
+
+# reading profiles ############################################################
+
+
+def _read_collapsed(path: str) -> Tuple[Dict[str, float], Dict[str, float], float]:
+    self_counts = collections.Counter()
+    total_counts = collections.Counter()
+    n_samples = 0
+    with open(path) as f:
+        for line in f:
+            stack, count = line.rstrip("\n").rsplit(" ", 1)
+            count = int(count)
+            # the first frame is the thread name
+            frames = stack.split(";")[1:]
+            n_samples += count
+            if not frames:
+                continue
+            self_counts[frames[-1]] += count
+            for frame in set(frames):
+                total_counts[frame] += count
+    return self_counts, total_counts, n_samples
+
+
+def _read_pstats(path: str) -> Tuple[Dict[str, float], Dict[str, float], float]:
+    stats = pstats.Stats(path)
+    self_times = {}
+    total_times = {}
+    for (filename, line, func), (_, _, tt, ct, _) in stats.stats.items():
+        label = f"{func} ({os.path.basename(filename)}:{line})"
+        self_times[label] = self_times.get(label, 0.0) + tt
+        total_times[label] = total_times.get(label, 0.0) + ct
+    return self_times, total_times, stats.total_tt
+
+
+def get_top_functions(path: str, n: int = 20, sort_by: str = "self") -> pd.DataFrame:
+    """
+    Get the functions a profile spent the most time in.
+
+    Args:
+        path (str): A pstats file or a collapsed stacks file.
+        n (int): The number of functions. Defaults to 20.
+        sort_by (str): "self" for the time in the function itself or "total" to
+            include the functions it calls. Defaults to "self".
+
+    Returns:
+        pd.DataFrame: The function, self and total time in seconds for pstats
+        files or samples for collapsed stacks, and their percent of the profile.
+    """
+    if sort_by not in ["self", "total"]:
+        raise ValueError(f"sort_by must be self or total, not {sort_by}")
+    if path.endswith(".collapsed"):
+        self_times, total_times, total = _read_collapsed(path)
+    else:
+        self_times, total_times, total = _read_pstats(path)
+    df = pd.DataFrame(
+        {
+            "function": list(total_times.keys()),
+            "self": [self_times.get(k, 0) for k in total_times],
+            "total": list(total_times.values()),
+        }
+    )
+    df["self_pct"] = 100 * df["self"] / total if total > 0 else 0.0
+    df["total_pct"] = 100 * df["total"] / total if total > 0 else 0.0
+    df = df.sort_values(sort_by, ascending=False, kind="stable").head(n)
+    return df.reset_index(drop=True)
+
+
+def format_top_functions(path: str, n: int = 20, sort_by: str = "self") -> str:
+    """
+    Format the functions a profile spent the most time in as a table.
+
+    Args:
+        path (str): A pstats file or a collapsed stacks file.
+        n (int): The number of functions. Defaults to 20.
+        sort_by (str): "self" or "total", see get_top_functions. Defaults to "self".
+
+    Returns:
+        str: The table.
+    """
+    df = get_top_functions(path, n, sort_by)
+    return df.to_string(index=False, float_format=lambda x: f"{x:.3f}")
+
+
+def list_profiles(output_dir: str) -> List[str]:
+    """
+    List the profiles in a directory.
+
+    Args:
+        output_dir (str): The directory of the profiles.
+
+    Returns:
+        List[str]: The pstats and collapsed stack files, sorted by name.
+    """
+    return sorted(
+        os.path.join(output_dir, f)
+        for f in os.listdir(output_dir)
+        if f.endswith(".pstats") or f.endswith(".collapsed")
+    )
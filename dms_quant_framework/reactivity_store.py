@@ -0,0 +1,198 @@
+import json
+import os
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dms_quant_framework.logger import get_logger
+
+log = get_logger("reactivity-store")
+
+INDEX_FILE = "index.json"
+
+
+def _matrix_file(length: int) -> str:
+    return f"length_{length}.npy"
+
+
+def write_reactivity_store(
+    df: pd.DataFrame, path: str, name_col: str = "name", data_col: str = "data"
+) -> "ReactivityStore":
+    """
+    Writes the reactivities of a library to a store of stacked float32 matrices.
+
+    Constructs are grouped by the length of their data, each group is written to
+    its own `.npy` file with one row per construct. The row of each construct is
+    kept in an index file next to the matrices.
+
+    Args:
+        df (pd.DataFrame): The constructs, with a name and a data column.
+        path (str): The directory of the store, created if it does not exist.
+        name_col (str): The column with the construct names. Defaults to "name".
+        data_col (str): The column with the reactivities. Defaults to "data".
+
+    Returns:
+        ReactivityStore: The store opened read only.
+    """
+    if df[name_col].duplicated().any():
+        raise ValueError(f"construct names in {name_col} must be unique")
+    os.makedirs(path, exist_ok=True)
+    lengths = df[data_col].apply(len)
+    index = {}
+    for length, df_length in df.groupby(lengths, sort=True):
+        matrix = np.lib.format.open_memmap(
+            os.path.join(path, _matrix_file(length)),
+            mode="w+",
+            dtype=np.float32,
+            shape=(len(df_length), length),
+        )
+        matrix[:] = np.array(df_length[data_col].tolist(), dtype=np.float32)
+        matrix.flush()
+        del matrix
+        index[str(length)] = df_length[name_col].tolist()
+    with open(os.path.join(path, INDEX_FILE), "w") as f:
+        json.dump(index, f)
+    log.info(f"wrote {len(df)} constructs in {len(index)} matrices to {path}")
+    return ReactivityStore(path)
+
+
+class ReactivityStore:
+    """
+    Read only access to the reactivities of a library written with
+    write_reactivity_store.
+
+    The matrices are memory mapped, so opening a store is cheap, nothing is read
+    until it is used and processes that open the same store share one copy of the
+    data through the page cache. Rows and matrices are returned as views of the
+    mapped files and are not copied.
+
+    Example:
+        >>> store = ReactivityStore("data/raw-jsons/constructs/pdb_library_1_data")
+        >>> store["construct_1"]  # 1d view of the construct reactivities
+        >>> store.matrix(170).mean(axis=0)  # average over constructs of length 170
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): The directory of the store.
+        """
+        index_file = os.path.join(path, INDEX_FILE)
+        if not os.path.isfile(index_file):
+            raise FileNotFoundError(f"Reactivity store index not found: {index_file}")
+        self.path = path
+        with open(index_file) as f:
+            index = json.load(f)
+        self._names = {int(length): names for length, names in index.items()}
+        self._rows = {
+            name: (length, row)
+            for length, names in self._names.items()
+            for row, name in enumerate(names)
+        }
+        self._matrices = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._rows
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        length, row = self.locate(name)
+        return self.matrix(length)[row]
+
+    def __repr__(self) -> str:
+        return f"ReactivityStore(path={self.path!r}, lengths={self.lengths})"
+
+    @property
+    def lengths(self) -> List[int]:
+        """The data lengths in the store."""
+        return sorted(self._names)
+
+    def names(self, length: int) -> List[str]:
+        """
+        Returns the names of the constructs of a length, in row order.
+
+        Args:
+            length (int): The data length.
+
+        Returns:
+            List[str]: The construct names.
+        """
+        return self._names[length]
+
+    def locate(self, name: str) -> Tuple[int, int]:
+        """
+        Returns the matrix and row that hold the reactivities of a construct.
+
+        Args:
+            name (str): The construct name.
+
+        Returns:
+            Tuple[int, int]: The data length of the construct and its row.
+        """
+        if name not in self._rows:
+            raise KeyError(f"construct {name} is not in the reactivity store")
+        return self._rows[name]
+
+    def matrix(self, length: int) -> np.ndarray:
+        """
+        Returns the memory mapped (n_constructs, length) matrix of a length.
+
+        Args:
+            length (int): The data length.
+
+        Returns:
+            np.ndarray: The read only matrix.
+        """
+        if length not in self._matrices:
+            if length not in self._names:
+                raise KeyError(f"no constructs of length {length} in the store")
+            self._matrices[length] = np.load(
+                os.path.join(self.path, _matrix_file(length)), mmap_mode="r"
+            )
+        return self._matrices[length]
+
+    def rows(self, names: List[str]) -> np.ndarray:
+        """
+        Returns the reactivities of constructs of the same length as one matrix.
+
+        Consecutive rows are returned as a view, other selections are gathered
+        into a new array.
+
+        Args:
+            names (List[str]): The construct names.
+
+        Returns:
+            np.ndarray: The (len(names), length) matrix.
+        """
+        locations = [self.locate(name) for name in names]
+        lengths = {length for length, _ in locations}
+        if len(lengths) != 1:
+            raise ValueError(f"constructs must have one data length, got {lengths}")
+        matrix = self.matrix(lengths.pop())
+        rows = np.array([row for _, row in locations], dtype=int)
+        if len(rows) > 0 and np.array_equal(rows, np.arange(rows[0], rows[-1] + 1)):
+            return matrix[rows[0] : rows[-1] + 1]
+        return matrix[rows]
+
+    def iter_matrices(self) -> Iterator[Tuple[int, List[str], np.ndarray]]:
+        """
+        Iterates over the matrices of the store.
+
+        Yields:
+            Tuple[int, List[str], np.ndarray]: The data length, the construct names
+            and the matrix.
+        """
+        for length in self.lengths:
+            yield length, self.names(length), self.matrix(length)
+
+    def to_dict(self) -> Dict[str, np.ndarray]:
+        """
+        Returns a view of the reactivities of every construct by name.
+
+        Returns:
+            Dict[str, np.ndarray]: The reactivities of each construct.
+        """
+        return {name: self[name] for name in self._rows}
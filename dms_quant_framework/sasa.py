@@ -4,7 +4,9 @@ from biopandas.pdb import PandasPdb
 import os
 import glob
 
-from dms_quant_framework.logger import get_logger
+from dms_quant_framework.logger import get_logger, instrument
+from dms_quant_framework.output_writer import write_output
+from dms_quant_framework.paths import get_input_file, get_output_file
 
 log = get_logger("sasa")
 
@@ -102,12 +104,15 @@ def compute_solvent_accessibility_all(
     return df
 
 
+@instrument()
 def generate_sasa_dataframe():
     dfs = []
     for probe_radius in [0.1, 0.25, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0]:
         # need to use pdbs with 2 extra base pairs built by farfar
         log.info(f"Processing probe radius: {probe_radius}")
-        df = compute_solvent_accessibility_all("data/pdbs_w_2bp", probe_radius)
+        df = compute_solvent_accessibility_all(
+            get_input_file("pdbs_w_2bp"), probe_radius
+        )
         probe_radius = str(probe_radius).replace(".", "_")
         df.rename({"sasa": f"sasa_{probe_radius}"}, axis=1, inplace=True)
         dfs.append(df)
@@ -118,3 +123,11 @@ def generate_sasa_dataframe():
             df, on=["m_sequence", "pdb_r_pos", "pdb_path", "r_nuc"]
         )
     return df_final
+
+
+def write_sasa_dataframe() -> None:
+    """
+    Write the solvent accessibility of each residue for all probe radii to sasa.csv.
+    """
+    df_sasa = generate_sasa_dataframe()
+    write_output(df_sasa, get_output_file("pdb-features/sasa.csv"))
@@ -1,5 +1,11 @@
+import math
+from functools import lru_cache
+from typing import Tuple
+
+import numpy as np
 import pandas as pd
-from scipy.stats import ttest_ind, pearsonr
+from scipy.stats import kstwo, pearsonr
+from scipy.stats import t as t_dist
 
 
 def r2(x, y):
@@ -17,26 +23,288 @@ def r2(x, y):
     return pearsonr(x, y)[0] ** 2
 
 
-def check_pairwise_statistical_significance(df, group_col, value_col):
+def adjust_p_values(p_values, method: str = "fdr_bh") -> np.ndarray:
+    """
+    Adjusts p-values for multiple testing.
+
+    Args:
+        p_values (array-like): The p-values to adjust. NaN values are ignored and
+            stay NaN.
+        method (str): One of "bonferroni", "holm" or "fdr_bh" (Benjamini-Hochberg).
+            Defaults to "fdr_bh".
+
+    Returns:
+        np.ndarray: The adjusted p-values in the same order as the input.
+    """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    adjusted = np.full(p_values.shape, np.nan)
+    valid = ~np.isnan(p_values)
+    p = p_values[valid]
+    m = len(p)
+    if m == 0:
+        return adjusted
+    if method == "bonferroni":
+        p_adj = p * m
+    elif method == "holm":
+        order = np.argsort(p)
+        p_sorted = np.maximum.accumulate(p[order] * (m - np.arange(m)))
+        p_adj = np.empty(m)
+        p_adj[order] = p_sorted
+    elif method == "fdr_bh":
+        order = np.argsort(p)[::-1]
+        p_sorted = np.minimum.accumulate(p[order] * m / np.arange(m, 0, -1))
+        p_adj = np.empty(m)
+        p_adj[order] = p_sorted
+    else:
+        raise ValueError(
+            f"Unknown correction method '{method}', must be one of "
+            "'bonferroni', 'holm' or 'fdr_bh'"
+        )
+    adjusted[valid] = np.minimum(p_adj, 1.0)
+    return adjusted
+
+
+def check_pairwise_statistical_significance(
+    df, group_col, value_col, correction=None, output="long"
+):
     """
     This function checks for statistical significance between all pairs of grouped
     distributions.
 
+    Uses Welch's t-test (same as `ttest_ind(..., equal_var=False)`). The count, mean
+    and variance of each group are computed once and all pairs are evaluated at
+    once with broadcasting.
+
     Parameters:
     df (pd.DataFrame): The dataframe containing the data.
     group_col (str): The column name to group by.
     value_col (str): The column name containing the values to compare.
+    correction (str, optional): Multiple testing correction to apply, one of
+        "bonferroni", "holm" or "fdr_bh". Defaults to None.
+    output (str): "long" for one row per pair of groups or "square" for a group by
+        group matrix of p-values. Defaults to "long".
+
+    Returns:
+    pd.DataFrame: A dataframe containing the p-values for each pair of groups. In
+        long form, an "adjusted p-value" column is added if a correction is given.
+        In square form, the adjusted p-values are returned if a correction is given.
+    """
+    if output not in ["long", "square"]:
+        raise ValueError(f"output must be 'long' or 'square', not '{output}'")
+    group_stats = df.groupby(group_col)[value_col].agg(["count", "mean", "var"])
+    groups = group_stats.index
+    n = group_stats["count"].to_numpy(dtype=np.float64)
+    mean = group_stats["mean"].to_numpy(dtype=np.float64)
+    var = group_stats["var"].to_numpy(dtype=np.float64)
+
+    # welch's t-test for every pair of groups
+    se2 = var / n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = se2[:, None] + se2[None, :]
+        t_stat = (mean[:, None] - mean[None, :]) / np.sqrt(denom)
+        dof = denom**2 / ((se2**2 / (n - 1))[:, None] + (se2**2 / (n - 1))[None, :])
+        p_vals = 2 * t_dist.sf(np.abs(t_stat), dof)
+
+    i, j = np.triu_indices(len(groups), k=1)
+    pair_p_vals = p_vals[i, j]
+    if correction is not None:
+        adjusted = adjust_p_values(pair_p_vals, correction)
+
+    if output == "square":
+        matrix = np.full((len(groups), len(groups)), np.nan)
+        values = adjusted if correction is not None else pair_p_vals
+        matrix[i, j] = values
+        matrix[j, i] = values
+        return pd.DataFrame(matrix, index=groups, columns=groups)
+
+    results = pd.DataFrame(
+        {
+            "Group 1": groups[i],
+            "Group 2": groups[j],
+            "p-value": pair_p_vals,
+        }
+    )
+    if correction is not None:
+        results["adjusted p-value"] = adjusted
+    return results
+
+
+# batched statistics ###############################################################
+
+
+def _segment_bounds(codes: np.ndarray, n_groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the start offset and size of each group in an array sorted by group code.
+    """
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return starts, counts
+
+
+def _segment_sum(values: np.ndarray, starts: np.ndarray, counts: np.ndarray):
+    """Sums each segment of a sorted array, empty segments sum to 0."""
+    sums = np.add.reduceat(values, np.minimum(starts, max(len(values) - 1, 0)))
+    sums[counts == 0] = 0
+    return sums
+
+
+def grouped_mean_std(codes, values) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the mean and population standard deviation of every group at once.
+
+    Equivalent to `values[codes == i].mean(axis=0)` and `values[codes == i].std(
+    axis=0)` for each group i, computed as segmented sums over the values sorted
+    by group.
+
+    Args:
+        codes (array-like): Integer group label (0 to n_groups - 1) for each row.
+        values (array-like): A 1d array or a 2d array with one row per code.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The mean and standard deviation of each
+        group, one row per group code. Groups without values are NaN.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    n_groups = codes.max() + 1 if len(codes) > 0 else 0
+    order = np.argsort(codes, kind="stable")
+    codes, values = codes[order], values[order]
+    starts, counts = _segment_bounds(codes, n_groups)
+    n = counts.astype(np.float64).reshape((-1,) + (1,) * (values.ndim - 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = _segment_sum(values, starts, counts) / n
+        # two passes, same as np.std, to avoid cancellation in the sum of squares
+        centered = values - mean[codes]
+        std = np.sqrt(_segment_sum(centered * centered, starts, counts) / n)
+    return mean, std
+
+
+def grouped_linregress(codes, x, y) -> pd.DataFrame:
+    """
+    Computes a least-squares linear regression for every group at once.
+
+    Equivalent to calling `scipy.stats.linregress(x[codes == i], y[codes == i])`
+    for each group i but uses closed-form OLS over grouped sums instead of one scipy
+    call per group.
+
+    Args:
+        codes (array-like): Integer group label (0 to n_groups - 1) for each value.
+        x (array-like): The independent variable.
+        y (array-like): The dependent variable.
+
+    Returns:
+        pd.DataFrame: A dataframe indexed by group code with the columns slope,
+        intercept, rvalue, pvalue and count.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n_groups = codes.max() + 1 if len(codes) > 0 else 0
+    order = np.argsort(codes, kind="stable")
+    codes, x, y = codes[order], x[order], y[order]
+    starts, counts = _segment_bounds(codes, n_groups)
+    n = counts.astype(np.float64)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_mean = _segment_sum(x, starts, counts) / n
+        y_mean = _segment_sum(y, starts, counts) / n
+        # center before multiplying to avoid cancellation in the sums of squares
+        x_c = x - x_mean[codes]
+        y_c = y - y_mean[codes]
+        ssxm = _segment_sum(x_c * x_c, starts, counts) / n
+        ssym = _segment_sum(y_c * y_c, starts, counts) / n
+        ssxym = _segment_sum(x_c * y_c, starts, counts) / n
+
+        slope = ssxym / ssxm
+        intercept = y_mean - slope * x_mean
+        r = ssxym / np.sqrt(ssxm * ssym)
+        r = np.clip(r, -1.0, 1.0)
+        # same convention as scipy, no variance means no correlation
+        r[(ssxm == 0) | (ssym == 0)] = 0.0
+
+        dof = n - 2
+        t_stat = r * np.sqrt(dof / ((1.0 - r) * (1.0 + r) + 1.0e-20))
+        p_val = 2 * t_dist.sf(np.abs(t_stat), dof)
+    p_val[counts == 2] = np.where(ssym[counts == 2] == 0, 1.0, 0.0)
+    p_val[counts < 2] = np.nan
+    slope[ssxm == 0] = np.nan
+    intercept[ssxm == 0] = np.nan
+
+    return pd.DataFrame(
+        {
+            "slope": slope,
+            "intercept": intercept,
+            "rvalue": r,
+            "pvalue": p_val,
+            "count": counts,
+        }
+    )
+
+
+@lru_cache(maxsize=None)
+def _ks_2samp_exact_pvalue(n1: int, n2: int, h: int) -> float:
+    """
+    Exact two-sided p-value of the two sample KS test by counting lattice paths.
+
+    Counts the paths from (0, 0) to (n1, n2) that stay strictly inside the band
+    |i / n1 - j / n2| < d, where d = h / lcm(n1, n2).
+    """
+    g = math.gcd(n1, n2)
+    bound = h * g
+    paths = [0] * (n2 + 1)
+    for i in range(n1 + 1):
+        for j in range(n2 + 1):
+            if abs(i * n2 - j * n1) >= bound:
+                paths[j] = 0
+            elif i == 0 and j == 0:
+                paths[j] = 1
+            elif i == 0:
+                paths[j] = paths[j - 1]
+            elif j > 0:
+                paths[j] += paths[j - 1]
+    prob = 1.0 - paths[n2] / math.comb(n1 + n2, n1)
+    return min(max(prob, 0.0), 1.0)
+
+
+def grouped_ks_2samp(data1, data2) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the two-sided two sample Kolmogorov-Smirnov test for many groups at once.
+
+    Each row of `data1` and `data2` holds the samples of one group, padded with NaN
+    when groups have different sizes. Gives the same result as calling
+    `scipy.stats.ks_2samp(row1, row2)` on the non-NaN values of each row.
+
+    Args:
+        data1 (array-like): 2D array of the first samples, shape (n_groups, m1).
+        data2 (array-like): 2D array of the second samples, shape (n_groups, m2).
 
     Returns:
-    pd.DataFrame: A dataframe containing the p-values for each pair of groups.
+        Tuple[np.ndarray, np.ndarray]: The KS statistic and p-value of each group.
     """
-    groups = df.groupby(group_col)[value_col].apply(list)
-    results = []
+    data1 = np.atleast_2d(np.asarray(data1, dtype=np.float64))
+    data2 = np.atleast_2d(np.asarray(data2, dtype=np.float64))
+    n1 = (~np.isnan(data1)).sum(axis=1)
+    n2 = (~np.isnan(data2)).sum(axis=1)
+    if np.any(n1 == 0) or np.any(n2 == 0):
+        raise ValueError("Data passed to grouped_ks_2samp must not be empty")
 
-    for i, (group1, values1) in enumerate(groups.items()):
-        for j, (group2, values2) in enumerate(groups.items()):
-            if i < j:
-                t_stat, p_val = ttest_ind(values1, values2, equal_var=False)
-                results.append({"Group 1": group1, "Group 2": group2, "p-value": p_val})
+    # evaluate both empirical cdfs at every observed value, NaN never compares true
+    data_all = np.concatenate([data1, data2], axis=1)
+    cdf1 = (data1[:, None, :] <= data_all[:, :, None]).sum(axis=2) / n1[:, None]
+    cdf2 = (data2[:, None, :] <= data_all[:, :, None]).sum(axis=2) / n2[:, None]
+    cddiffs = np.abs(cdf1 - cdf2)
+    cddiffs[np.isnan(data_all)] = 0.0
+    d = cddiffs.max(axis=1)
 
-    return pd.DataFrame(results)
+    p_vals = np.empty(len(d))
+    for i, (m1, m2, stat) in enumerate(zip(n1, n2, d)):
+        m1, m2 = int(m1), int(m2)
+        if max(m1, m2) <= 10000:
+            lcm = m1 * m2 // math.gcd(m1, m2)
+            h = int(np.round(stat * lcm))
+            d[i] = h / lcm
+            p_vals[i] = 1.0 if h == 0 else _ks_2samp_exact_pvalue(m1, m2, h)
+        else:
+            en = m1 * m2 / (m1 + m2)
+            p_vals[i] = np.clip(kstwo.sf(stat, np.round(en)), 0, 1)
+    return d, p_vals
@@ -32,13 +32,20 @@ setup(
     package_dir={"dms_quant_framework": "dms_quant_framework"},
     py_modules=[
         "dms_quant_framework/cli",
+        "dms_quant_framework/contacts",
+        "dms_quant_framework/dataset",
+        "dms_quant_framework/feature_store",
         "dms_quant_framework/format_tables",
         "dms_quant_framework/hbond",
         "dms_quant_framework/logger",
+        "dms_quant_framework/output_writer",
         "dms_quant_framework/paths",
         "dms_quant_framework/pdb_features",
+        "dms_quant_framework/pipeline",
         "dms_quant_framework/plotting",
         "dms_quant_framework/process_motifs",
+        "dms_quant_framework/profiling",
+        "dms_quant_framework/reactivity_store",
         "dms_quant_framework/sasa",
         "dms_quant_framework/stats",
     ],
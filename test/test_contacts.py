@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from dms_quant_framework.contacts import ContactMap
+from dms_quant_framework.pdb_features import (
+    get_distance_between_all_atom_pairs_dataframe,
+)
+
+RESOURCE_PATH = "test/resources/"
+
+PDB_PATHS = [
+    f"{RESOURCE_PATH}/pdbs/ACCC_GACU/TWOWAY.3WBM.2-2.GACU-ACCC.0.pdb",
+    f"{RESOURCE_PATH}/pdbs/ACG_CU/TWOWAY.6N7R.0-1.CU-ACG.0.pdb",
+]
+
+
+@pytest.mark.parametrize("pdb_path", PDB_PATHS)
+def test_contact_map_matches_distances(pdb_path):
+    contacts = ContactMap.from_pdb(pdb_path, cutoff=10.0)
+    df_org = get_distance_between_all_atom_pairs_dataframe(pdb_path, 10)
+    df = contacts.pairs_within()
+    cols = list(df_org.columns)
+    df_org = df_org.sort_values(cols).reset_index(drop=True)
+    df = df[cols].sort_values(cols).reset_index(drop=True)
+    assert len(df) == len(df_org) == contacts.n_pairs
+    # distances are stored as float32, rounding can differ in the last digit
+    pd.testing.assert_frame_equal(
+        df, df_org, check_dtype=False, check_exact=False, atol=0.011
+    )
+
+
+def test_contact_map_queries(tmp_path):
+    contacts = ContactMap.from_pdb(PDB_PATHS[0], cutoff=10.0)
+    row = contacts.pairs_within(4.0).iloc[0]
+    distance = contacts.distance(
+        row["res_num1"], row["atom_name1"], row["res_num2"], row["atom_name2"]
+    )
+    assert distance == pytest.approx(row["distance"], abs=0.005)
+    # distances are symmetric
+    assert distance == contacts.distance(
+        row["res_num2"], row["atom_name2"], row["res_num1"], row["atom_name1"]
+    )
+    df = contacts.neighbors(row["res_num1"], row["atom_name1"], radius=4.0)
+    assert (df["distance"] <= 4.0).all()
+    assert df["distance"].is_monotonic_increasing
+    assert len(df) <= len(contacts.neighbors(row["res_num1"], row["atom_name1"]))
+    with pytest.raises(ValueError):
+        contacts.pairs_within(20.0)
+    with pytest.raises(KeyError):
+        contacts.distance(999, "N1", row["res_num2"], row["atom_name2"])
+    path = str(tmp_path / "contacts.npz")
+    contacts.save(path)
+    loaded = ContactMap.load(path)
+    assert loaded.pdb_name == contacts.pdb_name
+    assert loaded.cutoff == contacts.cutoff
+    assert (loaded.matrix != contacts.matrix).nnz == 0
+    pd.testing.assert_frame_equal(loaded.atoms, contacts.atoms, check_dtype=False)
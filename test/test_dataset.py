@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+from dms_quant_framework.dataset import LazyDataset, iter_json_records, read_dataset
+
+
+@pytest.fixture
+def residue_df():
+    return pd.DataFrame(
+        {
+            "m_sequence": ["GAC&GC", "GAC&GC", "CAAG&CG", "CAAG&CG"],
+            "r_type": ["NON-WC", "WC", "NON-WC", "NON-WC"],
+            "has_pdbs": [True, False, True, True],
+            "pdb_r_pos": [3, 4, 5, 6],
+            "r_data": [[0.1, 0.2], [0.3], [0.4], [0.5, 0.6]],
+        }
+    )
+
+
+class TestLazyDataset:
+    def test_iter_json_records(self, residue_df, tmp_path):
+        path = str(tmp_path / "residues.json")
+        residue_df.to_json(path, orient="records")
+        # tiny block size forces records to be split across reads
+        records = list(iter_json_records(path, block_size=7))
+        assert len(records) == 4
+        assert records[3]["r_data"] == [0.5, 0.6]
+
+    def test_json_lines(self, residue_df, tmp_path):
+        path = str(tmp_path / "residues.jsonl")
+        residue_df.to_json(path, orient="records", lines=True)
+        df = read_dataset(path, columns=["pdb_r_pos"])
+        assert df["pdb_r_pos"].tolist() == [3, 4, 5, 6]
+
+    def test_matches_read_json(self, residue_df, tmp_path):
+        path = str(tmp_path / "residues.json")
+        residue_df.to_json(path, orient="records")
+        df = read_dataset(path)
+        df_org = pd.read_json(path, precise_float=True)
+        assert df.equals(df_org)
+
+    def test_projection_and_filters(self, residue_df, tmp_path):
+        path = str(tmp_path / "residues.json")
+        residue_df.to_json(path, orient="records")
+        ds = LazyDataset(path).select(["m_sequence", "pdb_r_pos"])
+        ds = ds.filter("has_pdbs", "==", True).filter("r_type", "in", ["NON-WC"])
+        df = ds.to_pandas()
+        assert list(df.columns) == ["m_sequence", "pdb_r_pos"]
+        assert df["pdb_r_pos"].tolist() == [3, 5, 6]
+
+    def test_chunks(self, residue_df, tmp_path):
+        path = str(tmp_path / "residues.csv")
+        residue_df.drop(columns=["r_data"]).to_csv(path, index=False)
+        ds = LazyDataset(path, columns=["pdb_r_pos"], filters=[("pdb_r_pos", ">", 3)])
+        chunks = list(ds.iter_chunks(chunksize=2))
+        assert [len(c) for c in chunks] == [1, 2]
+        assert list(chunks[0].columns) == ["pdb_r_pos"]
+
+    def test_no_matches(self, residue_df, tmp_path):
+        path = str(tmp_path / "residues.json")
+        residue_df.to_json(path, orient="records")
+        df = read_dataset(path, columns=["pdb_r_pos"], filters=[("pdb_r_pos", ">", 9)])
+        assert df.empty
+        assert list(df.columns) == ["pdb_r_pos"]
+
+    def test_invalid_operator(self, residue_df, tmp_path):
+        path = str(tmp_path / "residues.json")
+        residue_df.to_json(path, orient="records")
+        with pytest.raises(ValueError):
+            LazyDataset(path, filters=[("pdb_r_pos", "~", 3)])
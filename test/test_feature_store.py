@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dms_quant_framework.feature_store import (
+    B_FACTOR_COLUMNS,
+    FEATURE_STORE_DIR,
+    SASA_COLUMNS,
+    FeatureStore,
+    build_feature_table,
+    load_b_factors,
+    write_feature_store,
+)
+from dms_quant_framework.paths import DATA_PATH_ENV, OUTPUT_PATH_ENV
+
+PDB_1 = "TWOWAY.1ABC.0-0.CU-AG.0"
+PDB_2 = "TWOWAY.2DEF.0-0.A-U.0"
+
+
+@pytest.fixture
+def feature_df():
+    df_sasa = pd.DataFrame(
+        {
+            "pdb_path": [f"pdbs_w_2bp/AG_CU/{PDB_1}.pdb"] * 2,
+            "m_sequence": ["AG&CU"] * 2,
+            "r_nuc": ["A", "C"],
+            "pdb_r_pos": [3, 9],
+            **{col: [1.0, 2.0] for col in SASA_COLUMNS},
+        }
+    )
+    df_bfact = pd.DataFrame(
+        {
+            "pdb_name": [f"{PDB_1}.pdb"] * 3 + [f"{PDB_2}.pdb"],
+            "pdb_r_pos": [3, 4, 9, 3],
+            "average_b_factor": [40.0, 50.0, 60.0, 30.0],
+            "normalized_b_factor": [0.8, 1.0, 1.2, 1.0],
+        }
+    )
+    df_bp = pd.DataFrame(
+        {
+            "name": [f"{PDB_1}_x3dna.out", f"{PDB_1}_x3dna.out"],
+            "motif": ["AG_CU"] * 2,
+            "r_type": ["WC", "NON-WC"],
+            "res_num1": [3, 4],
+            "res_num2": [10, 9],
+            "bp": ["AU", "GC"],
+            "shear": [0.1, 0.2],
+            "stretch": [0.1, 0.2],
+            "stagger": [0.1, 0.2],
+            "buckle": [0.1, 0.2],
+            "propeller": [0.1, 0.2],
+            "opening": [0.1, 0.2],
+        }
+    )
+    df_dist = pd.DataFrame(
+        {
+            "pdb_name": [f"{PDB_1}.pdb"] * 3,
+            "res_num1": [3, 3, 4],
+            "res_num2": [10, 10, 9],
+            "distance": [3.1, 2.9, 4.0],
+        }
+    )
+    df_res = pd.DataFrame(
+        {
+            "pdb_name": [PDB_1, PDB_2],
+            "m_sequence": ["AG_CU", "A_U"],
+            "resolution": [2.5, 3.0],
+        }
+    )
+    return build_feature_table(df_sasa, df_bfact, df_bp, df_dist, df_res)
+
+
+def test_build_feature_table(feature_df):
+    df = feature_df.set_index(["pdb_name", "pdb_r_pos"])
+    assert len(df) == 5
+    row = df.loc[(f"{PDB_1}.pdb", 3)]
+    assert row["r_nuc"] == "A" and row["sasa_2_0"] == 1.0
+    assert row["pair_pdb_r_pos"] == 10 and row["bp"] == "AU"
+    assert row["partner_min_distance"] == 2.9
+    assert row["resolution"] == 2.5
+    # nucleotides of residues without sasa come from the base pair
+    assert df.loc[(f"{PDB_1}.pdb", 10), "r_nuc"] == "U"
+    row = df.loc[(f"{PDB_2}.pdb", 3)]
+    assert row["pair_pdb_r_pos"] == -1 and row["n_bp"] == 0
+    assert np.isnan(row["partner_min_distance"])
+
+
+def test_feature_store(feature_df, tmp_path):
+    store = write_feature_store(feature_df, str(tmp_path / "features"))
+    store = FeatureStore(str(tmp_path / "features"))
+    assert len(store) == 5
+    assert store.pdb_names == [f"{PDB_1}.pdb", f"{PDB_2}.pdb"]
+    assert store.array("sasa_0_1").dtype == np.float64
+    assert store.array("pair_pdb_r_pos").dtype == np.int32
+    df = store.load(["r_nuc", "average_b_factor"], pdb_names=[f"{PDB_2}.pdb"])
+    assert list(df.columns) == ["pdb_name", "pdb_r_pos", "r_nuc", "average_b_factor"]
+    assert df["pdb_r_pos"].tolist() == [3]
+    assert isinstance(df["r_nuc"].dtype, pd.CategoricalDtype)
+    df = store.load()
+    pd.testing.assert_frame_equal(
+        df.astype({"pdb_name": str, "r_nuc": str, "bp": str, "bp_r_type": str}),
+        feature_df.astype({"pdb_name": str, "r_nuc": str, "bp": str, "bp_r_type": str}),
+        check_dtype=False,
+        check_exact=True,
+    )
+    row = store.get(f"{PDB_1}.pdb", 4)
+    assert row["bp_r_type"] == "NON-WC" and row["pair_pdb_r_pos"] == 9
+    with pytest.raises(KeyError):
+        store.get("missing.pdb", 3)
+    with pytest.raises(KeyError):
+        store.get(f"{PDB_1}.pdb", 99)
+    with pytest.raises(KeyError):
+        store.array("missing")
+    with pytest.raises(FileNotFoundError):
+        FeatureStore(str(tmp_path / "missing"))
+
+
+def test_load_b_factors(tmp_path, monkeypatch):
+    monkeypatch.setenv(DATA_PATH_ENV, str(tmp_path))
+    monkeypatch.delenv(OUTPUT_PATH_ENV, raising=False)
+    (tmp_path / "pdb-features").mkdir()
+    df_bfact = pd.DataFrame(
+        {
+            "pdb_name": [f"{PDB_1}.pdb", f"{PDB_2}.pdb"],
+            "pdb_r_pos": [3, 3],
+            "average_b_factor": [40.123456789, 30.1],
+            "normalized_b_factor": [0.812345678, 1.0],
+            "atom_count": [20, 21],
+        }
+    )
+    df_bfact.to_csv(tmp_path / "pdb-features" / "b_factor.csv", index=False)
+    # without a feature store the csv is read
+    df = load_b_factors()
+    assert list(df.columns) == ["pdb_name", "pdb_r_pos", *B_FACTOR_COLUMNS]
+    assert df["average_b_factor"].tolist() == [40.123456789, 30.1]
+    write_feature_store(df, str(tmp_path / FEATURE_STORE_DIR))
+    # the store keeps the values of the csv
+    pd.testing.assert_frame_equal(load_b_factors(), df, check_exact=True)
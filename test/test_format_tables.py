@@ -0,0 +1,80 @@
+import pandas as pd
+import pytest
+
+from dms_quant_framework.format_tables import (
+    aggregate_heatmap_table,
+    generate_threshold_summary,
+)
+
+
+class TestGenerateThresholdSummary:
+    @pytest.fixture
+    def df(self):
+        return pd.DataFrame(
+            {
+                "r_type": ["WC", "WC", "NON-WC", "NON-WC", "NON-WC", "WC"],
+                "ln_r_data": [-7.0, -6.0, -3.0, -5.0, -8.0, -2.0],
+                "r_data": [0.01, 0.005, 0.3, 0.04, 0.001, 0.5],
+            }
+        )
+
+    def test_below_threshold(self, df):
+        summary = generate_threshold_summary(df, "r_type", threshold=-5.45)
+        assert summary["r_type"].tolist() == ["WC", "NON-WC"]
+        assert summary["% < -5.45"].tolist() == pytest.approx([66.666667, 33.333333])
+        assert summary["Count"].tolist() == [3, 3]
+
+    def test_multiple_thresholds_and_value_column(self, df):
+        summary = generate_threshold_summary(
+            df,
+            "r_type",
+            threshold=[0.01, 0.1],
+            greater_than=True,
+            value_column="r_data",
+        )
+        assert summary["r_type"].tolist() == ["NON-WC", "WC"]
+        assert summary["% > 0.01"].tolist() == pytest.approx([66.666667, 33.333333])
+        assert summary["% > 0.1"].tolist() == pytest.approx([33.333333, 33.333333])
+
+    def test_unsorted(self, df):
+        summary = generate_threshold_summary(df, "r_type", sort=False)
+        assert summary["r_type"].tolist() == ["WC", "NON-WC"]
+
+
+class TestAggregateHeatmapTable:
+    @pytest.fixture
+    def df(self):
+        return pd.DataFrame(
+            {
+                "r_nuc": ["A", "A", "A", "C", "C", "C"],
+                "r_type": ["WC", "WC", "NON-WC", "WC", "NON-WC", "NON-WC"],
+                "ln_r_data": [-7.0, -6.0, -3.0, -5.0, -8.0, -2.0],
+            }
+        )
+
+    def test_default_statistics(self, df):
+        df_stats = aggregate_heatmap_table(df, "r_nuc", "r_type", "ln_r_data")
+        assert list(df_stats.columns) == ["mean", "std", "count"]
+        assert df_stats.loc[("A", "WC"), "mean"] == -6.5
+        assert df_stats.loc[("C", "NON-WC"), "count"] == 2
+
+    def test_extra_statistics(self, df):
+        df_stats = aggregate_heatmap_table(
+            df, "r_nuc", "r_type", "ln_r_data", ["median", "p50", "pct<-5.45"]
+        )
+        assert df_stats.loc[("C", "NON-WC"), "median"] == -5.0
+        assert df_stats.loc[("C", "NON-WC"), "p50"] == -5.0
+        assert df_stats.loc[("C", "NON-WC"), "pct<-5.45"] == 50.0
+
+    def test_percentiles(self, df):
+        df_stats = aggregate_heatmap_table(
+            df, "r_nuc", "r_type", "ln_r_data", ["p90", "p10"]
+        )
+        grouped = df.groupby(["r_nuc", "r_type"])["ln_r_data"]
+        assert list(df_stats.columns) == ["p90", "p10"]
+        assert df_stats["p90"].tolist() == grouped.quantile(0.9).tolist()
+        assert df_stats["p10"].tolist() == grouped.quantile(0.1).tolist()
+
+    def test_unknown_statistic(self, df):
+        with pytest.raises(ValueError):
+            aggregate_heatmap_table(df, "r_nuc", "r_type", "ln_r_data", ["mode"])
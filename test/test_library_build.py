@@ -0,0 +1,277 @@
+import random
+
+import editdistance
+import pandas as pd
+import pytest
+
+from dms_quant_framework import library_build
+from dms_quant_framework.library_build import (
+    BKTree,
+    LibraryDesigner,
+    MotifSampler,
+    check_candidate_prefilters,
+    design_library,
+    get_batch_seed,
+    get_motif_length_window,
+    run_designs,
+    validate_sequence_length,
+    verify_candidate,
+)
+
+
+@pytest.fixture
+def motif_df():
+    motifs = [
+        ["CCG&CUG", "(.(&).)"],
+        ["CAC&GAGG", "(.(&)..)"],
+        ["CCG&UCG", "(.(&).)"],
+        ["GGGAGC&GGGAGC", "(....(&)....)"],
+        ["ACCGAA&UGUU", "(....(&)..)"],
+        ["CUGAC&GGAUG", "(...(&)...)"],
+        ["CGCAAG&CGCAAG", "(....(&)....)"],
+        ["CAG&CG", "(.(&))"],
+        ["GAAU&AC", "(..(&))"],
+        ["AAC&GCU", "(.(&).)"],
+        ["GA&UCC", "((&).)"],
+        ["UAC&GACAAGA", "(.(&).....)"],
+    ]
+    return pd.DataFrame(motifs, columns=["motif_seq", "motif_ss"])
+
+
+@pytest.fixture
+def params():
+    hairpin = list("GCGAGUAGC")
+    five_prime = list("GGGCUUCGGCCCA")
+    three_prime = list("AAAGAAACAACAACAACAAC")
+    return {
+        "hairpin": hairpin,
+        "hairpin_ss": list("((.....))"),
+        "rna_bases": {"A": "U", "U": "A", "C": "G", "G": "C"},
+        "five_prime": five_prime,
+        "five_prime_ss": list("((((....))))."),
+        "three_prime": three_prime,
+        "three_prime_ss": list("...................."),
+        "length_w_no_motifs": len(hairpin) + len(five_prime) + len(three_prime) + 46,
+    }
+
+
+def test_validate_sequence_length():
+    assert not validate_sequence_length(140, None)
+    assert validate_sequence_length(141, None)
+    assert validate_sequence_length(150, (145, 150))
+    assert not validate_sequence_length(160, (145, 150))
+
+
+def test_check_candidate_prefilters():
+    assert check_candidate_prefilters("GGAAACC", "((...))") is None
+    assert check_candidate_prefilters("GAAAAAC", "((...))") == "pairing"
+    assert check_candidate_prefilters("GCAAAGC", "((...))", max_gc=0.5) == "gc_content"
+    assert check_candidate_prefilters("GCAAAGC", "((...))", min_gc=0.6) == "gc_content"
+    # the gc content and repeat checks are opt-in
+    assert check_candidate_prefilters("GGGGAAAAAACCCC", "((((......))))") is None
+    assert (
+        check_candidate_prefilters("GGAAAAAACC", "((......))", max_homopolymer=5)
+        == "repeat"
+    )
+    assert (
+        check_candidate_prefilters("GGAAACC", "((...))", forbidden_sequences=("AAAC",))
+        == "repeat"
+    )
+
+
+def test_verify_candidate():
+    fold_cache = {}
+    # rejected by the prefilters, never folded
+    assert verify_candidate("GAAAAAC", "((...))", fold_cache) == ("pairing", None)
+    assert fold_cache == {}
+    seq, ss = "GGGAAAACCC", "(((....)))"
+    status, fold_result = verify_candidate(seq, ss, fold_cache)
+    assert fold_cache[seq] == fold_result
+    # cached sequences are not folded again
+    fold_cache[seq] = (ss, 0.1)
+    assert verify_candidate(seq, ss, fold_cache) == ("ok", (ss, 0.1))
+    assert verify_candidate(seq, "((......))", fold_cache)[0] == "misfold"
+
+
+def test_get_batch_seed():
+    assert get_batch_seed(1, 0) == get_batch_seed(1, 0)
+    assert get_batch_seed(1, 0) != get_batch_seed(1, 1)
+    assert get_batch_seed(1, 0) != get_batch_seed(2, 0)
+
+
+def test_get_motif_length_window():
+    assert get_motif_length_window(None, 88) == (53, float("inf"))
+    assert get_motif_length_window((150, 160), 88) == (55, 80)
+
+
+class TestMotifSampler:
+    def test_sample_within_window(self, motif_df):
+        sampler = MotifSampler(motif_df)
+        lengths = motif_df["motif_seq"].str.len() - 1
+        rng = random.Random(0)
+        for window in [(40, 45), (60, 61), (30, float("inf"))]:
+            for _ in range(50):
+                rows = sampler.sample(rng, window)
+                assert 5 <= len(rows) <= 7
+                assert window[0] <= lengths[rows].sum() <= window[1]
+
+    def test_infeasible_window(self, motif_df):
+        sampler = MotifSampler(motif_df)
+        assert sampler.sample(random.Random(0), (1000, 1100)) is None
+
+    def test_balance(self, motif_df):
+        sampler = MotifSampler(motif_df)
+        sampler.set_usage({"CCG&CUG": 1000})
+        rng = random.Random(0)
+        rows = [r for _ in range(50) for r in sampler.sample(rng, (0, 100), True)]
+        assert rows.count(0) < 5
+
+
+class TestBKTree:
+    @pytest.fixture
+    def seqs(self):
+        rng = random.Random(0)
+        return ["".join(rng.choices("ACGU", k=rng.randint(20, 30))) for _ in range(200)]
+
+    def test_search(self, seqs):
+        tree = BKTree()
+        for seq in seqs[:150]:
+            tree.add(seq)
+        assert len(tree) == 150
+        for query in seqs[150:]:
+            expected = sorted(
+                seq for seq in seqs[:150] if editdistance.eval(query, seq) <= 15
+            )
+            assert sorted(seq for _, seq in tree.search(query, 15)) == expected
+
+    def test_nearest(self, seqs):
+        tree = BKTree()
+        assert tree.nearest(seqs[0]) == (None, None)
+        for seq in seqs[:150]:
+            tree.add(seq)
+        for query in seqs[150:]:
+            expected = min(editdistance.eval(query, seq) for seq in seqs[:150])
+            assert tree.nearest(query)[0] == expected
+            dist, seq = tree.nearest(query, stop_dist=15)
+            assert dist == editdistance.eval(query, seq)
+            assert dist <= 15 if expected <= 15 else dist == expected
+
+    def test_finalize_sequences(self, seqs):
+        variables = library_build.initialize_variables()
+        variables["pool"] = seqs
+        variables["pool_motifs"] = [[] for _ in seqs]
+        variables["pool_m_ss"] = [[] for _ in seqs]
+        # folding is not part of the test
+        variables["fold_cache"] = {seq: ("." * len(seq), 0.0) for seq in seqs}
+        library_build.finalize_sequences(seqs, variables, 50, min_edit_distance=15)
+        usable_seq = variables["usable_seq"]
+        assert 0 < len(usable_seq) <= 50
+        # each sequence is compared to the sequences accepted before it
+        expected = [-1] + [
+            min(editdistance.eval(seq, other) for other in usable_seq[:i])
+            for i, seq in enumerate(usable_seq[1:], 1)
+        ]
+        assert variables["edit_dis"] == expected
+        assert all(dist > 15 for dist in expected[1:])
+        rejected = [
+            seq for seq in seqs[: variables["n_checked"]] if seq not in usable_seq
+        ]
+        for seq in rejected:
+            assert min(editdistance.eval(seq, other) for other in usable_seq) <= 15
+
+
+class TestDesignLibrary:
+    def test_design(self, motif_df, params):
+        variables = design_library(motif_df, params, 5, seed=1)
+        assert len(variables["usable_seq"]) >= 5
+        for seq, ss in zip(variables["usable_seq"], variables["usable_ss"]):
+            assert len(seq) == len(ss)
+        for i, seq_1 in enumerate(variables["usable_seq"]):
+            for seq_2 in variables["usable_seq"][i + 1 :]:
+                assert editdistance.eval(seq_1, seq_2) > 20
+
+    def test_reproducible_across_workers(self, motif_df, params):
+        variables_1 = design_library(motif_df, params, 5, n_workers=1, seed=3)
+        variables_2 = design_library(motif_df, params, 5, n_workers=2, seed=3)
+        assert variables_1["usable_seq"] == variables_2["usable_seq"]
+
+    def test_resume(self, motif_df, params, tmp_path, monkeypatch):
+        checkpoint_path = str(tmp_path / "checkpoint.json.gz")
+        expected = design_library(
+            motif_df, params, 8, batch_size=4, batches_per_round=1, seed=4
+        )
+        accept_candidates = library_build.accept_candidates
+        n_calls = []
+
+        def interrupted_accept(*args):
+            n_calls.append(1)
+            if len(n_calls) > 2:
+                raise KeyboardInterrupt
+            return accept_candidates(*args)
+
+        monkeypatch.setattr(library_build, "accept_candidates", interrupted_accept)
+        with pytest.raises(KeyboardInterrupt):
+            design_library(
+                motif_df,
+                params,
+                8,
+                batch_size=4,
+                batches_per_round=1,
+                seed=4,
+                checkpoint_path=checkpoint_path,
+            )
+        monkeypatch.setattr(library_build, "accept_candidates", accept_candidates)
+        variables = design_library(
+            motif_df,
+            params,
+            8,
+            batch_size=4,
+            batches_per_round=1,
+            checkpoint_path=checkpoint_path,
+            resume=True,
+        )
+        assert variables["usable_seq"] == expected["usable_seq"]
+        assert variables["ens_def"] == expected["ens_def"]
+        with pytest.raises(ValueError):
+            design_library(
+                motif_df,
+                params,
+                8,
+                batches_per_round=2,
+                checkpoint_path=checkpoint_path,
+                resume=True,
+            )
+
+
+class TestLibraryDesigner:
+    @pytest.fixture
+    def motif_file(self, motif_df, tmp_path):
+        path = str(tmp_path / "motifs.csv")
+        motif_df.to_csv(path, index=False)
+        return path
+
+    def test_run(self, motif_file, tmp_path):
+        output_file = str(tmp_path / "library.json")
+        designer = LibraryDesigner(motif_file, output_file, desired_sequences=5)
+        variables = designer.run(seed=1)
+        df = pd.read_json(output_file)
+        assert df["seq"].tolist() == variables["usable_seq"]
+        assert designer.metrics["n_accepted"] == len(df)
+        assert designer.metrics["candidates_per_sec"] > 0
+        assert 0 < designer.metrics["acceptance_rate"] <= 1
+
+    def test_invalid_flank(self, motif_file):
+        with pytest.raises(ValueError):
+            LibraryDesigner(motif_file, five_prime="GGGC", five_prime_ss="((")
+
+    def test_run_designs(self, motif_file):
+        designers = [
+            LibraryDesigner(motif_file, None, desired_sequences=3, name="a"),
+            LibraryDesigner(
+                motif_file, None, desired_sequences=3, helices_length=40, name="b"
+            ),
+        ]
+        results = run_designs(designers, n_workers=2, seeds=[1, 2])
+        assert results[0]["usable_seq"] == designers[0].run(seed=1)["usable_seq"]
+        assert results[1]["usable_seq"] == designers[1].run(seed=2)["usable_seq"]
+        assert results[0]["usable_seq"] != results[1]["usable_seq"]
@@ -0,0 +1,54 @@
+import json
+
+import pandas as pd
+import pytest
+
+from dms_quant_framework.logger import (
+    format_span_summary,
+    get_span_records,
+    instrument,
+    setup_instrumentation,
+    span,
+    stage,
+)
+
+
+@instrument()
+def _double_rows(df):
+    return pd.concat([df, df])
+
+
+def test_nested_spans(tmp_path):
+    spans_file = tmp_path / "spans.jsonl"
+    setup_instrumentation(str(spans_file))
+    df = pd.DataFrame({"a": range(10)})
+    with stage("build", rows_in=len(df)) as s:
+        with span("filter") as inner:
+            df_small = df[df["a"] < 5]
+            inner.set_rows(rows_in=len(df), rows_out=len(df_small))
+        df_double = _double_rows(df_small)
+        s.set_rows(rows_out=len(df_double))
+    records = get_span_records()
+    assert [r["path"] for r in records] == [
+        "build/filter",
+        "build/_double_rows",
+        "build",
+    ]
+    assert records[0]["rows_out"] == 5
+    assert records[1]["rows_in"] == 5 and records[1]["rows_out"] == 10
+    assert records[2]["kind"] == "stage"
+    assert records[2]["wall_sec"] >= records[0]["wall_sec"]
+    lines = spans_file.read_text().splitlines()
+    assert [json.loads(line)["path"] for line in lines] == [r["path"] for r in records]
+    summary = format_span_summary()
+    assert "build" in summary and "  filter" in summary
+    setup_instrumentation()
+
+
+def test_span_error():
+    setup_instrumentation()
+    with pytest.raises(ValueError):
+        with span("fails"):
+            raise ValueError("bad row")
+    assert get_span_records()[0]["status"] == "ValueError"
+    setup_instrumentation()
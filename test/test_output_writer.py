@@ -0,0 +1,65 @@
+import os
+
+import pandas as pd
+import pytest
+
+from dms_quant_framework.output_writer import (
+    SYNC_WRITES_ENV,
+    OutputWriter,
+    flush_outputs,
+    get_format,
+    write_frame_atomic,
+    write_output,
+)
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({"pdb_r_pos": [3, 4, 5], "r_data": [0.1, 0.2, 0.3]})
+
+
+def test_get_format():
+    assert get_format("csvs/wc_details.csv") == "csv"
+    assert get_format("raw-jsons/motifs.json.gz") == "json"
+    assert get_format("features.parquet") == "parquet"
+    with pytest.raises(ValueError):
+        get_format("wc_details.txt")
+
+
+def test_write_frame_atomic(df, tmp_path):
+    path = str(tmp_path / "csvs" / "wc_details.csv.gz")
+    write_frame_atomic(df, path)
+    pd.testing.assert_frame_equal(pd.read_csv(path), df)
+    path = str(tmp_path / "residues.json")
+    write_frame_atomic(df, path)
+    pd.testing.assert_frame_equal(pd.read_json(path), df)
+    # a failed write leaves the old file and no temporary file
+    with pytest.raises(TypeError):
+        write_frame_atomic(df, path, not_an_option=True)
+    pd.testing.assert_frame_equal(pd.read_json(path), df)
+    assert sorted(os.listdir(tmp_path)) == ["csvs", "residues.json"]
+
+
+def test_output_writer(df, tmp_path):
+    with OutputWriter(max_pending=2) as writer:
+        futures = [writer.submit(df, str(tmp_path / f"out_{i}.csv")) for i in range(5)]
+        # frames are copied when submitted
+        df["r_data"] = 0.0
+        paths = writer.flush()
+    assert paths == [f.result() for f in futures]
+    for path in paths:
+        assert pd.read_csv(path)["r_data"].tolist() == [0.1, 0.2, 0.3]
+    writer = OutputWriter()
+    writer.submit(df, str(tmp_path / "bad.csv"), not_an_option=True)
+    with pytest.raises(TypeError):
+        writer.flush()
+    writer.close()
+
+
+def test_write_output(df, tmp_path, monkeypatch):
+    path = str(tmp_path / "pairs.csv")
+    assert write_output(df, path) is not None
+    assert flush_outputs() == [path]
+    monkeypatch.setenv(SYNC_WRITES_ENV, "1")
+    assert write_output(df, str(tmp_path / "sync.csv")) is None
+    assert os.path.isfile(tmp_path / "sync.csv")
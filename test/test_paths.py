@@ -0,0 +1,37 @@
+import os
+
+from dms_quant_framework.paths import (
+    DATA_PATH_ENV,
+    OUTPUT_PATH_ENV,
+    get_data_path,
+    get_input_file,
+    get_output_file,
+    get_output_path,
+    glob_input_files,
+    set_paths,
+)
+
+
+def test_paths(tmp_path, monkeypatch):
+    data_path = tmp_path / "shared"
+    output_path = tmp_path / "scratch"
+    monkeypatch.setenv(DATA_PATH_ENV, str(data_path))
+    monkeypatch.delenv(OUTPUT_PATH_ENV, raising=False)
+    assert get_data_path() == str(data_path)
+    assert get_output_path() == str(data_path)
+    set_paths(output_path=str(output_path))
+    assert get_output_path() == str(output_path)
+    (data_path / "csvs").mkdir(parents=True)
+    (data_path / "csvs" / "pdb_res.csv").write_text("shared")
+    (data_path / "csvs" / "all_bp_details.csv").write_text("shared")
+    assert get_input_file("csvs/pdb_res.csv") == str(data_path / "csvs/pdb_res.csv")
+    # outputs are created in the output path and replace the shared inputs
+    output_file = get_output_file("csvs/pdb_res.csv")
+    assert output_file == os.path.join(str(output_path), "csvs/pdb_res.csv")
+    assert os.path.isdir(output_path / "csvs")
+    with open(output_file, "w") as f:
+        f.write("scratch")
+    assert get_input_file("csvs/pdb_res.csv") == output_file
+    assert glob_input_files("csvs/*.csv") == sorted(
+        [str(data_path / "csvs/all_bp_details.csv"), output_file]
+    )
@@ -0,0 +1,49 @@
+import pandas as pd
+
+from dms_quant_framework.pdb_features import generate_wc_details_dataframe
+
+
+def test_generate_wc_details_dataframe(caplog):
+    params = ["shear", "stretch", "stagger", "buckle", "propeller", "opening"]
+    df_wc = pd.DataFrame(
+        {
+            "name": ["TWOWAY.1ABC.0-0.CU-AG.0_x3dna.out"] * 4,
+            "motif": ["AG_CU"] * 4,
+            "r_type": ["WC"] * 4,
+            "res_num1": [3, 4, 5, 6],
+            "res_num2": [10, 9, 8, 7],
+            "bp": ["AU", "GC", "CG", "UA"],
+            **{col: [0.1, 0.2, 0.3, 0.4] for col in params},
+            "rmsd": [0.5, 0.6, None, 0.7],
+        }
+    )
+    df_residues = pd.DataFrame(
+        {
+            "m_sequence": ["AG&CU"] * 5,
+            "r_nuc": ["A", "C", "A", "G", "A"],
+            "pdb_r_pos": [3, 9, 3, 8, 6],
+            "r_data": [0.1, 0.2, 0.3, 0.4, 0.5],
+        }
+    )
+    df = generate_wc_details_dataframe(df_wc, df_residues)
+    # residue 6 is U in the pair, so the last pair has no reactivities
+    warnings = [r.getMessage() for r in caplog.records if r.levelname == "WARNING"]
+    assert warnings == [
+        "No match found for either residue of 1 of 4 WC pairs, skipping them"
+    ]
+    assert list(df.columns) == [
+        "m_sequence",
+        "bp",
+        "pdb_r_pos1",
+        "pdb_r_pos2",
+        "rmsd_from_ideal",
+        *params,
+        "r_data",
+        "flanking_pairs",
+    ]
+    # the first residue of the pair is used, the second if it has no reactivities
+    assert df["bp"].tolist() == ["AU", "AU", "GC", "CG"]
+    assert df["r_data"].tolist() == [0.1, 0.3, 0.2, 0.4]
+    # 3-10 and 4-9 are the pairs that close the motif, len("AG_CU") + 5 = 10
+    assert df["flanking_pairs"].tolist() == ["YES", "YES", "YES", "NO"]
+    assert df["m_sequence"].unique().tolist() == ["AG&CU"]
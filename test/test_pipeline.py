@@ -0,0 +1,177 @@
+import os
+import time
+
+import pytest
+
+from dms_quant_framework.pipeline import Pipeline, Stage
+from dms_quant_framework.profiling import list_profiles, set_worker_profiling
+
+
+def _upper(src, dst):
+    with open(src) as f:
+        text = f.read()
+    with open(dst, "w") as f:
+        f.write(text.upper())
+
+
+def _count(src_dir, dst):
+    with open(dst, "w") as f:
+        f.write(str(len(os.listdir(src_dir))))
+
+
+def _get_pipeline(path):
+    raw, upper, count = [str(path / name) for name in ["raw.txt", "upper.txt", "n"]]
+    return Pipeline(
+        [
+            Stage("upper", _upper, [raw], [upper], {"src": raw, "dst": upper}),
+            Stage(
+                "upper-again",
+                _upper,
+                [upper],
+                [str(path / "upper2.txt")],
+                {"src": upper, "dst": str(path / "upper2.txt")},
+            ),
+            Stage(
+                "count",
+                _count,
+                [str(path / "pdbs" / "*.pdb")],
+                [count],
+                {"src_dir": str(path / "pdbs"), "dst": count},
+            ),
+        ],
+        state_file=str(path / "state.json"),
+    )
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_pipeline_incremental(tmp_path, n_workers):
+    (tmp_path / "pdbs").mkdir()
+    (tmp_path / "pdbs" / "a.pdb").write_text("ATOM")
+    (tmp_path / "raw.txt").write_text("acgu")
+    pipeline = _get_pipeline(tmp_path)
+    assert pipeline.dependencies["upper-again"] == {"upper"}
+    assert pipeline.order.index("upper") < pipeline.order.index("upper-again")
+    status = pipeline.run(n_workers=n_workers)
+    assert set(status.values()) == {"ran"}
+    assert (tmp_path / "upper2.txt").read_text() == "ACGU"
+    status = pipeline.run(n_workers=n_workers)
+    assert set(status.values()) == {"skipped"}
+    # a new pdb only reruns the stage that reads the pdbs
+    (tmp_path / "pdbs" / "b.pdb").write_text("ATOM")
+    assert pipeline.run(dry_run=True)["count"] == "stale"
+    status = pipeline.run(n_workers=n_workers)
+    assert status == {"upper": "skipped", "upper-again": "skipped", "count": "ran"}
+    assert (tmp_path / "n").read_text() == "2"
+    # same output, so the stage after it is skipped
+    (tmp_path / "raw.txt").write_text("ACGU")
+    status = pipeline.run(["upper-again"], n_workers=n_workers)
+    assert status == {"upper": "ran", "upper-again": "skipped"}
+    # outputs changed by something else are rebuilt
+    (tmp_path / "upper2.txt").write_text("edited")
+    assert pipeline.run(["upper-again"])["upper-again"] == "ran"
+
+
+def test_pipeline_external_inputs(tmp_path):
+    raw, upper, lower = [str(tmp_path / name) for name in ["raw", "upper", "lower"]]
+    pipeline = Pipeline(
+        [
+            Stage("upper", _upper, [raw], [upper], {"src": raw, "dst": upper}),
+            Stage(
+                "copy",
+                _upper,
+                [],
+                [lower],
+                {"src": upper, "dst": lower},
+                external_inputs=[upper],
+            ),
+        ],
+        state_file=str(tmp_path / "state.json"),
+    )
+    # the stage writing an external input is not built, but runs first if asked
+    assert pipeline.get_upstream(["copy"]) == {"copy"}
+    assert pipeline.dependencies["copy"] == {"upper"}
+    (tmp_path / "raw").write_text("acgu")
+    (tmp_path / "upper").write_text("shipped")
+    assert pipeline.run(["copy"]) == {"copy": "ran"}
+    assert (tmp_path / "lower").read_text() == "SHIPPED"
+    # external inputs are hashed like inputs
+    assert pipeline.run() == {"upper": "ran", "copy": "ran"}
+    assert (tmp_path / "lower").read_text() == "ACGU"
+    assert pipeline.run(["copy"]) == {"copy": "skipped"}
+
+
+def test_pipeline_cycle():
+    with pytest.raises(ValueError):
+        Pipeline([Stage("a", _upper, ["x"], ["y"]), Stage("b", _upper, ["y"], ["x"])])
+
+
+def _sleep(dst, seconds):
+    time.sleep(seconds)
+    with open(dst, "w") as f:
+        f.write("done")
+
+
+def test_pipeline_parallel(tmp_path):
+    stages = [
+        Stage(
+            name,
+            _sleep,
+            [],
+            [str(tmp_path / name)],
+            {"dst": str(tmp_path / name), "seconds": 0.5},
+        )
+        for name in ["distances", "sasa", "basepair-details"]
+    ]
+    pipeline = Pipeline(stages, state_file=str(tmp_path / "state.json"))
+    start = time.perf_counter()
+    pipeline.run(n_workers=3)
+    elapsed = time.perf_counter() - start
+    assert set(pipeline.stage_records) == {"distances", "sasa", "basepair-details"}
+    assert all(r["wall_sec"] >= 0.5 for r in pipeline.stage_records.values())
+    if (os.cpu_count() or 1) >= 3:
+        assert elapsed < 1.4
+
+
+def test_pipeline_worker_profiles(tmp_path, monkeypatch):
+    # stages only run in workers with more than one cpu
+    monkeypatch.setattr(os, "cpu_count", lambda: 2)
+    (tmp_path / "pdbs").mkdir()
+    (tmp_path / "raw.txt").write_text("acgu")
+    set_worker_profiling(str(tmp_path / "profiles"), "sample", 0.001)
+    try:
+        _get_pipeline(tmp_path).run(n_workers=2)
+    finally:
+        set_worker_profiling(None)
+    profiles = [os.path.basename(p) for p in list_profiles(str(tmp_path / "profiles"))]
+    assert profiles == ["count.collapsed", "upper-again.collapsed", "upper.collapsed"]
+
+
+def test_pdb_features_do_not_need_motifs(tmp_path):
+    # the cli imports the RNA-MaP and secondary structure packages
+    cli = pytest.importorskip("dms_quant_framework.cli", exc_type=ImportError)
+    pipeline = cli.build_pipeline()
+    upstream = pipeline.get_upstream(cli.PDB_FEATURE_STAGES)
+    assert upstream == set(cli.PDB_FEATURE_STAGES)
+    assert not upstream & {"mutation-histograms", "motifs", "residues"}
+
+
+def test_motif_stages_do_not_run_3dna():
+    cli = pytest.importorskip("dms_quant_framework.cli", exc_type=ImportError)
+    pipeline = cli.build_pipeline()
+    upstream = pipeline.get_upstream(cli.MOTIF_DATA_STAGES)
+    assert "basepair-details" not in upstream
+    assert upstream == {
+        "mutation-histograms",
+        "motifs",
+        "residues",
+        "pdb-residues",
+        "wc-details",
+    }
+
+
+def test_pdb_feature_stages_are_roots():
+    cli = pytest.importorskip("dms_quant_framework.cli", exc_type=ImportError)
+    pipeline = cli.build_pipeline()
+    # the workloads of get-pdb-features start together
+    for name in ["distances", "contacts", "sasa", "basepair-details"]:
+        assert pipeline.dependencies[name] == set()
@@ -1,5 +1,18 @@
 import pytest
-from dms_quant_framework.process_motifs import trim
+from dms_quant_framework import process_motifs
+from dms_quant_framework.paths import DATA_PATH_ENV, OUTPUT_PATH_ENV
+from dms_quant_framework.process_motifs import (
+    build_motif_index_map,
+    gather_motif_data,
+    iter_structure_templates,
+    process_mutation_histograms_to_json,
+    trim,
+    write_motif_dataframes,
+)
+from dms_quant_framework.reactivity_store import (
+    ReactivityStore,
+    write_reactivity_store,
+)
 
 import pytest
 import pandas as pd
@@ -58,3 +71,105 @@ class TestTrim:
         result = trim(df, 2, 2)
         assert result["sequence"].tolist() == ["CGAT"]
         assert np.array_equal(result["data"].iloc[0], np.array([3, 4, 5, 6]))
+
+
+class TestMotifIndexMap:
+    def test_build_motif_index_map(self):
+        positions, offsets = build_motif_index_map([[1, 2, -1, 6], [3, -1, 5]])
+        assert positions.tolist() == [1, 2, -1, 6, 3, -1, 5]
+        assert offsets.tolist() == [0, 4, 7]
+
+    def test_gather_motif_data(self):
+        data = np.array([[0.1, 0.2, 0.3, 0.4], [1.0, 2.0, 3.0, 4.1234567]])
+        positions, offsets = build_motif_index_map([[0, -1, 3], [1, 2]])
+        m_data = gather_motif_data(data, positions, offsets)
+        assert m_data[0] == [[0.1, 0, 0.4], [0.2, 0.3]]
+        assert m_data[1] == [[1.0, 0, 4.123457], [2.0, 3.0]]
+        # strand breaks are int 0 like the per residue extraction
+        assert type(m_data[0][0][1]) is int
+
+    def test_gather_motif_data_rounding(self):
+        # np.round gives 2e-06 here, round gives the nearest decimal
+        data = np.array([[2.5e-06, 2.6749995]])
+        positions, offsets = build_motif_index_map([[0, 1]])
+        m_data = gather_motif_data(data, positions, offsets)
+        assert m_data == [[[round(2.5e-06, 6), round(2.6749995, 6)]]]
+        assert m_data[0][0][0] == 3e-06
+
+
+class TestReactivityStoreMotifs:
+    @pytest.fixture
+    def construct_df(self):
+        rng = np.random.default_rng(0)
+        return pd.DataFrame(
+            {
+                "name": [f"construct_{i}" for i in range(20)],
+                "sequence": ["GGAAACC"] * 10 + ["GGAAAACC"] * 10,
+                "structure": ["((...))"] * 10 + ["((....))"] * 10,
+                "data": [list(rng.random(7)) for _ in range(10)]
+                + [list(rng.random(8)) for _ in range(10)],
+            }
+        )
+
+    def get_motif_data(self, df, store=None):
+        m_data = [None] * len(df)
+        for rows, _, data in iter_structure_templates(df, store):
+            positions, offsets = build_motif_index_map([[0, 1, -1, 5, 6], [2, 3]])
+            for row, motifs in zip(rows, gather_motif_data(data, positions, offsets)):
+                m_data[row] = motifs
+        return m_data
+
+    def test_store_motif_data(self, construct_df, tmp_path):
+        store = write_reactivity_store(construct_df, str(tmp_path / "store"))
+        expected = self.get_motif_data(construct_df)
+        m_data = self.get_motif_data(construct_df, store)
+        # float32 values can round to the neighboring 6th decimal
+        for motifs, expected_motifs in zip(m_data, expected):
+            for motif, expected_motif in zip(motifs, expected_motifs):
+                np.testing.assert_allclose(motif, expected_motif, rtol=0, atol=1.1e-6)
+        # the data column is rounded without a float32 conversion
+        for row, motifs in zip(construct_df["data"], expected):
+            assert motifs[1] == [round(row[2], 6), round(row[3], 6)]
+
+    def test_write_motif_dataframes_store(self, construct_df, tmp_path, monkeypatch):
+        constructs = tmp_path / "raw-jsons" / "constructs"
+        constructs.mkdir(parents=True)
+        construct_df.to_json(constructs / "lib.json", orient="records")
+        write_reactivity_store(construct_df, str(constructs / "lib_data"))
+        monkeypatch.setenv(DATA_PATH_ENV, str(tmp_path))
+        stores = []
+        monkeypatch.setattr(
+            process_motifs.GenerateMotifDataFrame,
+            "run",
+            lambda self, df, name, store=None: stores.append(store),
+        )
+        # the store is only read when asked for, even if it exists
+        write_motif_dataframes("lib")
+        write_motif_dataframes("lib", use_store=True)
+        assert stores[0] is None
+        assert stores[1].rows(["construct_0"]).shape == (1, 7)
+
+    def test_store_from_existing_json(self, construct_df, tmp_path, monkeypatch):
+        (tmp_path / "mutation-histograms").mkdir()
+        (tmp_path / "mutation-histograms" / "lib.p").write_bytes(b"")
+        constructs = tmp_path / "raw-jsons" / "constructs"
+        constructs.mkdir(parents=True)
+        construct_df.to_json(constructs / "lib.json", orient="records")
+        monkeypatch.setenv(DATA_PATH_ENV, str(tmp_path))
+        monkeypatch.delenv(OUTPUT_PATH_ENV, raising=False)
+
+        def not_called(path):
+            raise AssertionError(f"{path} was processed again")
+
+        monkeypatch.setattr(
+            process_motifs, "get_mut_histos_from_pickle_file", not_called
+        )
+        # the store is written from the JSON of an earlier run
+        process_mutation_histograms_to_json()
+        store = ReactivityStore(str(constructs / "lib_data"))
+        np.testing.assert_allclose(
+            store.rows(["construct_0", "construct_1"]),
+            np.array(construct_df["data"].iloc[:2].tolist()),
+            rtol=1e-6,
+        )
+        process_mutation_histograms_to_json()
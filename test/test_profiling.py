@@ -0,0 +1,33 @@
+import pytest
+
+from dms_quant_framework.profiling import (
+    format_top_functions,
+    get_profile_path,
+    get_top_functions,
+    profile,
+)
+
+
+def _busy(n):
+    total = 0
+    for i in range(n):
+        total += i * i
+    return total
+
+
+@pytest.mark.parametrize("mode", ["cprofile", "sample"])
+def test_profile(tmp_path, mode):
+    path = get_profile_path(str(tmp_path), "generate-motif-data", mode)
+    with profile(path, mode, interval=0.001):
+        for _ in range(20):
+            _busy(100000)
+    df = get_top_functions(path, n=5, sort_by="self")
+    assert any(df["function"].str.startswith("_busy"))
+    assert (df["total_pct"] <= 100 + 1e-6).all()
+    assert "_busy" in format_top_functions(path, n=5)
+
+
+def test_profile_unknown_mode(tmp_path):
+    with pytest.raises(ValueError):
+        with profile(str(tmp_path / "x.prof"), "perf"):
+            pass
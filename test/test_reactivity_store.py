@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dms_quant_framework.reactivity_store import (
+    ReactivityStore,
+    write_reactivity_store,
+)
+
+
+@pytest.fixture
+def construct_df():
+    return pd.DataFrame(
+        {
+            "name": ["c1", "c2", "c3", "c4"],
+            "data": [[0.1, 0.2, 0.3], [0.4, 0.5], [0.6, 0.7, 0.8], [0.9, 1.0, 1.1]],
+        }
+    )
+
+
+class TestReactivityStore:
+    def test_write_and_read(self, construct_df, tmp_path):
+        write_reactivity_store(construct_df, str(tmp_path / "store"))
+        store = ReactivityStore(str(tmp_path / "store"))
+        assert len(store) == 4
+        assert store.lengths == [2, 3]
+        assert store.names(3) == ["c1", "c3", "c4"]
+        assert store.locate("c3") == (3, 1)
+        assert "c2" in store and "c5" not in store
+        np.testing.assert_allclose(store["c2"], [0.4, 0.5], rtol=1e-6)
+        assert store.matrix(3).dtype == np.float32
+        assert store.matrix(3).shape == (3, 3)
+
+    def test_views(self, construct_df, tmp_path):
+        store = write_reactivity_store(construct_df, str(tmp_path / "store"))
+        matrix = store.matrix(3)
+        assert isinstance(matrix, np.memmap)
+        assert np.shares_memory(store["c3"], matrix)
+        assert np.shares_memory(store.rows(["c3", "c4"]), matrix)
+        np.testing.assert_allclose(store.rows(["c4", "c1"])[:, 0], [0.9, 0.1])
+        with pytest.raises(ValueError):
+            store["c1"][0] = 1.0
+
+    def test_errors(self, construct_df, tmp_path):
+        store = write_reactivity_store(construct_df, str(tmp_path / "store"))
+        with pytest.raises(KeyError):
+            store["c5"]
+        with pytest.raises(ValueError):
+            store.rows(["c1", "c2"])
+        with pytest.raises(ValueError):
+            write_reactivity_store(
+                pd.concat([construct_df, construct_df]), str(tmp_path / "dups")
+            )
+        with pytest.raises(FileNotFoundError):
+            ReactivityStore(str(tmp_path / "missing"))
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import ks_2samp, linregress, ttest_ind
+
+from dms_quant_framework.stats import (
+    adjust_p_values,
+    check_pairwise_statistical_significance,
+    grouped_ks_2samp,
+    grouped_linregress,
+    grouped_mean_std,
+)
+
+
+class TestCheckPairwiseStatisticalSignificance:
+    @pytest.fixture
+    def df(self):
+        rng = np.random.default_rng(0)
+        return pd.DataFrame(
+            {"group": rng.choice(list("abcde"), 200), "value": rng.normal(size=200)}
+        )
+
+    def test_matches_ttest_ind(self, df):
+        results = check_pairwise_statistical_significance(df, "group", "value")
+        groups = df.groupby("group")["value"].apply(list)
+        assert len(results) == 10
+        for _, row in results.iterrows():
+            _, p_val = ttest_ind(
+                groups[row["Group 1"]], groups[row["Group 2"]], equal_var=False
+            )
+            assert row["p-value"] == pytest.approx(p_val)
+
+    def test_square(self, df):
+        results = check_pairwise_statistical_significance(df, "group", "value")
+        matrix = check_pairwise_statistical_significance(
+            df, "group", "value", output="square"
+        )
+        assert matrix.shape == (5, 5)
+        assert matrix.loc["b", "a"] == matrix.loc["a", "b"]
+        assert matrix.loc["a", "b"] == results["p-value"].iloc[0]
+
+    def test_correction(self, df):
+        results = check_pairwise_statistical_significance(
+            df, "group", "value", correction="bonferroni"
+        )
+        expected = np.minimum(results["p-value"] * len(results), 1.0)
+        assert np.allclose(results["adjusted p-value"], expected)
+
+
+def test_adjust_p_values():
+    p_values = [0.01, 0.04, 0.03, 0.2]
+    assert np.allclose(adjust_p_values(p_values, "holm"), [0.04, 0.09, 0.09, 0.2])
+    assert np.allclose(
+        adjust_p_values(p_values, "fdr_bh"), [0.04, 0.0533333, 0.0533333, 0.2]
+    )
+    with pytest.raises(ValueError):
+        adjust_p_values(p_values, "unknown")
+
+
+def test_grouped_mean_std():
+    rng = np.random.default_rng(0)
+    codes = rng.integers(0, 10, size=200)
+    values = rng.random((200, 5))
+    mean, std = grouped_mean_std(codes, values)
+    assert mean.shape == (10, 5)
+    for i in range(10):
+        np.testing.assert_allclose(mean[i], values[codes == i].mean(axis=0))
+        np.testing.assert_allclose(std[i], values[codes == i].std(axis=0))
+    mean, std = grouped_mean_std([0, 0, 2], [1.0, 3.0, 5.0])
+    assert mean[0] == 2.0 and std[0] == 1.0 and np.isnan(mean[1])
+
+
+class TestGroupedLinregress:
+    def test_matches_scipy(self):
+        rng = np.random.default_rng(0)
+        codes = rng.integers(0, 20, size=500)
+        x = rng.integers(0, 50, size=500).astype(float)
+        y = 0.3 * x + rng.normal(size=500)
+        df = grouped_linregress(codes, x, y)
+        assert len(df) == 20
+        for i in range(20):
+            r = linregress(x[codes == i], y[codes == i])
+            assert df.loc[i, "slope"] == pytest.approx(r.slope)
+            assert df.loc[i, "intercept"] == pytest.approx(r.intercept)
+            assert df.loc[i, "rvalue"] == pytest.approx(r.rvalue)
+            assert df.loc[i, "pvalue"] == pytest.approx(r.pvalue)
+            assert df.loc[i, "count"] == np.sum(codes == i)
+
+    def test_identical_x(self):
+        df = grouped_linregress([0, 0, 0], [1.0, 1.0, 1.0], [1.0, 2.0, 3.0])
+        assert np.isnan(df.loc[0, "slope"])
+
+
+class TestGroupedKs2samp:
+    def test_matches_scipy(self):
+        rng = np.random.default_rng(0)
+        data1 = np.round(rng.normal(size=(30, 10)), 1)
+        data2 = np.round(rng.normal(0.5, size=(30, 10)), 1)
+        stats, p_vals = grouped_ks_2samp(data1, data2)
+        for i in range(30):
+            r = ks_2samp(data1[i], data2[i])
+            assert stats[i] == pytest.approx(r.statistic)
+            assert p_vals[i] == pytest.approx(r.pvalue)
+
+    def test_padded_groups(self):
+        rng = np.random.default_rng(1)
+        data1 = rng.normal(size=(2, 8))
+        data2 = rng.normal(size=(2, 12))
+        data1[0, 5:] = np.nan
+        data2[1, 7:] = np.nan
+        stats, p_vals = grouped_ks_2samp(data1, data2)
+        for i in range(2):
+            r = ks_2samp(data1[i][~np.isnan(data1[i])], data2[i][~np.isnan(data2[i])])
+            assert stats[i] == pytest.approx(r.statistic)
+            assert p_vals[i] == pytest.approx(r.pvalue)
+
+    def test_empty_group(self):
+        with pytest.raises(ValueError):
+            grouped_ks_2samp([[np.nan, np.nan]], [[1.0, 2.0]])